@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Hàng đợi gửi cảnh báo Telegram dùng chung cho mọi cặp
+
+Mọi cảnh báo đi qua một hàng đợi duy nhất thay vì mỗi cặp tự gọi `send_message`:
+- Giới hạn tốc độ toàn cục (`global_rate` tin/giây) và theo từng chat (`chat_interval`
+  giây giữa hai tin) theo giới hạn chống flood của Telegram.
+- Các cảnh báo đang chờ cùng một chat được gộp thành một tin tổng hợp (digest), trừ tin
+  trả lời (reply) vốn phải gửi riêng.
+- Gặp RetryAfter thì chờ đúng thời gian Telegram yêu cầu, lỗi mạng thì thử lại với thời
+  gian chờ tăng dần; chat bị chặn không làm chậm các chat khác.
+"""
+
+import time
+import asyncio
+import logging
+import datetime
+from collections import deque
+
+from telegram.error import RetryAfter, NetworkError, BadRequest, Forbidden
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096  # Giới hạn độ dài tin nhắn của Telegram
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def parse_chat_id(value):
+    """Tách "chat_id" hoặc "chat_id_thread_id" thành (chat_id, message_thread_id)"""
+    if '_' in str(value):
+        chat_id, thread_id = str(value).split('_')
+        return int(chat_id), int(thread_id)
+    return int(value), None
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class _Alert:
+    """Một cảnh báo trong hàng đợi, `future` nhận tin nhắn đã gửi (None nếu thất bại)"""
+
+    def __init__(self, text, reply_to, future, enqueued_at):
+        self.text = text
+        self.reply_to = reply_to
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class AlertDispatcher:
+    """Gửi cảnh báo Telegram qua một hàng đợi có giới hạn tốc độ, gộp tin và thử lại"""
+
+    def __init__(self, bot, global_rate=25, chat_interval=3.0, batch_window=1.0, max_retries=5,
+                 clock=time.monotonic, observe_latency=None):
+        self.bot = bot
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = chat_interval
+        self.batch_window = batch_window  # Chờ thêm để gộp các cảnh báo đến gần nhau
+        self.max_retries = max_retries
+        self.clock = clock
+        # Gọi observe_latency(giây, 'sent'/'failed') cho từng cảnh báo khi gửi xong hoặc bỏ qua
+        self.observe_latency = observe_latency
+        self._queues = {}  # (chat_id, thread_id) -> deque[_Alert]
+        self._chat_ready = {}  # chat_id -> thời điểm được gửi tin tiếp theo
+        self._attempts = {}  # (chat_id, thread_id) -> số lần thử của tin đang đứng đầu
+        self._in_flight = None  # (key, batch) đang gửi: đã lấy khỏi hàng đợi nhưng chưa có kết quả
+        self._global_ready = 0.0
+        self._wakeup = None
+        self._worker = None
+        # Thống kê
+        self.sent = 0
+        self.digests = 0
+        self.retries = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=1000)  # Giây từ lúc vào hàng đợi tới lúc gửi xong
+
+    def queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'queue_depth': self.queue_depth(),
+            'sent': self.sent,
+            'digests': self.digests,
+            'retries': self.retries,
+            'failed': self.failed,
+            'latency_p50': _percentile(latencies, 0.5),
+            'latency_p95': _percentile(latencies, 0.95),
+        }
+
+    def submit(self, chat_id, text, message_thread_id=None, reply_to=None):
+        """Đưa cảnh báo vào hàng đợi, trả về Future nhận tin nhắn đã gửi (None nếu thất bại)
+
+        `reply_to` có thể là message ID hoặc Future của một cảnh báo trước đó (ví dụ tin
+        mở lệnh chưa gửi xong); tin trả lời luôn được gửi sau tin gốc.
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        key = (chat_id, message_thread_id)
+        self._queues.setdefault(key, deque()).append(_Alert(text, reply_to, future, self.clock()))
+        self._wakeup.set()
+        return future
+
+    def _next_ready(self):
+        """(thời điểm, key) của hàng đợi được gửi sớm nhất, None nếu không còn gì"""
+        best = None
+        for key, queue in self._queues.items():
+            if not queue:
+                continue
+            ready = max(queue[0].enqueued_at + self.batch_window, self._chat_ready.get(key[0], 0.0))
+            if best is None or ready < best[0]:
+                best = (ready, key)
+        return best
+
+    async def _run(self):
+        while True:
+            best = self._next_ready()
+            if best is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = max(best[0], self._global_ready) - self.clock()
+            if delay > 0:
+                # Có cảnh báo mới thì tính lại thứ tự
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._send_next(best[1])
+
+    def _take_batch(self, queue):
+        """Lấy các cảnh báo đầu hàng đợi để gửi chung một tin"""
+        if queue[0].reply_to is not None:
+            return [queue.popleft()]
+        batch = [queue.popleft()]
+        length = len(batch[0].text)
+        while queue and queue[0].reply_to is None:
+            length += len(DIGEST_SEPARATOR) + len(queue[0].text)
+            if length > MAX_MESSAGE_LENGTH - 100:
+                break
+            batch.append(queue.popleft())
+        return batch
+
+    def _reply_target(self, reply_to):
+        if isinstance(reply_to, asyncio.Future):
+            # Tin gốc đứng trước trong cùng hàng đợi nên đã gửi xong (hoặc thất bại)
+            message = reply_to.result() if reply_to.done() else None
+            return message.message_id if message is not None else None
+        return reply_to
+
+    async def _send_next(self, key):
+        chat_id, thread_id = key
+        queue = self._queues[key]
+        batch = self._take_batch(queue)
+        if len(batch) == 1:
+            text = batch[0].text
+        else:
+            text = f"📣 {len(batch)} tín hiệu cùng lúc\n\n" + DIGEST_SEPARATOR.join(alert.text for alert in batch)
+
+        kwargs = {'chat_id': chat_id, 'text': text}
+        if thread_id is not None:
+            kwargs['message_thread_id'] = thread_id
+        reply_to = self._reply_target(batch[0].reply_to)
+        if reply_to is not None:
+            kwargs['reply_to_message_id'] = reply_to
+            kwargs['allow_sending_without_reply'] = True
+
+        now = self.clock()
+        self._global_ready = now + self.global_interval
+        self._chat_ready[chat_id] = now + self.chat_interval
+        self._in_flight = (key, batch)
+        try:
+            message = await self.bot.send_message(**kwargs)
+        except (BadRequest, Forbidden) as e:
+            # Lỗi cố định (sai chat ID, bot bị chặn, tin nhắn sai định dạng): thử lại cũng vô ích.
+            # BadRequest là lớp con của NetworkError nên phải bắt trước
+            self._finish(key, batch, None, str(e))
+            return
+        except (RetryAfter, NetworkError) as e:
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts <= self.max_retries:
+                if isinstance(e, RetryAfter):
+                    wait = e.retry_after
+                    wait = wait.total_seconds() if isinstance(wait, datetime.timedelta) else float(wait)
+                else:
+                    wait = min(2 ** (attempts - 1), 60)
+                logger.warning(f"Lỗi gửi Telegram tới {chat_id}: {e}, thử lại lần {attempts} sau {wait:.0f} giây")
+                self.retries += 1
+                self._attempts[key] = attempts
+                self._chat_ready[chat_id] = self.clock() + wait
+                queue.extendleft(reversed(batch))  # Giữ nguyên thứ tự, có thể gộp thêm khi gửi lại
+                return
+            self._finish(key, batch, None, f"bỏ qua sau {self.max_retries} lần thử lại: {e}")
+            return
+        except Exception as e:
+            self._finish(key, batch, None, str(e))
+            return
+        finally:
+            self._in_flight = None
+        self._finish(key, batch, message)
+
+    def _finish(self, key, batch, message, error=None):
+        self._attempts.pop(key, None)
+        now = self.clock()
+        if error is not None:
+            self.failed += len(batch)
+            logger.error(f"Lỗi khi gửi {len(batch)} cảnh báo tới Telegram ({key[0]}): {error}")
+        else:
+            self.sent += len(batch)
+            if len(batch) > 1:
+                self.digests += 1
+            self.latencies.extend(now - alert.enqueued_at for alert in batch)
+        if self.observe_latency is not None:
+            outcome = 'sent' if error is None else 'failed'
+            for alert in batch:
+                self.observe_latency(now - alert.enqueued_at, outcome)
+        for alert in batch:
+            if not alert.future.done():
+                alert.future.set_result(message)
+
+    async def close(self, timeout=10):
+        """Chờ gửi hết hàng đợi và tin đang gửi (tối đa `timeout` giây) rồi dừng worker"""
+        deadline = self.clock() + timeout
+        while ((self.queue_depth() or self._in_flight is not None) and self.clock() < deadline
+               and self._worker is not None and not self._worker.done()):
+            await asyncio.sleep(0.1)
+        # Worker đang chờ send_message: khi bị hủy, tin đang gửi được báo thất bại để nơi chờ kết quả không treo
+        in_flight = self._in_flight
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._worker = None
+        if in_flight is not None:
+            self._finish(*in_flight, None, "hàng đợi đã dừng khi đang gửi")
+        for queue in self._queues.values():
+            while queue:
+                alert = queue.popleft()
+                self.failed += 1
+                if not alert.future.done():
+                    alert.future.set_result(None)
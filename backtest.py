@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Backtest chiến lược RSI + MACD của CryptoSignalBot trên dữ liệu nến lịch sử
+
+Dùng lại đúng logic vào/thoát lệnh và PnL của CryptoSignalBot (evaluate_snapshot,
+apply_signal, calculate_pnl), chỉ thay thời gian thực bằng thời gian của nến để tính
+cooldown. Chỉ báo được tính một lần cho cả chuỗi, sau đó vòng lặp chỉ dừng ở các nến
+có thể phát sinh tín hiệu nên một năm nến 1m chạy trong vài giây.
+
+Ví dụ:
+    python backtest.py --pairs BTC/USDT,ETH/USDT --timeframe 1h --days 180
+    python backtest.py --mock --seed 42 --timeframe 1m --days 365
+"""
+
+import time
+import logging
+import argparse
+
+import ccxt
+import numpy as np
+import pandas as pd
+from ta.momentum import RSIIndicator
+from ta.trend import MACD
+
+import main
+from main import CryptoSignalBot, MockBinance, IndicatorSnapshot, combine_trading_stats
+from candle_cache import OHLCV_COLUMNS, timeframe_to_ms
+from candle_store import CandleStore, CANDLE_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class Backtester:
+    """Chạy lại chiến lược của một CryptoSignalBot trên chuỗi nến của một cặp"""
+
+    def __init__(self, symbol, candles, timeframe, strategy=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.candles = to_candle_array(candles)
+        self.bot = CryptoSignalBot(symbol=symbol, connect=False, strategy=strategy, timeframe=timeframe)
+        self._now = 0.0
+        self.bot.clock = lambda: self._now
+        self.trades = []
+
+    def compute_indicators(self):
+        """Tính RSI/MACD cho cả chuỗi theo tham số chiến lược của bot"""
+        strategy = self.bot.strategy
+        closes = self.candles[:, 4]
+        indicators = {'close': closes}
+        indicators['rsi'] = compute_rsi(closes, strategy.rsi_window)
+        indicators.update(compute_macd(closes, strategy.macd_fast, strategy.macd_slow, strategy.macd_signal))
+        return indicators
+
+    def _candidate_indices(self, rsi, macd, macd_signal, prev_macd, prev_macd_signal):
+        """Các nến có thể phát sinh tín hiệu vào lệnh / thoát lệnh long / thoát lệnh short"""
+        bot = self.bot
+        strategy = bot.strategy
+        with np.errstate(invalid='ignore'):
+            entry = np.zeros(len(rsi), dtype=bool)
+            if bot.signal_mode in ['RSI', 'BOTH'] and bot.rsi_independent:
+                entry |= (rsi < strategy.rsi_oversold) | (rsi > strategy.rsi_overbought)
+            if bot.signal_mode in ['MACD', 'BOTH'] and bot.macd_independent:
+                entry |= ((prev_macd <= prev_macd_signal) & (macd > macd_signal)) | \
+                         ((prev_macd >= prev_macd_signal) & (macd < macd_signal))
+            return {
+                None: np.flatnonzero(entry),
+                'long': np.flatnonzero(rsi > strategy.rsi_exit),
+                'short': np.flatnonzero(rsi < strategy.rsi_exit),
+            }
+
+    def run(self, indicators=None):
+        """Chạy backtest, trả về thống kê cùng định dạng get_trading_stats
+
+        `indicators` (close, rsi, macd, macd_signal, macd_histogram) có thể được tính
+        trước để dùng lại giữa nhiều lần chạy với các ngưỡng khác nhau.
+        """
+        bot = self.bot
+        if len(self.candles) == 0:
+            return bot.get_trading_stats()
+        if indicators is None:
+            indicators = self.compute_indicators()
+
+        close = indicators['close']
+        rsi = indicators['rsi']
+        macd = indicators['macd']
+        macd_signal = indicators['macd_signal']
+        macd_histogram = indicators['macd_histogram']
+        prev_macd = np.concatenate(([np.nan], macd[:-1]))
+        prev_macd_signal = np.concatenate(([np.nan], macd_signal[:-1]))
+        # Tín hiệu được đánh giá khi nến đóng
+        close_times = (self.candles[:, 0] + timeframe_to_ms(self.timeframe)) / 1000
+
+        candidates = self._candidate_indices(rsi, macd, macd_signal, prev_macd, prev_macd_signal)
+        cooldown = bot.alert_cooldown
+        open_trade = None
+        i = 0
+        while True:
+            position = bot.current_position if bot.current_position in ['long', 'short'] else None
+            indices = candidates[position]
+            k = np.searchsorted(indices, i)
+            if k >= len(indices):
+                break
+            i = int(indices[k])
+
+            self._now = close_times[i]
+            snapshot = IndicatorSnapshot(close[i], rsi[i], macd[i], macd_signal[i], macd_histogram[i],
+                                         prev_macd[i], prev_macd_signal[i])
+            signal_data = bot.evaluate_snapshot(snapshot)
+            if signal_data:
+                if signal_data['signal'] in ['long', 'short']:
+                    open_trade = {
+                        'symbol': self.symbol,
+                        'side': signal_data['signal'],
+                        'trigger': signal_data.get('trigger'),
+                        'entry_time': close_times[i],
+                        'entry_price': signal_data['price'],
+                    }
+                else:
+                    open_trade.update({
+                        'exit_time': close_times[i],
+                        'exit_price': signal_data['price'],
+                        'pnl': signal_data['pnl'],
+                    })
+                    self.trades.append(open_trade)
+                    open_trade = None
+                bot.apply_signal(signal_data)
+
+            # Bỏ qua các nến còn trong thời gian cooldown (mọi tín hiệu đều cần hết cooldown)
+            i = max(i + 1, int(np.searchsorted(close_times, bot.last_alert_time + cooldown, side='right')))
+
+        return bot.get_trading_stats()
+
+
+def to_candle_array(candles):
+    """Chuyển dữ liệu nến (list, ndarray hoặc DataFrame) sang ndarray (n, 6), timestamp tính bằng ms"""
+    if isinstance(candles, pd.DataFrame):
+        df = candles[OHLCV_COLUMNS].copy()
+        if pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df['timestamp'] = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        return df.to_numpy(dtype=np.float64)
+    return np.asarray(candles, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+
+
+def compute_rsi(closes, window):
+    """RSI cho cả chuỗi giá, dùng cùng cách tính với CryptoSignalBot.calculate_rsi"""
+    return RSIIndicator(close=pd.Series(closes), window=window).rsi().to_numpy()
+
+
+def compute_macd(closes, fast, slow, signal):
+    """MACD cho cả chuỗi giá, dùng cùng cách tính với CryptoSignalBot.calculate_macd"""
+    macd_indicator = MACD(close=pd.Series(closes), window_fast=fast, window_slow=slow, window_sign=signal)
+    return {
+        'macd': macd_indicator.macd().to_numpy(),
+        'macd_signal': macd_indicator.macd_signal().to_numpy(),
+        'macd_histogram': macd_indicator.macd_diff().to_numpy(),
+    }
+
+
+def run_backtest(candles_by_pair, timeframe, strategy=None):
+    """Backtest nhiều cặp, trả về (thống kê tổng hợp, danh sách giao dịch)"""
+    stats_by_pair = {}
+    trades = []
+    for symbol, candles in candles_by_pair.items():
+        backtester = Backtester(symbol, candles, timeframe, strategy=strategy)
+        stats_by_pair[symbol] = backtester.run()
+        trades.extend(backtester.trades)
+    return combine_trading_stats(stats_by_pair), trades
+
+
+def load_candles(args):
+    """Lấy dữ liệu nến cho các cặp theo tham số dòng lệnh"""
+    timeframe_ms = timeframe_to_ms(args.timeframe)
+    count = int(args.days * 86400 * 1000 // timeframe_ms)
+    candles_by_pair = {}
+
+    if args.mock:
+        for i, symbol in enumerate(args.pairs):
+            seed = None if args.seed is None else args.seed + i
+            candles_by_pair[symbol] = MockBinance(seed=seed).generate_history(args.timeframe, count)
+        return candles_by_pair
+
+    # Dữ liệu thật được đọc từ kho nến trên đĩa, chỉ tải từ sàn phần còn thiếu
+    exchange = ccxt.binance({'enableRateLimit': True})
+    store = CandleStore(CANDLE_STORE_DIR, exchange_id=exchange.id)
+    since = exchange.milliseconds() - count * timeframe_ms
+    for symbol in args.pairs:
+        added = store.backfill(exchange, symbol, args.timeframe, since)
+        logger.info(f"{symbol} {args.timeframe}: tải thêm {added} nến vào kho")
+        candles_by_pair[symbol] = store.read(symbol, args.timeframe, start=since)
+    return candles_by_pair
+
+
+def print_report(stats, trades, elapsed, candle_count):
+    print("=" * 60)
+    print(f"📊 KẾT QUẢ BACKTEST ({candle_count} nến trong {elapsed:.2f} giây)")
+    print(f"💰 Tổng PnL: ${stats['total_pnl']:+.2f}")
+    print(f"📈 Tổng số giao dịch: {stats['total_trades']}")
+    print(f"🎯 Tỷ lệ thắng tổng: {stats['overall_win_rate']:.1f}%")
+    print(f"🔄 Vị thế đang mở: {stats['active_positions']}")
+    print("📋 Chi tiết theo từng cặp:")
+    for pair, pair_stats in stats['stats_by_pair'].items():
+        print(f"  {pair}: {pair_stats['total_trades']} giao dịch | "
+              f"Thắng {pair_stats['win_rate']:.1f}% | PnL: ${pair_stats['total_pnl']:+.2f}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest chiến lược RSI + MACD trên dữ liệu lịch sử')
+    parser.add_argument('--pairs', default=','.join(main.TRADING_PAIRS), help='Các cặp, phân tách bằng dấu phẩy')
+    parser.add_argument('--timeframe', default=main.RSI_TIMEFRAME)
+    parser.add_argument('--days', type=float, default=90, help='Số ngày dữ liệu')
+    parser.add_argument('--mock', action='store_true', help='Dùng dữ liệu giả lập thay vì tải từ Binance')
+    parser.add_argument('--seed', type=int, default=None, help='Seed cho dữ liệu giả lập')
+    parser.add_argument('--trades', default=None, help='Ghi danh sách giao dịch ra file CSV')
+    args = parser.parse_args()
+    args.pairs = [pair.strip() for pair in args.pairs.split(',') if pair.strip()]
+
+    candles_by_pair = load_candles(args)
+    start = time.perf_counter()
+    stats, trades = run_backtest(candles_by_pair, args.timeframe)
+    elapsed = time.perf_counter() - start
+
+    print_report(stats, trades, elapsed, sum(len(candles) for candles in candles_by_pair.values()))
+    if args.trades:
+        trades_df = pd.DataFrame(trades)
+        for column in ['entry_time', 'exit_time']:
+            if column in trades_df:
+                trades_df[column] = pd.to_datetime(trades_df[column], unit='s')
+        trades_df.to_csv(args.trades, index=False)
+        print(f"Đã ghi {len(trades)} giao dịch vào {args.trades}")
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Các benchmark hiệu năng cho Crypto Signal Bot
+
+Ví dụ:
+    python benchmark.py fetch --pairs 1 10 100 --latency 0.1
+    python benchmark.py indicators --candles 2000
+    python benchmark.py router --latency 0.2
+    python benchmark.py timeframes --pairs 20 --timeframes 5m,15m,1h,4h
+    python benchmark.py alerts --signals 50
+    python benchmark.py logging --pairs 100 --cycles 50
+    python benchmark.py crosssection --pairs 500 --cycles 20
+    python benchmark.py tickers --pairs 10 100 300
+    python benchmark.py shards --pairs 2000 --workers 4
+    python benchmark.py warmstart --pairs 300
+"""
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+import zlib
+import tempfile
+from logging.handlers import RotatingFileHandler
+
+# Không ghi dữ liệu giả lập vào kho nến trên đĩa
+os.environ['CANDLE_STORE_DIR'] = ''
+
+import numpy as np
+import pandas as pd
+
+import main
+from main import CryptoSignalBot, MockBinance
+from candle_cache import CandleCache, CandleBuffer, _tail_frame
+from alert_dispatcher import AlertDispatcher
+from telegram.error import RetryAfter
+from indicators import IndicatorState, IndicatorEngine, stack_candles
+from log_pipeline import LogPipeline
+from sharding import assign_shards
+from warm_start import WarmStartSnapshot
+
+
+class StandInExchange:
+    """Sàn giả lập cục bộ: trả dữ liệu của MockBinance sau một độ trễ mạng cố định"""
+
+    def __init__(self, latency=0.1, blocking=False):
+        self.latency = latency
+        self.blocking = blocking
+        self.mock = MockBinance(starting_price=20000, volatility=0.05)
+        self.requests = 0
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=100):
+        self.requests += 1
+        if self.blocking:
+            # Giống client ccxt đồng bộ: chặn luôn event loop trong lúc chờ mạng
+            time.sleep(self.latency)
+            return self.mock.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        return self._fetch_ohlcv_async(symbol, timeframe, since, limit)
+
+    async def _fetch_ohlcv_async(self, symbol, timeframe, since, limit):
+        await asyncio.sleep(self.latency)
+        return self.mock.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def fetch_tickers(self, symbols=None):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return self.mock.fetch_tickers(symbols)
+
+
+class NullTelegramBot:
+    """Bot Telegram giả: bỏ qua tin nhắn để benchmark không phụ thuộc mạng"""
+
+    class _Message:
+        message_id = 0
+
+    async def send_message(self, **kwargs):
+        return self._Message()
+
+
+class FloodLimitedTelegramBot:
+    """Bot Telegram giả có giới hạn chống flood: tối đa `limit` tin mỗi `window` giây cho mỗi chat"""
+
+    class _Message:
+        def __init__(self, message_id):
+            self.message_id = message_id
+
+    def __init__(self, limit=20, window=60.0, latency=0.05):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.sent = {}  # chat_id -> thời điểm các tin đã gửi
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        recent = [ts for ts in self.sent.get(chat_id, []) if now - ts < self.window]
+        if len(recent) >= self.limit:
+            raise RetryAfter(int(self.window - (now - recent[0])) + 1)
+        self.sent[chat_id] = recent + [now]
+        return self._Message(len(recent) + 1)
+
+
+def _make_bots(n_pairs, exchange):
+    """Tạo n bot dùng chung sàn giả lập"""
+    telegram_bot = NullTelegramBot()
+    alerts = AlertDispatcher(telegram_bot, batch_window=0)
+    return [
+        CryptoSignalBot(symbol=f"COIN{i}/USDT", use_mock=True, exchange=exchange, bot=telegram_bot, alerts=alerts,
+                        chat_id='0')
+        for i in range(n_pairs)
+    ]
+
+
+async def _run_one_cycle(bots):
+    start = time.perf_counter()
+    await asyncio.gather(*(bot.run_cycle() for bot in bots))
+    return time.perf_counter() - start
+
+
+def bench_fetch(args):
+    """So sánh thời gian một chu kỳ giữa client đồng bộ (chặn) và client async"""
+    print(f"Độ trễ mạng giả lập: {args.latency * 1000:.0f} ms/request")
+    print(f"{'Số cặp':>8} | {'Đồng bộ (s)':>12} | {'Async (s)':>10} | {'Tăng tốc':>8}")
+    for n_pairs in args.pairs:
+        blocking = asyncio.run(_run_one_cycle(_make_bots(n_pairs, StandInExchange(args.latency, blocking=True))))
+        concurrent = asyncio.run(_run_one_cycle(_make_bots(n_pairs, StandInExchange(args.latency))))
+        print(f"{n_pairs:>8} | {blocking:>12.3f} | {concurrent:>10.3f} | {blocking / concurrent:>7.1f}x")
+
+
+def bench_indicators(args):
+    """So sánh tính lại toàn bộ RSI/MACD bằng `ta` với cập nhật tăng dần O(1)"""
+    telegram_bot = NullTelegramBot()
+    bot = CryptoSignalBot(symbol='BTC/USDT', use_mock=True, exchange=MockBinance(), bot=telegram_bot)
+    rng = np.random.default_rng(0)
+    closes = 20000 * np.exp(np.cumsum(rng.normal(0, 0.01, args.candles + args.window)))
+
+    # Độ chính xác: chạy trên cùng một chuỗi giá
+    df = pd.DataFrame({'close': closes})
+    bot.calculate_rsi(df)
+    bot.calculate_macd(df)
+    state = IndicatorState(main.RSI_WINDOW, main.MACD_FAST, main.MACD_SLOW, main.MACD_SIGNAL)
+    streamed = np.array([state.update(close) for close in closes])
+    reference = df[['rsi', 'macd', 'macd_signal', 'macd_histogram']].to_numpy()
+    print(f"Sai lệch lớn nhất so với ta trên {len(closes)} nến: {np.nanmax(np.abs(streamed - reference)):.2e}")
+
+    # Tính lại toàn bộ cửa sổ mỗi nến mới (cách cũ)
+    start = time.perf_counter()
+    for i in range(args.candles):
+        window = pd.DataFrame({'close': closes[i:i + args.window]})
+        bot.calculate_rsi(window)
+        bot.calculate_macd(window)
+    full = (time.perf_counter() - start) / args.candles
+
+    # Cập nhật tăng dần: ghi nhận nến vừa đóng + tính nến đang hình thành
+    state = IndicatorState(main.RSI_WINDOW, main.MACD_FAST, main.MACD_SLOW, main.MACD_SIGNAL)
+    for close in closes[:args.window]:
+        state.update(close)
+    start = time.perf_counter()
+    for close in closes[args.window:]:
+        state.update(close)
+        state.update(close, closed=False)
+    incremental = (time.perf_counter() - start) / args.candles
+
+    print(f"Tính lại toàn bộ ({args.window} nến): {full * 1e6:10.1f} µs/nến")
+    print(f"Cập nhật tăng dần:          {incremental * 1e6:10.1f} µs/nến ({full / incremental:.0f}x)")
+
+
+def bench_router(args):
+    """Độ trễ trả lời theo mẫu (không qua LLM) cho các câu hỏi chỉ báo có cấu trúc"""
+    import crypto_agent
+    from query_router import fast_reply
+
+    crypto_agent.exchange = StandInExchange(args.latency, blocking=True)
+    queries = [f"{symbol} {indicator} {timeframe}" for symbol in ['btc', 'eth', 'sol']
+               for indicator in ['rsi', 'macd', 'rsi macd'] for timeframe in ['1h', '4h']]
+
+    def measure():
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            assert fast_reply(query) is not None
+            timings.append(time.perf_counter() - start)
+        return np.array(timings) * 1000
+
+    cold = measure()
+    warm = measure()
+    print(f"Độ trễ sàn giả lập: {args.latency * 1000:.0f} ms/request, {len(queries)} câu hỏi")
+    print(f"Lần đầu (tải nến): p50 {np.median(cold):8.2f} ms | p99 {np.percentile(cold, 99):8.2f} ms")
+    print(f"Đã có cache:       p50 {np.median(warm):8.3f} ms | p99 {np.percentile(warm, 99):8.3f} ms")
+
+
+def bench_timeframes(args):
+    """Tải riêng từng khung thời gian so với gộp từ một luồng nến gốc (request và thời gian mỗi chu kỳ)"""
+    pairs = [f"COIN{i}/USDT" for i in range(args.pairs)]
+
+    async def separate(cache, exchange):
+        await asyncio.gather(*(cache.fetch(exchange, pair, timeframe) for pair in pairs for timeframe in args.timeframes))
+
+    async def resampled(cache, exchange):
+        await asyncio.gather(*(cache.fetch_timeframes(exchange, pair, args.timeframes, base_timeframe=args.base)
+                               for pair in pairs))
+
+    async def measure(cycle):
+        exchange, cache = StandInExchange(args.latency), CandleCache()
+        await cycle(cache, exchange)  # Lần đầu tải lịch sử
+        exchange.requests = 0
+        start = time.perf_counter()
+        for _ in range(args.cycles):
+            await cycle(cache, exchange)
+        return exchange.requests / args.cycles, (time.perf_counter() - start) / args.cycles
+
+    print(f"{args.pairs} cặp × {len(args.timeframes)} khung ({','.join(args.timeframes)}), "
+          f"độ trễ {args.latency * 1000:.0f} ms/request")
+    for name, cycle in [('Tải riêng từng khung', separate), (f"Gộp từ nến {args.base}", resampled)]:
+        requests, elapsed = asyncio.run(measure(cycle))
+        print(f"{name:<22}: {requests:6.0f} request/chu kỳ | {elapsed * 1000:8.1f} ms/chu kỳ")
+
+
+def bench_alerts(args):
+    """Nhiều tín hiệu cùng lúc vào một chat có giới hạn chống flood: gửi trực tiếp vs qua hàng đợi"""
+    texts = [f"🚨 TÍN HIỆU LONG (RSI): COIN{i} 1h tại giá $100.00\n📊 RSI (14) = 25.00 < 30" for i in range(args.signals)]
+
+    async def direct():
+        bot = FloodLimitedTelegramBot(args.flood_limit)
+        results = await asyncio.gather(*(bot.send_message(chat_id=1, text=text) for text in texts),
+                                       return_exceptions=True)
+        delivered = sum(not isinstance(result, Exception) for result in results)
+        return delivered, sum(len(times) for times in bot.sent.values())
+
+    async def queued():
+        bot = FloodLimitedTelegramBot(args.flood_limit)
+        dispatcher = AlertDispatcher(bot, chat_interval=args.chat_interval, batch_window=args.batch_window)
+        results = await asyncio.gather(*(dispatcher.submit(1, text) for text in texts))
+        await dispatcher.close()
+        return sum(result is not None for result in results), sum(len(times) for times in bot.sent.values())
+
+    print(f"{args.signals} tín hiệu cùng lúc, giới hạn {args.flood_limit} tin/phút mỗi chat")
+    for name, run in [('Gửi trực tiếp', direct), ('Hàng đợi + gộp tin', queued)]:
+        start = time.perf_counter()
+        delivered, messages = asyncio.run(run())
+        print(f"{name:<20}: {delivered:4d}/{args.signals} cảnh báo tới nơi trong {messages:3d} tin nhắn | "
+              f"{time.perf_counter() - start:6.2f}s")
+
+
+def bench_crosssection(args):
+    """Đánh giá tín hiệu mọi cặp mỗi chu kỳ: từng cặp trên DataFrame vs một lần tính trên mảng cặp × nến"""
+    rng = np.random.default_rng(0)
+    total = main.CANDLE_LIMIT + args.cycles
+    closes = 20000 * np.exp(np.cumsum(rng.normal(0, 0.01, (args.pairs, total)), axis=1))
+    timestamps = np.arange(total) * 3600000.0
+    candles = np.stack([np.broadcast_to(timestamps, closes.shape), closes, closes, closes, closes,
+                        np.ones_like(closes)], axis=2)  # (cặp, nến, 6)
+
+    per_pair_bots = _make_bots(args.pairs, MockBinance())
+    vector_bots = _make_bots(args.pairs, MockBinance())
+    engine = main.create_cross_section_engine()
+    buffers = [CandleBuffer('1h') for _ in range(args.pairs)]
+    for buffer, series in zip(buffers, candles):
+        buffer.replace(series[:main.CANDLE_LIMIT])
+
+    def per_pair():
+        fired = 0
+        for bot, buffer in zip(per_pair_bots, buffers):
+            df = bot.calculate_indicators(_tail_frame(buffer, main.CANDLE_LIMIT))
+            fired += bot.check_entry_conditions(df) is not None
+        return fired
+
+    def vectorized():
+        arrays = [buffer.to_array() for buffer in buffers]
+        stamps, values = stack_candles(arrays, main.CANDLE_LIMIT)
+        snapshots = engine.sync([bot.symbol for bot in vector_bots], stamps, values)
+        positions = np.fromiter((main.POSITION_CODES.get(bot.current_position, 0) for bot in vector_bots),
+                                dtype=np.int8, count=len(vector_bots))
+        fired = 0
+        for row in main.signal_candidates(snapshots, positions, vector_bots[0]):
+            fired += vector_bots[row].evaluate_snapshot(main.IndicatorSnapshot(*snapshots[:, row].tolist())) is not None
+        return fired
+
+    results = {name: [0.0, 0.0, 0] for name in ('per_pair', 'vectorized')}
+    for cycle in range(args.cycles + 1):
+        if cycle:
+            for buffer, series in zip(buffers, candles):
+                buffer.merge(series[main.CANDLE_LIMIT + cycle - 1:main.CANDLE_LIMIT + cycle])
+        for name, run in (('per_pair', per_pair), ('vectorized', vectorized)):
+            start = time.perf_counter()
+            fired = run()
+            elapsed = time.perf_counter() - start
+            results[name][0 if cycle == 0 else 1] += elapsed
+            results[name][2] += fired
+
+    print(f"{args.pairs} cặp, {main.CANDLE_LIMIT} nến, {args.cycles} chu kỳ (mỗi chu kỳ một nến mới)")
+    for name, label in (('per_pair', 'Từng cặp (DataFrame)'), ('vectorized', 'Mảng cặp × nến')):
+        first, steady, fired = results[name]
+        print(f"{label:<22}: khởi động {first * 1000:8.1f} ms | mỗi chu kỳ {steady / args.cycles * 1000:8.2f} ms "
+              f"| {fired} tín hiệu")
+
+
+def bench_tickers(args):
+    """Cập nhật nến đang hình thành của cả danh sách: fetch_ohlcv từng cặp vs fetch_tickers theo lô"""
+    async def per_pair(cache, exchange, pairs):
+        await asyncio.gather(*(cache.update(exchange, pair, args.timeframe) for pair in pairs))
+
+    async def bulk(cache, exchange, pairs):
+        await cache.refresh(exchange, pairs, args.timeframe, batch_size=args.batch_size)
+
+    async def measure(cycle, pairs):
+        exchange, cache = StandInExchange(args.latency), CandleCache()
+        await cycle(cache, exchange, pairs)  # Lần đầu tải lịch sử
+        exchange.requests = 0
+        start = time.perf_counter()
+        for _ in range(args.cycles):
+            await cycle(cache, exchange, pairs)
+        return exchange.requests / args.cycles, (time.perf_counter() - start) / args.cycles
+
+    print(f"Khung {args.timeframe}, độ trễ {args.latency * 1000:.0f} ms/request, lô {args.batch_size} cặp "
+          f"(trong một nến; khi đóng nến mỗi cặp tải nến đã đóng một lần)")
+    print(f"{'Số cặp':>8} | {'fetch_ohlcv từng cặp':>28} | {'fetch_tickers theo lô':>28}")
+    for n_pairs in args.pairs:
+        pairs = [f"COIN{i}/USDT" for i in range(n_pairs)]
+        row = []
+        for cycle in (per_pair, bulk):
+            requests, elapsed = asyncio.run(measure(cycle, pairs))
+            row.append(f"{requests:6.0f} request, {elapsed * 1000:7.1f} ms")
+        print(f"{n_pairs:>8} | {row[0]:>28} | {row[1]:>28}")
+
+
+def bench_logging(args):
+    """Thời gian log chỉ báo/PnL mỗi cặp trong chu kỳ: ghi file đồng bộ vs hàng đợi + luồng ghi"""
+    rows = [(f"COIN{i}/USDT", 45.0 + i % 10, 0.0123, 0.0101, 0.0022, 12.5) for i in range(args.pairs)]
+
+    def eager(log):
+        for symbol, rsi, macd, signal, histogram, pnl in rows:
+            log.info(f"Chỉ báo {symbol} 1h: RSI: {rsi:.2f} | MACD: {macd:.4f} | Signal: {signal:.4f} | Histogram: {histogram:.4f}")
+            log.info(f"PnL hiện tại cho {symbol}: ${pnl:.2f}")
+
+    def lazy(log):
+        if not log.isEnabledFor(logging.INFO):
+            return
+        for symbol, rsi, macd, signal, histogram, pnl in rows:
+            log.info("Chỉ báo %s %s: RSI: %.2f | MACD: %.4f | Signal: %.4f | Histogram: %.4f",
+                     symbol, '1h', rsi, macd, signal, histogram)
+            log.info("PnL hiện tại cho %s: $%.2f", symbol, pnl)
+
+    with tempfile.TemporaryDirectory() as directory:
+        def file_handler(name):
+            handler = RotatingFileHandler(os.path.join(directory, f"{name}.log"), maxBytes=10 * 1024 * 1024,
+                                          backupCount=5, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            return handler
+
+        variants = [('File đồng bộ + f-string', eager, logging.INFO, False),
+                    ('Hàng đợi + định dạng lười', lazy, logging.INFO, True),
+                    ('Hàng đợi, LOG_LEVEL=WARNING', lazy, logging.WARNING, True)]
+        print(f"{args.pairs} cặp x {args.cycles} chu kỳ, 2 dòng log mỗi cặp")
+        for i, (name, cycle, level, queued) in enumerate(variants):
+            log = logging.getLogger(f"benchmark.logging.{i}")
+            log.propagate = False
+            log.setLevel(level)
+            handler = file_handler(f"variant{i}")
+            pipeline = None
+            if queued:
+                pipeline = LogPipeline([handler])
+                pipeline.start()
+                log.addHandler(pipeline.handler)
+            else:
+                log.addHandler(handler)
+
+            start = time.perf_counter()
+            for _ in range(args.cycles):
+                cycle(log)
+            elapsed = time.perf_counter() - start
+            drain_start = time.perf_counter()
+            if pipeline is not None:
+                pipeline.stop()
+            drain = time.perf_counter() - drain_start
+            handler.close()
+            print(f"{name:<28}: {elapsed / (args.cycles * args.pairs) * 1e6:7.1f} µs/cặp trong event loop | "
+                  f"ghi nốt ở luồng ghi: {drain * 1000:7.1f} ms")
+
+
+def bench_shards(args):
+    """Chia cặp cho worker: độ cân bằng và số cặp phải đổi worker khi thêm một worker"""
+    pairs = [f"COIN{i}/USDT" for i in range(args.pairs)]
+
+    def modulo(keys, shards):
+        assignment = {shard: [] for shard in range(shards)}
+        for key in keys:
+            assignment[zlib.crc32(key.encode()) % shards].append(key)
+        return assignment
+
+    print(f"{args.pairs} cặp, {args.workers} -> {args.workers + 1} worker")
+    for name, assign in (('hash % N', modulo), ('Rendezvous hashing', assign_shards)):
+        start = time.perf_counter()
+        before = assign(pairs, args.workers)
+        elapsed = time.perf_counter() - start
+        after = assign(pairs, args.workers + 1)
+        owner = {pair: shard for shard, keys in before.items() for pair in keys}
+        moved = sum(owner[pair] != shard for shard, keys in after.items() for pair in keys)
+        sizes = [len(keys) for keys in before.values()]
+        print(f"{name:<20}: mỗi worker {min(sizes)}-{max(sizes)} cặp | đổi worker {moved / args.pairs * 100:5.1f}% "
+              f"cặp (tối thiểu {100 / (args.workers + 1):.1f}%) | chia trong {elapsed * 1000:.1f} ms")
+
+
+def bench_warmstart(args):
+    """Chu kỳ đầu sau khi khởi động: tải cả cửa sổ + tính lại chỉ báo vs nạp snapshot rồi chỉ tải nến thiếu"""
+    pairs = [f"COIN{i}/USDT" for i in range(args.pairs)]
+    exchange = StandInExchange(args.latency)
+
+    async def first_cycle(cache, engine, bulk=False):
+        if bulk:
+            # Như CROSS_SECTIONAL: giá của cả danh sách qua fetch_tickers theo lô
+            await cache.refresh(exchange, pairs, args.timeframe)
+            buffers = [cache.get_buffer(pair, args.timeframe) for pair in pairs]
+        else:
+            buffers = await asyncio.gather(*(cache.update(exchange, pair, args.timeframe) for pair in pairs))
+        start = time.perf_counter()
+        values = []
+        for pair, buffer in zip(pairs, buffers):
+            candles = buffer.to_array()
+            # Chỉ báo của nến đã đóng cuối cùng (nến đang hình thành đổi giá giữa các lần tải)
+            values.append(engine.sync((pair, args.timeframe), candles[:, 0].astype(np.int64), candles[:, 4])[-2])
+        return np.array(values), time.perf_counter() - start
+
+    def measure(load=False, bulk=False):
+        cache, engine = CandleCache(), IndicatorEngine()
+        exchange.requests = 0
+        start = time.perf_counter()
+        if load:
+            snapshot.load(cache, engine)
+        values, indicator_seconds = asyncio.run(first_cycle(cache, engine, bulk))
+        return values, time.perf_counter() - start, indicator_seconds, exchange.requests, cache.candles_fetched
+
+    # Lần chạy trước: tải và tính đầy đủ rồi lưu snapshot như khi bot dừng
+    cache, engine = CandleCache(), IndicatorEngine()
+    asyncio.run(first_cycle(cache, engine))
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = WarmStartSnapshot(os.path.join(tmp, 'warm_start.npz'))
+        snapshot.save(cache, engine)
+        size = os.path.getsize(snapshot.path)
+
+        results = [('Khởi động lạnh', measure()), ('Warm start', measure(load=True)),
+                   ('Warm + tickers', measure(load=True, bulk=True))]
+
+    print(f"{args.pairs} cặp khung {args.timeframe}, độ trễ {args.latency * 1000:.0f} ms/request, "
+          f"snapshot {size / 1024:.0f} KB (ghi trong {snapshot.last_save_seconds * 1000:.1f} ms)")
+    for label, (_, elapsed, indicator_seconds, requests, candles) in results:
+        print(f"{label:<15}: {elapsed * 1000:8.1f} ms | chỉ báo {indicator_seconds * 1000:7.1f} ms | "
+              f"{requests} request, {candles} nến tải về")
+    # Hai cách khởi động phải cho cùng giá trị chỉ báo
+    cold = results[0][1][0]
+    print(f"Chênh lệch RSI/MACD lớn nhất: {max(np.nanmax(np.abs(cold - result[0])) for _, result in results):.2e}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Benchmark hiệu năng Crypto Signal Bot')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help='Độ trễ một chu kỳ lấy dữ liệu cho nhiều cặp')
+    fetch_parser.add_argument('--pairs', type=int, nargs='+', default=[1, 10, 100])
+    fetch_parser.add_argument('--latency', type=float, default=0.1, help='Độ trễ mạng giả lập (giây)')
+    fetch_parser.set_defaults(func=bench_fetch)
+
+    indicators_parser = subparsers.add_parser('indicators', help='Tính lại toàn bộ vs cập nhật tăng dần RSI/MACD')
+    indicators_parser.add_argument('--candles', type=int, default=2000, help='Số nến mới để đo')
+    indicators_parser.add_argument('--window', type=int, default=100, help='Số nến mỗi lần tính lại')
+    indicators_parser.set_defaults(func=bench_indicators)
+
+    router_parser = subparsers.add_parser('router', help='Độ trễ trả lời theo mẫu không qua LLM')
+    router_parser.add_argument('--latency', type=float, default=0.2, help='Độ trễ mạng giả lập (giây)')
+    router_parser.set_defaults(func=bench_router)
+
+    timeframes_parser = subparsers.add_parser('timeframes', help='Tải riêng từng khung vs gộp từ một luồng nến gốc')
+    timeframes_parser.add_argument('--pairs', type=int, default=20)
+    timeframes_parser.add_argument('--timeframes', default='5m,15m,1h,4h', help='Các khung, phân tách bằng dấu phẩy')
+    timeframes_parser.add_argument('--base', default='1m', help='Khung của luồng nến gốc')
+    timeframes_parser.add_argument('--cycles', type=int, default=5)
+    timeframes_parser.add_argument('--latency', type=float, default=0.05, help='Độ trễ mạng giả lập (giây)')
+    timeframes_parser.set_defaults(func=bench_timeframes)
+
+    alerts_parser = subparsers.add_parser('alerts', help='Gửi cảnh báo trực tiếp vs qua hàng đợi có giới hạn tốc độ')
+    alerts_parser.add_argument('--signals', type=int, default=50, help='Số tín hiệu cùng lúc')
+    alerts_parser.add_argument('--flood-limit', type=int, default=20, help='Số tin tối đa mỗi phút mỗi chat')
+    alerts_parser.add_argument('--chat-interval', type=float, default=3.0)
+    alerts_parser.add_argument('--batch-window', type=float, default=1.0)
+    alerts_parser.set_defaults(func=bench_alerts)
+
+    crosssection_parser = subparsers.add_parser('crosssection', help='Đánh giá từng cặp vs mảng cặp × nến')
+    crosssection_parser.add_argument('--pairs', type=int, default=500)
+    crosssection_parser.add_argument('--cycles', type=int, default=20)
+    crosssection_parser.set_defaults(func=bench_crosssection)
+
+    tickers_parser = subparsers.add_parser('tickers', help='fetch_ohlcv từng cặp vs fetch_tickers theo lô')
+    tickers_parser.add_argument('--pairs', type=int, nargs='+', default=[10, 100, 300])
+    tickers_parser.add_argument('--timeframe', default='1h')
+    tickers_parser.add_argument('--batch-size', type=int, default=100)
+    tickers_parser.add_argument('--cycles', type=int, default=5)
+    tickers_parser.add_argument('--latency', type=float, default=0.05, help='Độ trễ mạng giả lập (giây)')
+    tickers_parser.set_defaults(func=bench_tickers)
+
+    logging_parser = subparsers.add_parser('logging', help='Log đồng bộ vs hàng đợi + luồng ghi riêng')
+    logging_parser.add_argument('--pairs', type=int, default=100)
+    logging_parser.add_argument('--cycles', type=int, default=50)
+    logging_parser.set_defaults(func=bench_logging)
+
+    shards_parser = subparsers.add_parser('shards', help='Chia cặp cho worker: hash % N vs rendezvous hashing')
+    shards_parser.add_argument('--pairs', type=int, default=2000)
+    shards_parser.add_argument('--workers', type=int, default=4)
+    shards_parser.set_defaults(func=bench_shards)
+
+    warmstart_parser = subparsers.add_parser('warmstart', help='Khởi động lạnh vs nạp snapshot buffer nến + chỉ báo')
+    warmstart_parser.add_argument('--pairs', type=int, default=300)
+    warmstart_parser.add_argument('--timeframe', default='1h')
+    warmstart_parser.add_argument('--latency', type=float, default=0.05, help='Độ trễ mạng giả lập (giây)')
+    warmstart_parser.set_defaults(func=bench_warmstart)
+
+    args = parser.parse_args()
+    if args.command == 'timeframes':
+        args.timeframes = [timeframe.strip() for timeframe in args.timeframes.split(',') if timeframe.strip()]
+
+    # Giảm log để không ảnh hưởng tới kết quả đo
+    logging.getLogger().setLevel(logging.WARNING)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bộ nhớ đệm nến OHLCV theo từng cặp/khung thời gian
+
+Sau lần tải đầy đủ đầu tiên, mỗi chu kỳ chỉ tải các nến mới hơn nến cuối đã lưu
+(`since=`) và cập nhật tại chỗ nến đang hình thành. Chỉ tải lại toàn bộ khi phát
+hiện khoảng trống dữ liệu.
+
+Nhiều khung thời gian của cùng một cặp có thể dùng chung một luồng nến gốc (ví dụ 1m):
+các khung lớn hơn được gộp từ nến gốc thay vì tải riêng từ sàn (`fetch_timeframes`).
+
+Với cả danh sách theo dõi, `refresh` cập nhật nến đang hình thành của mọi cặp bằng vài lần
+gọi `fetch_tickers` theo lô; chỉ cặp nào vừa đóng nến mới phải gọi `fetch_ohlcv` riêng.
+"""
+
+import time
+import asyncio
+import inspect
+import logging
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+MAX_BASE_CANDLES = 1000  # Số nến tối đa Binance trả về trong một lần fetch_ohlcv
+
+
+def timeframe_to_ms(timeframe):
+    """Đổi khung thời gian (1m, 1h, 4h...) sang mili giây"""
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+
+def closed_candles(ohlcv, timeframe, now_ms=None):
+    """Lọc bỏ nến đang hình thành (chưa tới thời điểm đóng nến)"""
+    ohlcv = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    now_ms = now_ms if now_ms is not None else time.time() * 1000
+    return ohlcv[ohlcv[:, 0] + timeframe_to_ms(timeframe) <= now_ms]
+
+
+def resample_ohlcv(ohlcv, timeframe):
+    """Gộp nến khung nhỏ (đã sắp theo thời gian) thành nến khung `timeframe`, shape (n, 6)
+
+    Nến được nhóm theo mốc bắt đầu `timestamp // timeframe * timeframe` (UTC, giống
+    Binance với các khung phút/giờ/ngày). Nhóm cuối có thể chưa đủ nến (nến đang hình thành).
+    """
+    ohlcv = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    if len(ohlcv) == 0:
+        return ohlcv.copy()
+    timeframe_ms = timeframe_to_ms(timeframe)
+    buckets = ohlcv[:, 0] // timeframe_ms * timeframe_ms
+    starts = np.flatnonzero(np.append(True, buckets[1:] != buckets[:-1]))
+    ends = np.append(starts[1:], len(ohlcv)) - 1
+    return np.column_stack((
+        buckets[starts],
+        ohlcv[starts, 1],
+        np.maximum.reduceat(ohlcv[:, 2], starts),
+        np.minimum.reduceat(ohlcv[:, 3], starts),
+        ohlcv[ends, 4],
+        np.add.reduceat(ohlcv[:, 5], starts),
+    ))
+
+
+async def fetch_ohlcv(exchange, symbol, timeframe, since=None, limit=100):
+    """Gọi fetch_ohlcv cho cả client async lẫn client đồng bộ (MockBinance)"""
+    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+    if inspect.isawaitable(ohlcv):
+        ohlcv = await ohlcv
+    return ohlcv
+
+
+async def fetch_tickers(exchange, symbols, batch_size=100):
+    """Lấy ticker của nhiều cặp với ít request nhất: {symbol: ticker}
+
+    Danh sách được chia thành các lô `batch_size` cặp (giới hạn độ dài tham số `symbols`
+    của Binance), các lô được gọi đồng thời.
+    """
+    async def fetch_batch(batch):
+        tickers = exchange.fetch_tickers(batch)
+        if inspect.isawaitable(tickers):
+            tickers = await tickers
+        return tickers
+
+    batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+    tickers = {}
+    for result in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+        tickers.update(result)
+    return tickers
+
+
+class CandleBuffer:
+    """Ring buffer chứa tối đa `capacity` nến gần nhất của một cặp/khung thời gian"""
+
+    def __init__(self, timeframe, capacity=100):
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.capacity = capacity
+        self._data = np.empty((capacity, len(OHLCV_COLUMNS)), dtype=np.float64)
+        self._start = 0  # Vị trí vật lý của nến cũ nhất
+        self._size = 0
+        self._ticker_volume = None  # Khối lượng 24h của ticker lần trước, để cộng dồn vào nến đang hình thành
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        """Timestamp (ms) của nến mới nhất, None nếu buffer rỗng"""
+        if self._size == 0:
+            return None
+        return int(self._data[(self._start + self._size - 1) % self.capacity, 0])
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self._ticker_volume = None
+
+    def _append(self, candle):
+        if self._size < self.capacity:
+            self._data[(self._start + self._size) % self.capacity] = candle
+            self._size += 1
+        else:
+            # Buffer đầy: ghi đè nến cũ nhất
+            self._data[self._start] = candle
+            self._start = (self._start + 1) % self.capacity
+
+    def replace(self, ohlcv):
+        """Thay toàn bộ nội dung buffer bằng dữ liệu mới"""
+        self.clear()
+        for candle in ohlcv[-self.capacity:]:
+            self._append(candle)
+
+    def merge(self, ohlcv):
+        """Gộp các nến mới vào buffer
+
+        Nến trùng timestamp với nến cuối được cập nhật tại chỗ (nến đang hình thành),
+        nến kế tiếp được thêm vào. Trả về False nếu có khoảng trống, khi đó cần tải lại.
+        """
+        # Nến tải từ sàn có khối lượng chính xác, ticker sau đó chỉ cộng phần phát sinh thêm
+        self._ticker_volume = None
+        for candle in ohlcv:
+            last_timestamp = self.last_timestamp
+            timestamp = candle[0]
+            if last_timestamp is None or timestamp == last_timestamp + self.timeframe_ms:
+                self._append(candle)
+            elif timestamp == last_timestamp:
+                self._data[(self._start + self._size - 1) % self.capacity] = candle
+            elif timestamp > last_timestamp:
+                return False
+            # Nến cũ hơn nến cuối đã đóng, bỏ qua
+        return True
+
+    def apply_price(self, price, timestamp, base_volume=None):
+        """Cập nhật nến đang hình thành bằng giá mới nhất (ticker)
+
+        `base_volume` là khối lượng 24h của ticker: phần tăng so với lần trước được cộng vào
+        khối lượng nến đang hình thành (ước lượng; khối lượng chính xác có khi tải lại nến).
+        Trả về False nếu giá thuộc một nến mới hơn nến cuối (nến cuối đã đóng, cần tải nến
+        đã đóng qua fetch_ohlcv để có giá đóng cửa chính xác).
+        """
+        last_timestamp = self.last_timestamp
+        if last_timestamp is None or timestamp >= last_timestamp + self.timeframe_ms:
+            return False
+        if timestamp >= last_timestamp:
+            candle = self._data[(self._start + self._size - 1) % self.capacity]
+            candle[4] = price
+            candle[2] = max(candle[2], price)
+            candle[3] = min(candle[3], price)
+            if base_volume is not None:
+                if self._ticker_volume is not None and base_volume > self._ticker_volume:
+                    candle[5] += base_volume - self._ticker_volume
+                self._ticker_volume = base_volume
+        return True
+
+    def to_array(self):
+        """Trả về bản sao các nến theo thứ tự thời gian, shape (n, 6)"""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._data[self._start:end].copy()
+        return np.concatenate((self._data[self._start:], self._data[:end - self.capacity]))
+
+    def to_frame(self):
+        """Trả về DataFrame cùng định dạng với fetch_ohlcv_data"""
+        df = pd.DataFrame(self.to_array(), columns=OHLCV_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype(np.int64), unit='ms')
+        return df
+
+
+class CandleCache:
+    """Quản lý CandleBuffer cho nhiều cặp/khung thời gian và tải dữ liệu tăng dần
+
+    Nếu có `store` (CandleStore), buffer rỗng được nạp từ kho trên đĩa trước khi gọi
+    sàn và các nến đã đóng tải về được ghi lại vào kho.
+    """
+
+    def __init__(self, capacity=100, store=None):
+        self.capacity = capacity
+        self.store = store
+        self._buffers = {}
+        # Thống kê để theo dõi lượng dữ liệu tải về
+        self.candles_fetched = 0
+        self.full_resyncs = 0
+        self.ticker_updates = 0  # Số lần cập nhật nến đang hình thành bằng ticker (không gọi fetch_ohlcv)
+
+    def get_buffer(self, symbol, timeframe, capacity=None):
+        key = (symbol, timeframe)
+        if key not in self._buffers:
+            self._buffers[key] = CandleBuffer(timeframe, capacity=capacity or self.capacity)
+        return self._buffers[key]
+
+    def export_buffers(self):
+        """Nến của mọi buffer không rỗng: {(symbol, timeframe): (capacity, mảng (n, 6))}"""
+        return {key: (buffer.capacity, buffer.to_array()) for key, buffer in self._buffers.items() if len(buffer)}
+
+    def restore_buffers(self, buffers):
+        """Nạp lại các buffer từ kết quả của `export_buffers`; lần `update` sau chỉ tải nến mới hơn"""
+        for (symbol, timeframe), (capacity, ohlcv) in buffers.items():
+            buffer = self._buffers[(symbol, timeframe)] = CandleBuffer(timeframe, capacity=capacity)
+            buffer.replace(ohlcv)
+
+    async def _resync(self, exchange, symbol, timeframe, buffer):
+        ohlcv = await fetch_ohlcv(exchange, symbol, timeframe, limit=buffer.capacity)
+        self.candles_fetched += len(ohlcv)
+        self.full_resyncs += 1
+        buffer.replace(ohlcv)
+        self._persist(symbol, timeframe, ohlcv)
+
+    def _persist(self, symbol, timeframe, ohlcv, newer_only=False):
+        """Ghi các nến đã đóng vào kho
+
+        `newer_only`: dữ liệu tải tiếp từ nến cuối (`since=`) luôn lặp lại nến kho đã có; bỏ các
+        nến đó để kho chỉ ghi nối vào cuối file thay vì gộp và ghi lại cả file.
+        """
+        if self.store is None or len(ohlcv) == 0:
+            return
+        try:
+            closed = closed_candles(ohlcv, timeframe)
+            if newer_only:
+                last_timestamp = self.store.last_timestamp(symbol, timeframe)
+                if last_timestamp is not None:
+                    closed = closed[closed[:, 0] > last_timestamp]
+            if len(closed):
+                self.store.append(symbol, timeframe, closed)
+        except Exception as e:
+            logger.warning(f"Lỗi ghi nến {symbol} {timeframe} vào kho: {e}")
+
+    async def update(self, exchange, symbol, timeframe, capacity=None):
+        """Cập nhật buffer của cặp/khung thời gian từ sàn và trả về buffer"""
+        buffer = self.get_buffer(symbol, timeframe, capacity)
+
+        if len(buffer) == 0 and self.store is not None:
+            # Khởi động lại: dùng nến đã lưu, chỉ cần tải phần mới hơn
+            buffer.replace(self.store.tail(symbol, timeframe, buffer.capacity))
+
+        if len(buffer) == 0:
+            await self._resync(exchange, symbol, timeframe, buffer)
+        else:
+            ohlcv = await fetch_ohlcv(exchange, symbol, timeframe, since=buffer.last_timestamp, limit=buffer.capacity)
+            self.candles_fetched += len(ohlcv)
+            self._persist(symbol, timeframe, ohlcv, newer_only=True)
+            # Trả về đủ `capacity` nến nghĩa là có thể còn nến mới hơn chưa tải được
+            if not ohlcv or len(ohlcv) >= buffer.capacity or not buffer.merge(ohlcv):
+                logger.info(f"Phát hiện khoảng trống dữ liệu {symbol} {timeframe}, tải lại toàn bộ")
+                await self._resync(exchange, symbol, timeframe, buffer)
+        return buffer
+
+    async def refresh(self, exchange, symbols, timeframe, capacity=None, batch_size=100):
+        """Cập nhật buffer `timeframe` của nhiều cặp, trả về danh sách cặp đã cập nhật
+
+        Giá mới nhất của mọi cặp được lấy bằng fetch_tickers theo lô và ghi vào nến đang hình
+        thành; chỉ cặp có buffer rỗng hoặc vừa sang nến mới mới gọi fetch_ohlcv riêng để bổ
+        sung nến đã đóng. Không lấy được ticker thì cập nhật từng cặp như `update`.
+        """
+        try:
+            tickers = await fetch_tickers(exchange, symbols, batch_size)
+        except Exception as e:
+            logger.warning(f"Lỗi khi lấy ticker theo lô: {e}, tải nến từng cặp")
+            tickers = {}
+
+        catch_up = []
+        for symbol in symbols:
+            buffer = self.get_buffer(symbol, timeframe, capacity)
+            ticker = tickers.get(symbol)
+            price = ticker.get('last') if ticker else None
+            if price is None:
+                catch_up.append(symbol)
+                continue
+            base_volume = ticker.get('baseVolume')
+            if not buffer.apply_price(float(price), ticker.get('timestamp') or time.time() * 1000,
+                                      None if base_volume is None else float(base_volume)):
+                catch_up.append(symbol)
+
+        results = await asyncio.gather(*(self.update(exchange, symbol, timeframe, capacity) for symbol in catch_up),
+                                       return_exceptions=True)
+        failed = set()
+        for symbol, result in zip(catch_up, results):
+            if isinstance(result, Exception):
+                logger.error(f"Lỗi khi lấy dữ liệu OHLCV cho {symbol}: {result}")
+                failed.add(symbol)
+        self.ticker_updates += len(symbols) - len(catch_up)
+        return [symbol for symbol in symbols if symbol not in failed]
+
+    def frame(self, symbol, timeframe, limit=100):
+        """DataFrame `limit` nến gần nhất của buffer hiện có (không gọi sàn)"""
+        return _tail_frame(self.get_buffer(symbol, timeframe), limit)
+
+    async def fetch(self, exchange, symbol, timeframe, limit=100):
+        """Cập nhật buffer từ sàn và trả về DataFrame `limit` nến gần nhất"""
+        buffer = await self.update(exchange, symbol, timeframe)
+        return _tail_frame(buffer, limit)
+
+    async def _update_resampled(self, exchange, symbol, timeframe, base):
+        """Cập nhật buffer khung lớn từ các nến gốc `base` (mảng (n, 6) đã sắp xếp)"""
+        buffer = self.get_buffer(symbol, timeframe)
+        if len(buffer) == 0 and self.store is not None:
+            buffer.replace(self.store.tail(symbol, timeframe, buffer.capacity))
+        if len(buffer) == 0:
+            # Lần đầu: tải lịch sử của khung này một lần, sau đó chỉ gộp từ nến gốc
+            await self._resync(exchange, symbol, timeframe, buffer)
+
+        if len(base) == 0:
+            return buffer
+        start = buffer.last_timestamp
+        fresh = resample_ohlcv(base[base[:, 0] >= start], timeframe)
+        if len(fresh) and base[0, 0] > start:
+            # Nến gốc không phủ hết nến đầu tiên: giữ nến đó như đã có trong buffer
+            fresh = fresh[1:]
+        if len(fresh) == 0:
+            return buffer
+        self._persist(symbol, timeframe, fresh, newer_only=True)
+        if not buffer.merge(fresh):
+            logger.info(f"Phát hiện khoảng trống dữ liệu {symbol} {timeframe}, tải lại toàn bộ")
+            await self._resync(exchange, symbol, timeframe, buffer)
+        return buffer
+
+    def _plan_timeframes(self, timeframes, base_timeframe):
+        """(khung gộp từ nến gốc, khung tải trực tiếp, số nến gốc cần giữ)"""
+        base_ms = timeframe_to_ms(base_timeframe)
+        derived, direct = [], []
+        for timeframe in timeframes:
+            timeframe_ms = timeframe_to_ms(timeframe)
+            if timeframe == base_timeframe:
+                continue
+            if timeframe_ms % base_ms == 0 and 2 * timeframe_ms // base_ms <= MAX_BASE_CANDLES:
+                derived.append(timeframe)
+            else:
+                direct.append(timeframe)
+
+        ratio = max((timeframe_to_ms(timeframe) // base_ms for timeframe in derived), default=1)
+        return derived, direct, min(max(self.capacity, 2 * ratio), MAX_BASE_CANDLES)
+
+    def base_capacity(self, timeframes, base_timeframe='1m'):
+        """Số nến gốc fetch_timeframes giữ cho các khung `timeframes` (dùng cho `refresh` luồng gốc)"""
+        return self._plan_timeframes(timeframes, base_timeframe)[2]
+
+    async def update_timeframes(self, exchange, symbol, timeframes, base_timeframe='1m', refresh_base=True):
+        """Cập nhật nhiều khung thời gian của một cặp từ một luồng nến gốc, trả về {khung: buffer}
+
+        Mỗi chu kỳ chỉ gọi sàn cho khung gốc; các khung lớn hơn (bội số của khung gốc) được
+        gộp từ nến gốc và cập nhật tăng dần. Buffer gốc giữ đủ nến để phủ hai nến của khung
+        lớn nhất (tối đa MAX_BASE_CANDLES); khung nào vượt quá thì được tải trực tiếp.
+        `refresh_base=False`: buffer gốc đã được cập nhật (ví dụ bằng `refresh`), không gọi sàn.
+        """
+        derived, direct, capacity = self._plan_timeframes(timeframes, base_timeframe)
+        if refresh_base:
+            base_buffer = await self.update(exchange, symbol, base_timeframe, capacity=capacity)
+        else:
+            base_buffer = self.get_buffer(symbol, base_timeframe, capacity)
+        base = base_buffer.to_array()
+
+        buffers = {}
+        if base_timeframe in timeframes:
+            buffers[base_timeframe] = base_buffer
+        for timeframe in derived:
+            buffers[timeframe] = await self._update_resampled(exchange, symbol, timeframe, base)
+        for timeframe in direct:
+            buffers[timeframe] = await self.update(exchange, symbol, timeframe)
+        return buffers
+
+    async def fetch_timeframes(self, exchange, symbol, timeframes, base_timeframe='1m', limit=100):
+        """Như `update_timeframes` nhưng trả về {khung: DataFrame `limit` nến gần nhất}"""
+        buffers = await self.update_timeframes(exchange, symbol, timeframes, base_timeframe)
+        return {timeframe: _tail_frame(buffer, limit) for timeframe, buffer in buffers.items()}
+
+def _tail_frame(buffer, limit):
+    df = buffer.to_frame()
+    return df.iloc[-limit:].reset_index(drop=True) if len(df) > limit else df
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Lưu trữ nến OHLCV trên đĩa theo sàn/cặp/khung thời gian
+
+Mỗi chuỗi nến là một file nhị phân `<root>/<sàn>/<cặp>/<khung>.ohlcv` gồm các dòng
+float64 [timestamp, open, high, low, close, volume] sắp theo timestamp. Nến mới được
+ghi nối vào cuối file; đọc theo khoảng thời gian dùng `np.memmap` và tìm nhị phân trên
+cột timestamp nên không phải nạp cả file vào bộ nhớ.
+
+Chỉ lưu nến đã đóng. Tải trước dữ liệu lịch sử:
+    python candle_store.py backfill --pairs BTC/USDT,ETH/USDT --timeframe 1h --days 365
+"""
+
+import os
+import logging
+import argparse
+
+import ccxt
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from candle_cache import OHLCV_COLUMNS, timeframe_to_ms, closed_candles
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'data/candles')
+
+ROW_SIZE = len(OHLCV_COLUMNS) * np.dtype(np.float64).itemsize
+
+
+class CandleStore:
+    """Kho nến trên đĩa hỗ trợ ghi nối và đọc theo khoảng thời gian"""
+
+    def __init__(self, root=CANDLE_STORE_DIR, exchange_id='binance'):
+        self.root = root
+        self.exchange_id = exchange_id
+
+    def path(self, symbol, timeframe):
+        return os.path.join(self.root, self.exchange_id, symbol.replace('/', '_'), f"{timeframe}.ohlcv")
+
+    def _open(self, symbol, timeframe):
+        """Memmap chỉ đọc của cả chuỗi, None nếu chưa có dữ liệu"""
+        path = self.path(symbol, timeframe)
+        if not os.path.exists(path):
+            return None
+        rows = os.path.getsize(path) // ROW_SIZE
+        if rows == 0:
+            return None
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(rows, len(OHLCV_COLUMNS)))
+
+    def count(self, symbol, timeframe):
+        path = self.path(symbol, timeframe)
+        return os.path.getsize(path) // ROW_SIZE if os.path.exists(path) else 0
+
+    def first_timestamp(self, symbol, timeframe):
+        data = self._open(symbol, timeframe)
+        return None if data is None else int(data[0, 0])
+
+    def last_timestamp(self, symbol, timeframe):
+        data = self._open(symbol, timeframe)
+        return None if data is None else int(data[-1, 0])
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        """Các nến có start <= timestamp < end (ms), trả về view memmap shape (n, 6)"""
+        data = self._open(symbol, timeframe)
+        if data is None:
+            return np.empty((0, len(OHLCV_COLUMNS)), dtype=np.float64)
+        timestamps = data[:, 0]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(data) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return data[lo:hi]
+
+    def tail(self, symbol, timeframe, limit):
+        """`limit` nến mới nhất"""
+        data = self._open(symbol, timeframe)
+        if data is None:
+            return np.empty((0, len(OHLCV_COLUMNS)), dtype=np.float64)
+        return data[-limit:]
+
+    def read_frame(self, symbol, timeframe, start=None, end=None):
+        """Như read() nhưng trả về DataFrame cùng định dạng với fetch_ohlcv_data"""
+        df = pd.DataFrame(np.array(self.read(symbol, timeframe, start, end)), columns=OHLCV_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype(np.int64), unit='ms')
+        return df
+
+    def append(self, symbol, timeframe, ohlcv):
+        """Ghi các nến vào kho, trả về số nến mới được thêm
+
+        Trường hợp thường gặp (toàn bộ nến mới hơn nến cuối) chỉ ghi nối vào cuối file.
+        Nếu có nến cũ hơn (điền khoảng trống, tải ngược về quá khứ) thì gộp, bỏ trùng
+        và ghi lại cả file.
+        """
+        rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        if len(rows) == 0:
+            return 0
+        path = self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        last_timestamp = self.last_timestamp(symbol, timeframe)
+        if last_timestamp is None or rows[0, 0] > last_timestamp:
+            # Bỏ trùng trong chính dữ liệu mới, giữ bản ghi sau cùng
+            keep = np.append(rows[1:, 0] != rows[:-1, 0], True)
+            rows = rows[keep]
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(rows).tobytes())
+            return len(rows)
+
+        existing = np.array(self.read(symbol, timeframe))
+        merged = np.concatenate((existing, rows))
+        # Sắp xếp ổn định rồi giữ bản ghi cuối của mỗi timestamp: dữ liệu mới ghi đè dữ liệu cũ
+        merged = merged[np.argsort(merged[:, 0], kind='stable')]
+        keep = np.append(merged[1:, 0] != merged[:-1, 0], True)
+        merged = merged[keep]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(merged).tobytes())
+        os.replace(tmp_path, path)
+        return len(merged) - len(existing)
+
+    def backfill(self, exchange, symbol, timeframe, since, limit=1000):
+        """Tải các nến còn thiếu từ `since` tới hiện tại theo từng trang, trả về số nến mới"""
+        timeframe_ms = timeframe_to_ms(timeframe)
+        now_ms = exchange.milliseconds()
+        first = self.first_timestamp(symbol, timeframe)
+        last = self.last_timestamp(symbol, timeframe)
+
+        ranges = [(since, now_ms)]
+        if first is not None:
+            # Chỉ tải phần trước nến đầu tiên và sau nến cuối cùng đã lưu
+            ranges = [(since, first)] if since < first else []
+            ranges.append((max(since, last + timeframe_ms), now_ms))
+
+        added = 0
+        for start, end in ranges:
+            rows = []
+            while start < end:
+                page = exchange.fetch_ohlcv(symbol, timeframe, since=start, limit=limit)
+                if not page:
+                    break
+                rows.extend(candle for candle in page if candle[0] < end)
+                start = page[-1][0] + timeframe_ms
+                if len(page) < limit:
+                    break
+            added += self.append(symbol, timeframe, closed_candles(rows, timeframe, now_ms))
+        return added
+
+
+def fetch_recent(store, exchange, symbol, timeframe, limit=100):
+    """Lấy `limit` nến gần nhất (kể cả nến đang hình thành), ưu tiên dữ liệu trong kho
+
+    Khi kho đã có nến tới gần hiện tại chỉ cần tải vài nến mới từ sàn (`since=`) thay
+    vì cả `limit` nến. Các nến vừa đóng được ghi lại vào kho.
+    """
+    stored = np.array(store.tail(symbol, timeframe, limit))
+    last_timestamp = int(stored[-1, 0]) if len(stored) else None
+    timeframe_ms = timeframe_to_ms(timeframe)
+
+    if last_timestamp is not None and exchange.milliseconds() - last_timestamp < limit * timeframe_ms:
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=last_timestamp + timeframe_ms, limit=limit)
+    else:
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        stored = stored[:0]
+
+    fresh = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    store.append(symbol, timeframe, closed_candles(fresh, timeframe))
+    if len(fresh):
+        stored = stored[stored[:, 0] < fresh[0, 0]]
+    return np.concatenate((stored, fresh))[-limit:]
+
+
+def _backfill_command(args):
+    exchange = ccxt.binance({'enableRateLimit': True})
+    store = CandleStore(args.root, exchange_id=exchange.id)
+    since = exchange.milliseconds() - int(args.days * 86400 * 1000)
+    for symbol in args.pairs:
+        for timeframe in args.timeframe:
+            added = store.backfill(exchange, symbol, timeframe, since)
+            logger.info(f"{symbol} {timeframe}: thêm {added} nến, tổng {store.count(symbol, timeframe)} nến "
+                        f"({store.path(symbol, timeframe)})")
+
+
+def _info_command(args):
+    store = CandleStore(args.root)
+    for symbol in args.pairs:
+        for timeframe in args.timeframe:
+            first = store.first_timestamp(symbol, timeframe)
+            if first is None:
+                print(f"{symbol} {timeframe}: chưa có dữ liệu")
+                continue
+            last = store.last_timestamp(symbol, timeframe)
+            print(f"{symbol} {timeframe}: {store.count(symbol, timeframe)} nến, "
+                  f"{pd.to_datetime(first, unit='ms')} -> {pd.to_datetime(last, unit='ms')}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Kho nến OHLCV trên đĩa')
+    parser.add_argument('--root', default=CANDLE_STORE_DIR, help='Thư mục lưu dữ liệu')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill_parser = subparsers.add_parser('backfill', help='Tải dữ liệu lịch sử từ Binance vào kho')
+    backfill_parser.add_argument('--days', type=float, default=90, help='Số ngày dữ liệu')
+    backfill_parser.set_defaults(func=_backfill_command)
+
+    info_parser = subparsers.add_parser('info', help='Xem dữ liệu đang có trong kho')
+    info_parser.set_defaults(func=_info_command)
+
+    for subparser in (backfill_parser, info_parser):
+        subparser.add_argument('--pairs', default=os.getenv('TRADING_PAIRS', 'BTC/USDT,ETH/USDT'),
+                               help='Các cặp, phân tách bằng dấu phẩy')
+        subparser.add_argument('--timeframe', default=os.getenv('RSI_TIMEFRAME', '1h'),
+                               help='Các khung thời gian, phân tách bằng dấu phẩy')
+
+    args = parser.parse_args()
+    args.pairs = [pair.strip() for pair in args.pairs.split(',') if pair.strip()]
+    args.timeframe = [timeframe.strip() for timeframe in args.timeframe.split(',') if timeframe.strip()]
+    args.func(args)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Theo dõi file .env và áp dụng cấu hình mới khi bot đang chạy
+
+Mỗi `interval` giây (hoặc ngay khi nhận SIGHUP) file được đọc lại nếu thời điểm sửa đổi
+thay đổi. Chỉ các biến có giá trị khác lần đọc trước mới được ghi vào `os.environ`, nên
+biến môi trường đặt sẵn khi khởi động vẫn được ưu tiên cho tới khi chính biến đó được sửa
+trong file. Biến bị xóa khỏi file được trả về giá trị đặt sẵn lúc khởi động (nếu có) hoặc
+xóa khỏi `os.environ` để chương trình dùng giá trị mặc định. Sau đó `on_change(changed)` được
+gọi với các biến vừa đổi.
+"""
+
+import os
+import signal
+import asyncio
+import inspect
+import logging
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher:
+    """Đọc lại file .env khi có thay đổi và gọi `on_change({tên: giá trị mới})`"""
+
+    def __init__(self, path, on_change, interval=5.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stamp = self._stat()
+        self._values = self._read()
+        # Biến môi trường đặt sẵn khi khởi động với giá trị khác file: dùng lại khi biến bị xóa khỏi file
+        self._preset = {key: value for key, value in os.environ.items() if self._values.get(key) != value}
+        self._wakeup = None
+        # Thống kê
+        self.reloads = 0
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        return {key: value for key, value in dotenv_values(self.path).items() if value is not None}
+
+    def check(self):
+        """Đọc lại file nếu đã thay đổi, cập nhật os.environ và trả về các biến vừa đổi
+
+        Biến bị xóa khỏi file có giá trị mới là giá trị đặt sẵn lúc khởi động hoặc None.
+        """
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return {}
+        self._stamp = stamp
+        values = self._read()
+        changed = {key: value for key, value in values.items() if self._values.get(key) != value}
+        for key in self._values.keys() - values.keys():
+            changed[key] = self._preset.get(key)
+        self._values = values
+        for key, value in changed.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        return changed
+
+    async def run(self):
+        """Kiểm tra file mỗi `interval` giây cho tới khi bị hủy"""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if hasattr(signal, 'SIGHUP'):
+            # `kill -HUP <pid>` để áp dụng ngay thay vì chờ lần kiểm tra kế tiếp
+            loop.add_signal_handler(signal.SIGHUP, self._wakeup.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self._reload()
+        finally:
+            if hasattr(signal, 'SIGHUP'):
+                loop.remove_signal_handler(signal.SIGHUP)
+
+    async def _reload(self):
+        try:
+            changed = self.check()
+            if not changed:
+                return
+            logger.info(f"🔄 {self.path} thay đổi: {', '.join(sorted(changed))}")
+            result = self.on_change(changed)
+            if inspect.isawaitable(result):
+                await result
+            self.reloads += 1
+        except Exception as e:
+            logger.error(f"Lỗi khi áp dụng cấu hình mới từ {self.path}: {e}")
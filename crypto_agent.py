@@ -1,5 +1,7 @@
 import os
-from typing import Dict, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 import pandas as pd
 import ccxt
@@ -10,9 +12,11 @@ from langchain.agents import initialize_agent
 from langchain.agents import AgentType
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import SystemMessage
 from pydantic import BaseModel, Field
+from candle_store import CandleStore, fetch_recent, CANDLE_STORE_DIR
+from ttl_cache import TTLCache, candle_close_time
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +28,33 @@ exchange = ccxt.binance({
     'enableRateLimit': True,
 })
 
+# Kho nến trên đĩa, dùng chung với bot giám sát (để trống CANDLE_STORE_DIR để tắt)
+candle_store = CandleStore(CANDLE_STORE_DIR, exchange_id=exchange.id) if CANDLE_STORE_DIR else None
+
+# Cache dùng chung cho nến và kết quả chỉ báo của các tool, hết hạn khi đóng nến
+# nhưng không quá AGENT_CACHE_TTL giây để giá của nến đang hình thành không quá cũ
+AGENT_CACHE_SIZE = int(os.getenv('AGENT_CACHE_SIZE', 256))
+AGENT_CACHE_TTL = float(os.getenv('AGENT_CACHE_TTL', 60))
+agent_cache = TTLCache(maxsize=AGENT_CACHE_SIZE)
+
+def cache_expiry(timeframe: str) -> float:
+    """Thời điểm hết hạn của dữ liệu theo khung thời gian"""
+    now = agent_cache.clock()
+    return min(candle_close_time(timeframe, now), now + AGENT_CACHE_TTL)
+
+def fetch_candles(symbol: str, timeframe: str, limit: int = 100):
+    """Lấy nến gần nhất, ưu tiên dữ liệu đã lưu trong kho"""
+    if candle_store is None:
+        return exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+    return fetch_recent(candle_store, exchange, symbol, timeframe, limit=limit)
+
+def load_candles(symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+    """Nến gần nhất qua cache, các tool hỏi cùng cặp/khung thời gian dùng chung một lần tải"""
+    def load():
+        ohlcv = fetch_candles(symbol, timeframe, limit=limit)
+        return pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    return agent_cache.get_or_load(('candles', symbol, timeframe, limit), load, cache_expiry(timeframe))
+
 class RSIInput(BaseModel):
     symbol: str = Field(description="Cặp tiền cần phân tích, ví dụ: BTC/USDT, ETH/USDT")
     timeframe: str = Field(default="1h", description="Khung thời gian phân tích: 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1w")
@@ -36,24 +67,137 @@ class MACDInput(BaseModel):
     slow_period: int = Field(default=26, description="Số nến cho EMA chậm")
     signal_period: int = Field(default=9, description="Số nến cho đường Signal")
 
+# Các cặp quen thuộc, dùng được cả khi chưa tải được danh sách thị trường từ Binance
+COMMON_SYMBOLS = ["btc", "eth", "bnb", "xrp", "sol", "ada"]
+QUOTE = "usdt"
+
+# Khung thời gian, viết liền hoặc tách thành nhiều từ (so khớp theo từ, không theo chuỗi con)
+TIMEFRAME_ALIASES = {
+    "1m": ["1m", "1 phút", "1phut", "1 phut"],
+    "5m": ["5m", "5 phút", "5phut", "5 phut"],
+    "15m": ["15m", "15 phút", "15phut", "15 phut"],
+    "30m": ["30m", "30 phút", "30phut", "30 phut"],
+    "1h": ["1h", "1 giờ", "1gio", "1 gio", "1g", "h1"],
+    "4h": ["4h", "4 giờ", "4gio", "4 gio", "4g", "h4"],
+    "1d": ["1d", "ngày", "ngay", "day", "d1"],
+    "1w": ["1w", "tuần", "tuan", "week", "w1"]
+}
+
+# Từ thường gặp trong câu hỏi trùng với mã coin trên Binance, không coi là cặp tiền
+SYMBOL_STOPWORDS = {
+    "rsi", "macd", "usdt", "so", "sánh", "sanh", "và", "va", "với", "voi", "trên", "tren",
+    "cho", "của", "cua", "khung", "xem", "giá", "gia", "có", "co", "không", "khong", "nên",
+    "nen", "mua", "bán", "ban", "hay", "là", "la", "gì", "gi", "the", "a", "an", "on", "in",
+    "for", "me", "one", "ai", "not", "all", "now", "up", "down", "big", "fun"
+}
+
+_TOKEN_RE = re.compile(r"[0-9a-zà-ỹđ]+", re.IGNORECASE)
+
+def tokenize(text: str) -> List[str]:
+    """Tách câu thành các từ viết thường (bỏ dấu câu, "/" trong BTC/USDT)"""
+    return _TOKEN_RE.findall(text.lower())
+
+def match_timeframe(tokens: List[str], i: int):
+    """Khung thời gian bắt đầu tại tokens[i], trả về (timeframe, số từ) hoặc (None, 0)"""
+    for timeframe, aliases in TIMEFRAME_ALIASES.items():
+        for alias in aliases:
+            words = alias.split()
+            if tokens[i:i + len(words)] == words:
+                return timeframe, len(words)
+    return None, 0
+
+def extract_timeframes(text: str) -> List[str]:
+    """Các khung thời gian được nhắc tới, theo thứ tự xuất hiện"""
+    tokens = tokenize(text)
+    timeframes = []
+    i = 0
+    while i < len(tokens):
+        timeframe, length = match_timeframe(tokens, i)
+        if timeframe is None:
+            i += 1
+            continue
+        if timeframe not in timeframes:
+            timeframes.append(timeframe)
+        i += length
+    return timeframes
+
 def parse_timeframe(text: str) -> str:
     """Parse timeframe from user input"""
-    timeframe_map = {
-        "1m": ["1m", "1 phút", "1phut", "1 phut"],
-        "5m": ["5m", "5 phút", "5phut", "5 phut"],
-        "15m": ["15m", "15 phút", "15phut", "15 phut"],
-        "30m": ["30m", "30 phút", "30phut", "30 phut"],
-        "1h": ["1h", "1 giờ", "1gio", "1 gio", "1g"],
-        "4h": ["4h", "4 giờ", "4gio", "4 gio", "4g"],
-        "1d": ["1d", "ngày", "ngay", "day", "d"],
-        "1w": ["1w", "tuần", "tuan", "week", "w"]
-    }
-    
-    text = text.lower()
-    for tf, aliases in timeframe_map.items():
-        if any(alias in text for alias in aliases):
-            return tf
-    return "1h"  # default timeframe
+    timeframes = extract_timeframes(text)
+    return timeframes[0] if timeframes else "1h"  # default timeframe
+
+def listed_symbols() -> Dict[str, str]:
+    """Các cặp USDT đang giao dịch trên Binance: mã coin viết thường -> cặp (BTC -> BTC/USDT)"""
+    def load():
+        markets = exchange.load_markets()
+        return {
+            market['base'].lower(): symbol
+            for symbol, market in markets.items()
+            if market.get('spot') and market.get('quote') == QUOTE.upper() and market.get('active', True)
+        }
+    try:
+        # Danh sách thị trường ít thay đổi, tải lại mỗi ngày
+        return agent_cache.get_or_load(('markets',), load, agent_cache.clock() + 86400)
+    except Exception:
+        # Không tải được: dùng tạm các cặp quen thuộc, thử lại sau 5 phút
+        fallback = {symbol: f"{symbol.upper()}/USDT" for symbol in COMMON_SYMBOLS}
+        return agent_cache.get_or_load(('markets',), lambda: fallback, agent_cache.clock() + 300)
+
+def extract_symbols(text: str) -> List[str]:
+    """Các cặp tiền được nhắc tới (BTC, eth, SOL/USDT, pepeusdt...), theo thứ tự xuất hiện"""
+    markets = listed_symbols()
+    raw_tokens = _TOKEN_RE.findall(text)
+    symbols = []
+    for i, raw in enumerate(raw_tokens):
+        token = raw.lower()
+        followed_by_quote = i + 1 < len(raw_tokens) and raw_tokens[i + 1].lower() == QUOTE
+        if token.endswith(QUOTE) and token[:-len(QUOTE)] in markets:
+            token = token[:-len(QUOTE)]
+        elif token not in markets:
+            continue
+        elif token in SYMBOL_STOPWORDS and not (raw.isupper() or followed_by_quote):
+            # Từ thông thường chỉ được coi là mã coin khi viết hoa hoặc có /USDT đi kèm
+            continue
+        symbol = markets[token]
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+def compute_rsi(rsi_input: RSIInput) -> Dict:
+    """Tính RSI cho cặp/khung thời gian đã xác định, kết quả được cache tới khi đóng nến"""
+    def compute():
+        df = load_candles(rsi_input.symbol, rsi_input.timeframe, limit=100)
+        rsi = RSIIndicator(close=df['close'], window=rsi_input.period).rsi()
+        return {
+            'rsi': round(float(rsi.iloc[-1]), 2),
+            'symbol': rsi_input.symbol,
+            'timeframe': rsi_input.timeframe
+        }
+
+    key = ('rsi', rsi_input.symbol, rsi_input.timeframe, rsi_input.period)
+    return dict(agent_cache.get_or_load(key, compute, cache_expiry(rsi_input.timeframe)))
+
+def compute_macd(macd_input: MACDInput) -> Dict:
+    """Tính MACD cho cặp/khung thời gian đã xác định, kết quả được cache tới khi đóng nến"""
+    def compute():
+        df = load_candles(macd_input.symbol, macd_input.timeframe, limit=100)
+        macd_indicator = MACD(
+            close=df['close'],
+            window_fast=macd_input.fast_period,
+            window_slow=macd_input.slow_period,
+            window_sign=macd_input.signal_period
+        )
+        return {
+            'macd': round(float(macd_indicator.macd().iloc[-1]), 4),
+            'signal': round(float(macd_indicator.macd_signal().iloc[-1]), 4),
+            'histogram': round(float(macd_indicator.macd_diff().iloc[-1]), 4),
+            'symbol': macd_input.symbol,
+            'timeframe': macd_input.timeframe
+        }
+
+    key = ('macd', macd_input.symbol, macd_input.timeframe,
+           macd_input.fast_period, macd_input.slow_period, macd_input.signal_period)
+    return dict(agent_cache.get_or_load(key, compute, cache_expiry(macd_input.timeframe)))
 
 def get_rsi(input_str: str) -> Dict:
     """Calculate RSI for a given symbol and timeframe"""
@@ -62,14 +206,8 @@ def get_rsi(input_str: str) -> Dict:
         input_data = {}
         
         # Extract symbol
-        common_symbols = ["btc", "eth", "bnb", "xrp", "sol", "ada"]
-        input_str = input_str.lower()
-        for symbol in common_symbols:
-            if symbol in input_str:
-                input_data["symbol"] = f"{symbol.upper()}/USDT"
-                break
-        if "symbol" not in input_data:
-            input_data["symbol"] = "BTC/USDT"  # default
+        symbols = extract_symbols(input_str)
+        input_data["symbol"] = symbols[0] if symbols else "BTC/USDT"  # default
             
         # Extract timeframe
         input_data["timeframe"] = parse_timeframe(input_str)
@@ -77,23 +215,7 @@ def get_rsi(input_str: str) -> Dict:
         # Create validated input
         rsi_input = RSIInput(**input_data)
         
-        # Fetch OHLCV data
-        ohlcv = exchange.fetch_ohlcv(
-            rsi_input.symbol, 
-            rsi_input.timeframe, 
-            limit=100
-        )
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # Calculate RSI
-        rsi_indicator = RSIIndicator(close=df['close'], window=rsi_input.period)
-        df['rsi'] = rsi_indicator.rsi()
-        
-        return {
-            'rsi': round(float(df['rsi'].iloc[-1]), 2),
-            'symbol': rsi_input.symbol,
-            'timeframe': rsi_input.timeframe
-        }
+        return compute_rsi(rsi_input)
     except Exception as e:
         return {'error': str(e)}
 
@@ -104,14 +226,8 @@ def get_macd(input_str: str) -> Dict:
         input_data = {}
         
         # Extract symbol
-        common_symbols = ["btc", "eth", "bnb", "xrp", "sol", "ada"]
-        input_str = input_str.lower()
-        for symbol in common_symbols:
-            if symbol in input_str:
-                input_data["symbol"] = f"{symbol.upper()}/USDT"
-                break
-        if "symbol" not in input_data:
-            input_data["symbol"] = "BTC/USDT"  # default
+        symbols = extract_symbols(input_str)
+        input_data["symbol"] = symbols[0] if symbols else "BTC/USDT"  # default
             
         # Extract timeframe
         input_data["timeframe"] = parse_timeframe(input_str)
@@ -119,50 +235,102 @@ def get_macd(input_str: str) -> Dict:
         # Create validated input
         macd_input = MACDInput(**input_data)
         
-        # Fetch OHLCV data
-        ohlcv = exchange.fetch_ohlcv(
-            macd_input.symbol, 
-            macd_input.timeframe, 
-            limit=100
-        )
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # Calculate MACD
-        macd_indicator = MACD(
-            close=df['close'], 
-            window_fast=macd_input.fast_period,
-            window_slow=macd_input.slow_period,
-            window_sign=macd_input.signal_period
-        )
-        
-        macd_line = macd_indicator.macd()
-        signal_line = macd_indicator.macd_signal()
-        histogram = macd_indicator.macd_diff()
-        
+        return compute_macd(macd_input)
+    except Exception as e:
+        return {'error': str(e)}
+
+# Giới hạn số tổ hợp cặp × khung thời gian trong một lần gọi get_indicators
+MAX_BATCH_SIZE = int(os.getenv('AGENT_MAX_BATCH_SIZE', 24))
+fetch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('AGENT_FETCH_WORKERS', 8)),
+                                    thread_name_prefix="fetch")
+
+def compute_indicators(symbol: str, timeframe: str) -> Dict:
+    """RSI(14) và MACD(12, 26, 9) tính từ cùng một bộ nến"""
+    def compute():
+        df = load_candles(symbol, timeframe, limit=100)
+        close = df['close']
+        macd_indicator = MACD(close=close, window_fast=12, window_slow=26, window_sign=9)
         return {
-            'macd': round(float(macd_line.iloc[-1]), 4),
-            'signal': round(float(signal_line.iloc[-1]), 4),
-            'histogram': round(float(histogram.iloc[-1]), 4),
-            'symbol': macd_input.symbol,
-            'timeframe': macd_input.timeframe
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'price': float(close.iloc[-1]),
+            'rsi': round(float(RSIIndicator(close=close, window=14).rsi().iloc[-1]), 2),
+            'macd': round(float(macd_indicator.macd().iloc[-1]), 4),
+            'signal': round(float(macd_indicator.macd_signal().iloc[-1]), 4),
+            'histogram': round(float(macd_indicator.macd_diff().iloc[-1]), 4)
         }
+
+    return dict(agent_cache.get_or_load(('indicators', symbol, timeframe), compute, cache_expiry(timeframe)))
+
+def format_indicator_table(rows: List[Dict]) -> str:
+    """Bảng gọn các chỉ báo, mỗi dòng một cặp/khung thời gian"""
+    lines = ["Cặp | Khung | Giá | RSI | MACD | Signal | Histogram"]
+    for row in rows:
+        if 'error' in row:
+            lines.append(f"{row['symbol']} | {row['timeframe']} | lỗi: {row['error']}")
+        else:
+            lines.append(f"{row['symbol']} | {row['timeframe']} | {row['price']:g} | {row['rsi']:.2f} | "
+                         f"{row['macd']:.4f} | {row['signal']:.4f} | {row['histogram']:.4f}")
+    return "\n".join(lines)
+
+def get_indicators(input_str: str) -> str:
+    """Calculate RSI and MACD for many symbols and timeframes at once"""
+    try:
+        symbols = extract_symbols(input_str) or ["BTC/USDT"]
+        timeframes = extract_timeframes(input_str) or ["1h"]
+        pairs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+        if len(pairs) > MAX_BATCH_SIZE:
+            return (f"Quá nhiều tổ hợp ({len(pairs)}), tối đa {MAX_BATCH_SIZE} cặp × khung thời gian "
+                    f"mỗi lần. Hãy chia nhỏ câu hỏi.")
+
+        def compute(pair):
+            try:
+                return compute_indicators(*pair)
+            except Exception as e:
+                return {'symbol': pair[0], 'timeframe': pair[1], 'error': str(e)}
+
+        # Tải nến song song cho các cặp/khung thời gian
+        return format_indicator_table(list(fetch_executor.map(compute, pairs)))
     except Exception as e:
-        return {'error': str(e)}
+        return f"Lỗi: {e}"
 
-def create_agent():
-    # Initialize LLM
-    llm = ChatGoogleGenerativeAI(
+# Số lượt hỏi/đáp gần nhất được giữ trong bộ nhớ hội thoại
+AGENT_MEMORY_TURNS = int(os.getenv('AGENT_MEMORY_TURNS', 5))
+
+def create_llm():
+    """Khởi tạo LLM, có thể dùng chung cho nhiều agent"""
+    return ChatGoogleGenerativeAI(
         model="gemini-2.0-flash",
         google_api_key=os.getenv("GOOGLE_API_KEY"),
         temperature=0
     )
-    
-    # Initialize memory
-    memory = ConversationBufferMemory(
+
+def create_memory(turns: int = AGENT_MEMORY_TURNS):
+    """Bộ nhớ hội thoại chỉ đưa `turns` lượt gần nhất vào prompt"""
+    return ConversationBufferWindowMemory(
+        k=turns,
         memory_key="chat_history",
         return_messages=True,
         output_key="output"
     )
+
+def trim_memory(memory) -> None:
+    """Xóa các tin nhắn nằm ngoài cửa sổ (ConversationBufferWindowMemory vẫn giữ chúng trong RAM)"""
+    messages = memory.chat_memory.messages
+    del messages[:max(len(messages) - 2 * memory.k, 0)]
+
+def ask_agent(agent, query: str) -> str:
+    """Hỏi agent rồi cắt bớt bộ nhớ để prompt không lớn dần theo thời gian"""
+    response = agent.run(query)
+    trim_memory(agent.memory)
+    return response
+
+def create_agent(llm=None, memory=None):
+    # Initialize LLM
+    llm = llm if llm is not None else create_llm()
+    
+    # Initialize memory
+    memory = memory if memory is not None else create_memory()
     
     # Define tools
     tools = [
@@ -185,6 +353,17 @@ def create_agent():
             - "eth macd 4h" -> Tính MACD ETH/USDT khung 4 giờ
             - "sol macd ngày" -> Tính MACD SOL/USDT khung ngày
             Các khung thời gian hỗ trợ: 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1w"""
+        ),
+        Tool(
+            name="get_indicators",
+            func=get_indicators,
+            description="""Tính cùng lúc RSI và MACD cho NHIỀU cặp tiền và NHIỀU khung thời gian, trả về một bảng.
+            Dùng tool này khi câu hỏi có từ hai cặp hoặc hai khung thời gian trở lên (so sánh, tổng quan thị trường).
+            Hỗ trợ mọi cặp USDT đang giao dịch trên Binance.
+            Ví dụ input:
+            - "BTC ETH SOL 1h 4h" -> RSI/MACD của 3 cặp trên khung 1 giờ và 4 giờ
+            - "PEPE DOGE ngày" -> RSI/MACD của PEPE/USDT và DOGE/USDT khung ngày
+            Các khung thời gian hỗ trợ: 1m, 5m, 15m, 30m, 1h, 4h, 1d, 1w"""
         )
     ]
 
@@ -262,6 +441,7 @@ def main():
             if query.lower() == 'quit':
                 break
             response = agent.invoke({"input": query})
+            trim_memory(agent.memory)
             print("\nPhản hồi:", response["output"])
         except KeyboardInterrupt:
             break
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tính RSI/MACD tăng dần với chi phí O(1) cho mỗi nến
+
+RSI (làm mượt Wilder) và MACD (EMA) là các công thức đệ quy, nên chỉ cần giữ trạng
+thái của nến trước là tính được giá trị cho nến tiếp theo. Kết quả trùng với thư viện
+`ta` (RSIIndicator, MACD với fillna=False) khi chạy trên cùng một chuỗi giá.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+NAN = float('nan')
+
+
+class IndicatorState:
+    """Trạng thái RSI + MACD của một cặp/khung thời gian
+
+    `update(close, closed=True)` ghi nhận nến đã đóng; `closed=False` chỉ tính giá trị
+    cho nến đang hình thành mà không thay đổi trạng thái.
+    """
+
+    def __init__(self, rsi_window=14, macd_fast=12, macd_slow=26, macd_signal=9, history=100):
+        self.rsi_window = rsi_window
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self._rsi_alpha = 1.0 / rsi_window
+        self._fast_alpha = 2.0 / (macd_fast + 1)
+        self._slow_alpha = 2.0 / (macd_slow + 1)
+        self._signal_alpha = 2.0 / (macd_signal + 1)
+        self.history_size = history
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái"""
+        # (last_close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count)
+        self._state = (None, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 0)
+        self.last_timestamp = None
+        # Giá trị chỉ báo của các nến đã đóng gần nhất: timestamp -> (rsi, macd, signal, histogram)
+        self.history = OrderedDict()
+
+    def _step(self, close):
+        """Tính trạng thái mới và giá trị chỉ báo cho một nến, không ghi nhận"""
+        last_close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count = self._state
+
+        if last_close is None:
+            # `ta` coi chênh lệch của nến đầu tiên là 0 và dùng nó làm giá trị EMA khởi đầu
+            ema_fast = ema_slow = close
+        else:
+            diff = close - last_close
+            gain = diff if diff > 0 else 0.0
+            loss = -diff if diff < 0 else 0.0
+            avg_gain += self._rsi_alpha * (gain - avg_gain)
+            avg_loss += self._rsi_alpha * (loss - avg_loss)
+            ema_fast += self._fast_alpha * (close - ema_fast)
+            ema_slow += self._slow_alpha * (close - ema_slow)
+        count += 1
+
+        if count < self.rsi_window:
+            rsi = NAN
+        elif avg_loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        macd = signal = histogram = NAN
+        if count >= self.macd_fast and count >= self.macd_slow:
+            macd = ema_fast - ema_slow
+            # Đường Signal bắt đầu từ giá trị MACD hợp lệ đầu tiên
+            ema_signal = macd if signal_count == 0 else ema_signal + self._signal_alpha * (macd - ema_signal)
+            signal_count += 1
+            if signal_count >= self.macd_signal:
+                signal = ema_signal
+                histogram = macd - signal
+
+        state = (close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count)
+        return state, (rsi, macd, signal, histogram)
+
+    def update(self, close, timestamp=None, closed=True):
+        """Cập nhật với một nến, trả về (rsi, macd, signal, histogram)"""
+        state, values = self._step(float(close))
+        if closed:
+            self._state = state
+            if timestamp is not None:
+                self.last_timestamp = timestamp
+                self.history[timestamp] = values
+                if len(self.history) > self.history_size:
+                    self.history.popitem(last=False)
+        return values
+
+    def export(self):
+        """Trạng thái dạng mảng để lưu warm start: (state (9,), history (n, 5))
+
+        `state` là `_state` kèm `last_timestamp` (NaN thay cho None), mỗi hàng `history` là
+        timestamp và (rsi, macd, signal, histogram) của một nến đã đóng.
+        """
+        last_close, *rest = self._state
+        state = np.array([NAN if last_close is None else last_close, *rest,
+                          NAN if self.last_timestamp is None else self.last_timestamp])
+        history = np.array([(timestamp, *values) for timestamp, values in self.history.items()],
+                           dtype=np.float64).reshape(-1, 5)
+        return state, history
+
+    def restore(self, state, history):
+        """Khôi phục trạng thái từ kết quả của `export`"""
+        last_close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count, last_timestamp = state
+        self._state = (None if np.isnan(last_close) else float(last_close), float(avg_gain), float(avg_loss),
+                       float(ema_fast), float(ema_slow), float(ema_signal), int(count), int(signal_count))
+        self.last_timestamp = None if np.isnan(last_timestamp) else int(last_timestamp)
+        self.history = OrderedDict((int(row[0]), tuple(row[1:].tolist())) for row in history[-self.history_size:])
+
+
+class IndicatorEngine:
+    """Quản lý IndicatorState cho nhiều cặp/khung thời gian"""
+
+    def __init__(self, rsi_window=14, macd_fast=12, macd_slow=26, macd_signal=9, history=100):
+        self.params = dict(rsi_window=rsi_window, macd_fast=macd_fast,
+                           macd_slow=macd_slow, macd_signal=macd_signal, history=history)
+        self._states = {}
+
+    def get_state(self, key):
+        if key not in self._states:
+            self._states[key] = IndicatorState(**self.params)
+        return self._states[key]
+
+    def sync(self, key, timestamps, closes):
+        """Đồng bộ trạng thái với cửa sổ nến hiện tại, trả về mảng (n, 4)
+
+        Nến cuối được coi là nến đang hình thành. Chỉ các nến đã đóng mới hơn nến
+        đã ghi nhận được cập nhật; nếu cửa sổ không nối tiếp trạng thái (khởi động,
+        khoảng trống) thì tính lại từ đầu cửa sổ.
+        """
+        state = self.get_state(key)
+        n = len(closes)
+        result = np.full((n, 4), np.nan)
+        if n == 0:
+            return result
+
+        start = 0
+        if state.last_timestamp is not None:
+            matches = np.flatnonzero(timestamps == state.last_timestamp)
+            if len(matches) == 0:
+                state.reset()
+            else:
+                start = int(matches[0]) + 1
+
+        for i in range(start, n - 1):
+            state.update(closes[i], timestamp=int(timestamps[i]))
+
+        for i in range(n - 1):
+            values = state.history.get(int(timestamps[i]))
+            if values is not None:
+                result[i] = values
+        result[n - 1] = state.update(closes[n - 1], closed=False)
+        return result
+
+    def export_states(self):
+        """Trạng thái của mọi cặp/khung: {key: (state, history)} (xem IndicatorState.export)"""
+        return {key: state.export() for key, state in self._states.items() if state.last_timestamp is not None}
+
+    def restore_states(self, states):
+        """Nạp lại trạng thái từ kết quả của `export_states`"""
+        for key, (state, history) in states.items():
+            self.get_state(key).restore(state, history)
+
+
+# Thứ tự giá trị trong kết quả của CrossSectionEngine.sync (trùng với IndicatorSnapshot)
+SNAPSHOT_FIELDS = ('close', 'rsi', 'macd', 'macd_signal', 'macd_histogram', 'prev_macd', 'prev_macd_signal')
+
+# Các cột trạng thái của mỗi hàng trong CrossSectionEngine
+_STATE_COLUMNS = ('last_close', 'avg_gain', 'avg_loss', 'ema_fast', 'ema_slow', 'ema_signal',
+                  'count', 'signal_count', 'last_timestamp', 'prev_macd', 'prev_signal')
+
+
+def stack_candles(arrays, limit=100):
+    """Xếp các mảng nến (n, 6) thành hai mảng cặp × nến (timestamp, close)
+
+    Lấy tối đa `limit` nến cuối của mỗi cặp, căn phải; cặp có ít nến hơn được điền NaN ở đầu.
+    """
+    width = min(limit, max((len(array) for array in arrays), default=0))
+    timestamps = np.full((len(arrays), width), np.nan)
+    closes = np.full((len(arrays), width), np.nan)
+    for i, array in enumerate(arrays):
+        tail = array[len(array) - width:] if len(array) > width else array
+        if len(tail):
+            timestamps[i, width - len(tail):] = tail[:, 0]
+            closes[i, width - len(tail):] = tail[:, 4]
+    return timestamps, closes
+
+
+class CrossSectionEngine:
+    """RSI + MACD của nhiều cặp tính đồng thời trên mảng 2-D cặp × nến
+
+    Cùng công thức và cách đồng bộ với IndicatorEngine.sync, nhưng mỗi nến là một phép tính
+    vectơ trên mọi cặp thay vì một vòng lặp Python cho từng cặp. Trạng thái của mỗi cặp
+    (một hàng) được giữ giữa các chu kỳ nên thường chỉ phải tính nến vừa đóng và nến đang
+    hình thành.
+    """
+
+    def __init__(self, rsi_window=14, macd_fast=12, macd_slow=26, macd_signal=9):
+        self.rsi_window = rsi_window
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self._rsi_alpha = 1.0 / rsi_window
+        self._fast_alpha = 2.0 / (macd_fast + 1)
+        self._slow_alpha = 2.0 / (macd_slow + 1)
+        self._signal_alpha = 2.0 / (macd_signal + 1)
+        self._rows = {}  # key -> chỉ số hàng trạng thái
+        self._state = np.empty((0, len(_STATE_COLUMNS)))
+
+    def _row_indices(self, keys):
+        new_keys = [key for key in keys if key not in self._rows]
+        if new_keys:
+            for key in new_keys:
+                self._rows[key] = len(self._rows)
+            fresh = np.zeros((len(new_keys), len(_STATE_COLUMNS)))
+            fresh[:, [0, 8, 9, 10]] = np.nan  # Chưa có nến nào
+            self._state = np.concatenate((self._state, fresh))
+        return np.fromiter((self._rows[key] for key in keys), dtype=np.intp, count=len(keys))
+
+    def _step(self, state, close, mask):
+        """Trạng thái mới và (rsi, macd, signal, histogram) khi thêm nến `close` cho các hàng `mask`"""
+        last_close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count = state
+        first = mask & np.isnan(last_close)
+        cont = mask & ~first
+
+        diff = close - last_close
+        gain = np.where(diff > 0, diff, 0.0)
+        loss = np.where(diff < 0, -diff, 0.0)
+        avg_gain = np.where(cont, avg_gain + self._rsi_alpha * (gain - avg_gain), avg_gain)
+        avg_loss = np.where(cont, avg_loss + self._rsi_alpha * (loss - avg_loss), avg_loss)
+        # `ta` dùng giá của nến đầu tiên làm giá trị EMA khởi đầu
+        ema_fast = np.where(first, close, np.where(cont, ema_fast + self._fast_alpha * (close - ema_fast), ema_fast))
+        ema_slow = np.where(first, close, np.where(cont, ema_slow + self._slow_alpha * (close - ema_slow), ema_slow))
+        last_close = np.where(mask, close, last_close)
+        count = count + mask
+
+        rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        rsi = np.where(mask & (count >= self.rsi_window), rsi, np.nan)
+
+        macd_ready = mask & (count >= self.macd_fast) & (count >= self.macd_slow)
+        macd = np.where(macd_ready, ema_fast - ema_slow, np.nan)
+        # Đường Signal bắt đầu từ giá trị MACD hợp lệ đầu tiên
+        ema_signal = np.where(macd_ready, np.where(signal_count == 0, macd,
+                                                   ema_signal + self._signal_alpha * (macd - ema_signal)), ema_signal)
+        signal_count = signal_count + macd_ready
+        signal = np.where(macd_ready & (signal_count >= self.macd_signal), ema_signal, np.nan)
+
+        state = (last_close, avg_gain, avg_loss, ema_fast, ema_slow, ema_signal, count, signal_count)
+        return state, (rsi, macd, signal, macd - signal)
+
+    def sync(self, keys, timestamps, closes):
+        """Đồng bộ trạng thái của các cặp `keys` với cửa sổ nến (mảng cặp × nến từ stack_candles)
+
+        Trả về mảng (len(SNAPSHOT_FIELDS), số cặp): giá và chỉ báo của nến cuối (đang hình
+        thành) cùng MACD/Signal của nến đã đóng trước đó. Như IndicatorEngine.sync, cặp nào có
+        cửa sổ không nối tiếp trạng thái thì được tính lại từ đầu cửa sổ.
+        """
+        rows = self._row_indices(keys)
+        n_pairs, n = closes.shape
+        result = np.full((len(SNAPSHOT_FIELDS), n_pairs), np.nan)
+        if n_pairs == 0 or n == 0:
+            return result
+
+        columns = list(self._state[rows].T)
+        last_timestamp = columns[8]
+        match = timestamps == last_timestamp[:, None]
+        known = match.any(axis=1)
+        start = np.where(known, match.argmax(axis=1) + 1, 0)
+        reset = ~known
+        if reset.any():
+            for i, column in enumerate(columns):
+                column[reset] = np.nan if i in (0, 8, 9, 10) else 0.0
+
+        state = tuple(columns[:8])
+        last_timestamp, prev_macd, prev_signal = columns[8:]
+        valid = ~np.isnan(closes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(int(start.min()), n - 1):
+                mask = valid[:, i] & (start <= i)
+                if not mask.any():
+                    continue
+                state, (_, macd, signal, _) = self._step(state, closes[:, i], mask)
+                last_timestamp = np.where(mask, timestamps[:, i], last_timestamp)
+                prev_macd = np.where(mask, macd, prev_macd)
+                prev_signal = np.where(mask, signal, prev_signal)
+            # Nến cuối đang hình thành: tính giá trị nhưng không ghi nhận vào trạng thái
+            _, (rsi, macd, signal, histogram) = self._step(state, closes[:, n - 1], valid[:, n - 1])
+
+        self._state[rows] = np.column_stack(state + (last_timestamp, prev_macd, prev_signal))
+        result[:] = (closes[:, n - 1], rsi, macd, signal, histogram, prev_macd, prev_signal)
+        return result
+
+    def export_states(self):
+        """Trạng thái của mọi hàng để lưu warm start: (danh sách key, mảng (số hàng, 11))"""
+        return list(self._rows), self._state.copy()
+
+    def restore_states(self, keys, states):
+        """Nạp lại trạng thái từ kết quả của `export_states`"""
+        rows = self._row_indices(keys)
+        self._state[rows] = states
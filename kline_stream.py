@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Nhận nến (kline) qua WebSocket thay cho vòng lặp polling
+
+Transport chỉ cần có `watch_ohlcv(symbol, timeframe)` trả về danh sách nến
+[timestamp, open, high, low, close, volume] mới cập nhật, `last_closed(symbol, timeframe)`
+trả về timestamp của nến đã đóng gần nhất (None nếu chưa có) và `close()`:
+- CcxtProTransport: dùng `ccxt.pro` (watch_ohlcv) kết nối Binance
+- WebSocketKlineTransport: kết nối một WebSocket theo định dạng kline stream của Binance
+- LocalKlineServer: server giả lập cục bộ theo định dạng Binance (dùng cho `--mock --stream`)
+
+Chạy server giả lập:
+    python kline_stream.py --port 8765 --interval 0.5
+"""
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+import aiohttp
+from aiohttp import web
+import ccxt.pro as ccxt_pro
+import numpy as np
+
+from candle_cache import timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+
+def stream_name(symbol, timeframe):
+    """Tên stream Binance, ví dụ BTC/USDT + 1h -> btcusdt@kline_1h"""
+    return f"{symbol.replace('/', '').lower()}@kline_{timeframe}"
+
+
+class CcxtProTransport:
+    """Transport dùng watch_ohlcv của ccxt.pro
+
+    ccxt.pro không báo nến đã đóng: nến trước được coi là đã đóng khi nến mới xuất hiện.
+    """
+
+    def __init__(self, api_key=None, secret=None):
+        self.exchange = ccxt_pro.binance({
+            'apiKey': api_key,
+            'secret': secret,
+            'enableRateLimit': True,
+        })
+        self._latest = {}  # stream -> timestamp nến mới nhất
+        self._closed = {}  # stream -> timestamp nến đã đóng gần nhất
+
+    async def watch_ohlcv(self, symbol, timeframe):
+        candles = await self.exchange.watch_ohlcv(symbol, timeframe)
+        name = stream_name(symbol, timeframe)
+        timestamps = [candle[0] for candle in candles]
+        if name in self._latest:
+            timestamps.append(self._latest[name])
+        newest = max(timestamps)
+        older = [timestamp for timestamp in timestamps if timestamp < newest]
+        if older:
+            self._closed[name] = max(older)
+        self._latest[name] = newest
+        return candles
+
+    def last_closed(self, symbol, timeframe):
+        return self._closed.get(stream_name(symbol, timeframe))
+
+    async def close(self):
+        await self.exchange.close()
+
+
+class WebSocketKlineTransport:
+    """Transport kết nối một WebSocket dạng Binance, dùng một kết nối cho mọi stream"""
+
+    def __init__(self, url):
+        self.url = url
+        self._session = None
+        self._ws = None
+        self._reader = None
+        self._queues = {}
+        self._subscribed = set()
+        self._closed = {}  # stream -> timestamp nến đã đóng gần nhất (`x: true`)
+        self._next_id = 1
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._ws is not None and not self._ws.closed:
+                return
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            self._ws = await self._session.ws_connect(self.url, heartbeat=30)
+            self._reader = asyncio.create_task(self._read_loop(self._ws))
+            logger.info(f"Đã kết nối WebSocket kline: {self.url}")
+            # Đăng ký lại các stream sau khi kết nối lại
+            self._subscribed = set(self._queues)
+            if self._subscribed:
+                await self._subscribe(list(self._subscribed))
+
+    async def _subscribe(self, streams):
+        await self._ws.send_json({'method': 'SUBSCRIBE', 'params': streams, 'id': self._next_id})
+        self._next_id += 1
+
+    async def _read_loop(self, ws):
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                # Combined stream bọc dữ liệu trong {"stream": ..., "data": ...}
+                data = data.get('data', data)
+                if data.get('e') != 'kline':
+                    continue
+                kline = data['k']
+                name = f"{kline['s'].lower()}@kline_{kline['i']}"
+                queue = self._queues.get(name)
+                if queue is not None:
+                    if kline['x']:
+                        self._closed[name] = int(kline['t'])
+                    queue.put_nowait([
+                        int(kline['t']), float(kline['o']), float(kline['h']),
+                        float(kline['l']), float(kline['c']), float(kline['v'])
+                    ])
+        except Exception as e:
+            logger.warning(f"Mất kết nối WebSocket kline: {e}")
+        finally:
+            # Báo cho các watcher biết kết nối đã đóng
+            for queue in self._queues.values():
+                queue.put_nowait(None)
+
+    async def watch_ohlcv(self, symbol, timeframe):
+        name = stream_name(symbol, timeframe)
+        if name not in self._queues:
+            self._queues[name] = asyncio.Queue()
+        await self._connect()
+        if name not in self._subscribed:
+            self._subscribed.add(name)
+            await self._subscribe([name])
+
+        queue = self._queues[name]
+        candles = [await queue.get()]
+        # Lấy luôn các cập nhật đang chờ để không xử lý chậm hơn stream
+        while not queue.empty():
+            candles.append(queue.get_nowait())
+        if any(candle is None for candle in candles):
+            raise ConnectionError(f"WebSocket kline đã đóng ({name})")
+        return candles
+
+    def last_closed(self, symbol, timeframe):
+        return self._closed.get(stream_name(symbol, timeframe))
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+
+class LocalKlineServer:
+    """Server WebSocket giả lập kline stream của Binance để chạy `--mock --stream` không cần mạng
+
+    Hỗ trợ `/ws` với lệnh SUBSCRIBE/UNSUBSCRIBE. Mỗi `interval` giây gửi một cập
+    nhật cho nến đang hình thành; sau `updates_per_candle` lần thì đóng nến
+    (`x: true`) và chuyển sang nến kế tiếp.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, interval=0.5, updates_per_candle=10,
+                 starting_price=20000, volatility=0.002, seed=None):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.updates_per_candle = updates_per_candle
+        self.starting_price = starting_price
+        self.volatility = volatility
+        self.rng = np.random.default_rng(seed)
+        self._runner = None
+        self._candles = {}
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/ws', self._handle_ws)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Lấy cổng thực tế khi port=0
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Server kline giả lập đang chạy tại {self.url}")
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _next_event(self, name):
+        """Sinh cập nhật tiếp theo cho một stream"""
+        symbol_id, timeframe = name.split('@kline_')
+        candle = self._candles.get(name)
+        if candle is None or candle['x']:
+            timeframe_ms = timeframe_to_ms(timeframe)
+            if candle is None:
+                start = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+                price = self.starting_price
+            else:
+                start = candle['t'] + timeframe_ms
+                price = candle['c']
+            candle = {'t': start, 'T': start + timeframe_ms - 1, 'o': price, 'h': price,
+                      'l': price, 'c': price, 'v': 0.0, 'n': 0, 'x': False}
+            self._candles[name] = candle
+
+        price = candle['c'] * (1 + self.rng.normal(0, self.volatility))
+        candle['c'] = price
+        candle['h'] = max(candle['h'], price)
+        candle['l'] = min(candle['l'], price)
+        candle['v'] += float(self.rng.uniform(1, 10))
+        candle['n'] += 1
+        candle['x'] = candle['n'] >= self.updates_per_candle
+
+        return {
+            'e': 'kline',
+            'E': int(time.time() * 1000),
+            's': symbol_id.upper(),
+            'k': {
+                't': candle['t'], 'T': candle['T'], 's': symbol_id.upper(), 'i': timeframe,
+                'o': f"{candle['o']:.8f}", 'c': f"{candle['c']:.8f}", 'h': f"{candle['h']:.8f}",
+                'l': f"{candle['l']:.8f}", 'v': f"{candle['v']:.8f}", 'x': candle['x']
+            }
+        }
+
+    async def _push_loop(self, ws, streams):
+        while not ws.closed:
+            for name in list(streams):
+                await ws.send_json(self._next_event(name))
+            await asyncio.sleep(self.interval)
+
+    async def _handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = set()
+        pusher = asyncio.create_task(self._push_loop(ws, streams))
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                command = json.loads(msg.data)
+                if command.get('method') == 'SUBSCRIBE':
+                    streams.update(command.get('params', []))
+                elif command.get('method') == 'UNSUBSCRIBE':
+                    streams.difference_update(command.get('params', []))
+                await ws.send_json({'result': None, 'id': command.get('id')})
+        finally:
+            pusher.cancel()
+            await asyncio.gather(pusher, return_exceptions=True)
+        return ws
+
+
+async def _serve_forever(args):
+    server = LocalKlineServer(host=args.host, port=args.port, interval=args.interval,
+                              updates_per_candle=args.updates_per_candle, seed=args.seed)
+    await server.start()
+    print(f"Server kline giả lập: {server.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Server WebSocket giả lập kline stream của Binance')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval', type=float, default=0.5, help='Số giây giữa các cập nhật')
+    parser.add_argument('--updates-per-candle', type=int, default=10, help='Số cập nhật trước khi đóng nến')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Ghi log không chặn event loop: QueueHandler + luồng ghi riêng
+
+Mọi logger chỉ đưa LogRecord vào một hàng đợi trong bộ nhớ; luồng QueueListener mới
+định dạng message và ghi ra console/file, nên lời gọi log trong chu kỳ kiểm tra không phải
+chờ I/O đĩa. Message được định dạng lười (`logger.info("... %s", value)`) ở luồng ghi,
+nên tham số truyền vào phải là giá trị không bị thay đổi sau đó (số, chuỗi, dict mới tạo).
+Tín hiệu giao dịch được ghi thành từng dòng JSON (`JsonFormatter`).
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+
+def _json_default(value):
+    # Kiểu số của numpy (np.int64...) không serialize được trực tiếp
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """Một dòng JSON cho mỗi bản ghi: time, level, event (message) và các trường trong `extra={'fields': {...}}`"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=_json_default)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler không định dạng message ở luồng gọi, để luồng ghi làm việc đó"""
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Traceback phải được định dạng ngay, trước khi các frame thay đổi
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogPipeline:
+    """Một hàng đợi log dùng chung và luồng ghi ra các handler thật"""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.queue = queue.SimpleQueue()
+        self.handler = DeferredQueueHandler(self.queue)
+        self.listener = None
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Ghi hết các log đang chờ rồi dừng luồng ghi"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _restart_in_child(self):
+        # Tiến trình con (fork) không có luồng ghi của tiến trình cha
+        self.queue = queue.SimpleQueue()
+        self.handler.queue = self.queue
+        self.listener = None
+        self.start()
+
+
+def start_log_pipeline(handlers):
+    """Chạy luồng ghi cho `handlers`, trả về LogPipeline (gắn `pipeline.handler` vào các logger)
+
+    Luồng ghi được dừng (ghi hết log đang chờ) khi thoát chương trình và khởi động lại trong
+    tiến trình con tạo bằng fork.
+    """
+    pipeline = LogPipeline(handlers)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=pipeline._restart_in_child)
+    return pipeline
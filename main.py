@@ -5,22 +5,40 @@ import os
 import time
 import logging
 from logging.handlers import RotatingFileHandler
-import ccxt
-import pandas as pd
+import ccxt.async_support as ccxt_async
 import numpy as np
 from dotenv import load_dotenv
 import telegram
 from telegram.request import HTTPXRequest
 from ta.momentum import RSIIndicator
 from ta.trend import MACD
-import random
 import argparse
-import datetime
 import asyncio
+import inspect
+import signal
+from collections import namedtuple
+from candle_cache import CandleCache, timeframe_to_ms, resample_ohlcv
+from candle_store import CandleStore, CANDLE_STORE_DIR
+from indicators import IndicatorEngine, CrossSectionEngine, SNAPSHOT_FIELDS, stack_candles
+from kline_stream import CcxtProTransport, WebSocketKlineTransport, LocalKlineServer
+from scheduler import CycleScheduler
+from alert_dispatcher import AlertDispatcher, parse_chat_id
+from state_store import StateStore, STATE_FIELDS
+from warm_start import WarmStartSnapshot
+from log_pipeline import JsonFormatter, start_log_pipeline
+from metrics import MetricsRegistry, MetricsServer
+from sharding import ShardSupervisor, RemoteAlerts, ignore_interrupt, shard_of
+from config_watcher import ConfigWatcher
+
+# Load biến môi trường
+load_dotenv()
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()  # WARNING để bỏ qua log chỉ báo mỗi chu kỳ
+SIGNAL_LOGGER = 'trading_signals'
 
 # Thiết lập logging với file handler
 def setup_logging():
-    """Thiết lập logging để ghi vào cả console và file"""
+    """Thiết lập logging để ghi vào cả console và file qua một luồng ghi riêng (không chặn event loop)"""
     # Tạo thư mục logs nếu chưa tồn tại
     if not os.path.exists('logs'):
         os.makedirs('logs')
@@ -33,7 +51,7 @@ def setup_logging():
     
     # Tạo logger chính
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
     
     # Xóa các handler cũ nếu có
     for handler in logger.handlers[:]:
@@ -41,9 +59,8 @@ def setup_logging():
     
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(logging.DEBUG)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     
     # File handler với rotation (tối đa 10MB, giữ 5 file backup)
     file_handler = RotatingFileHandler(
@@ -52,28 +69,30 @@ def setup_logging():
         backupCount=5,
         encoding='utf-8'
     )
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
     
-    # Tạo file handler riêng cho trading signals
+    # Tạo file handler riêng cho trading signals (mỗi tín hiệu một dòng JSON)
     signal_handler = RotatingFileHandler(
-        'logs/trading_signals.log',
+        'logs/trading_signals.jsonl',
         maxBytes=5*1024*1024,  # 5MB
         backupCount=3,
         encoding='utf-8'
     )
     signal_handler.setLevel(logging.INFO)
-    signal_formatter = logging.Formatter(
-        '%(asctime)s - SIGNAL - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    signal_handler.setFormatter(signal_formatter)
+    signal_handler.setFormatter(JsonFormatter())
+    
+    # Mọi log đi qua một hàng đợi, luồng ghi phân về đúng file theo logger
+    signal_handler.addFilter(logging.Filter(SIGNAL_LOGGER))
+    for handler in (console_handler, file_handler):
+        handler.addFilter(lambda record: record.name != SIGNAL_LOGGER)
+    pipeline = start_log_pipeline([console_handler, file_handler, signal_handler])
+    logger.addHandler(pipeline.handler)
     
     # Tạo logger riêng cho signals
-    signal_logger = logging.getLogger('trading_signals')
+    signal_logger = logging.getLogger(SIGNAL_LOGGER)
     signal_logger.setLevel(logging.INFO)
-    signal_logger.addHandler(signal_handler)
+    signal_logger.addHandler(pipeline.handler)
     signal_logger.propagate = False  # Không gửi lên parent logger
     
     return logger
@@ -81,120 +100,514 @@ def setup_logging():
 # Khởi tạo logging
 logger = setup_logging()
 
-# Load biến môi trường
-load_dotenv()
-
 # Lấy thông tin cấu hình từ file .env
 BINANCE_API_KEY = os.getenv('BINANCE_API_KEY')
 BINANCE_SECRET_KEY = os.getenv('BINANCE_SECRET_KEY')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 TELEGRAM_PROXY_URL = os.getenv('TELEGRAM_PROXY_URL')  # Thêm biến môi trường cho proxy
-RSI_WINDOW = int(os.getenv('RSI_WINDOW', 14))
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', 8))  # Số kết nối HTTP tới Telegram
+# Hàng đợi gửi cảnh báo: giới hạn chống flood của Telegram (~30 tin/giây toàn bot, ~20 tin/phút mỗi nhóm)
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 25))  # Tin/giây trên toàn bot
+TELEGRAM_CHAT_INTERVAL = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 3))  # Giây giữa hai tin trong một chat
+TELEGRAM_BATCH_WINDOW = float(os.getenv('TELEGRAM_BATCH_WINDOW', 1))  # Chờ để gộp cảnh báo đến cùng lúc
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+# Mặc định của các cấu hình đổi được khi đang chạy; cũng được dùng lại khi biến bị xóa khỏi CONFIG_FILE
+LIVE_CONFIG_DEFAULTS = {
+    'TRADING_PAIRS': 'BTC/USDT,ETH/USDT,SOL/USDT,SUI/USDT',
+    'RSI_WINDOW': '14',
+    'RSI_OVERSOLD': '30',
+    'RSI_OVERBOUGHT': '70',
+    'RSI_EXIT': '50',
+    'MACD_FAST': '12',
+    'MACD_SLOW': '26',
+    'MACD_SIGNAL': '9',
+    'SIGNAL_MODE': 'BOTH',  # RSI, MACD, BOTH
+    'RSI_INDEPENDENT': 'true',
+    'MACD_INDEPENDENT': 'true',
+}
+
+def live_config_value(key):
+    """Giá trị hiện tại (dạng chuỗi) của một cấu hình đổi được khi đang chạy"""
+    return os.getenv(key, LIVE_CONFIG_DEFAULTS[key])
+
+RSI_WINDOW = int(live_config_value('RSI_WINDOW'))
 RSI_TIMEFRAME = os.getenv('RSI_TIMEFRAME', '1h')
+# Các khung thời gian chạy chiến lược cùng lúc, ví dụ 5m,15m,1h,4h (mặc định chỉ RSI_TIMEFRAME).
+# Khi có nhiều khung, mỗi cặp chỉ tải một luồng nến BASE_TIMEFRAME và gộp ra các khung lớn hơn.
+SIGNAL_TIMEFRAMES = [tf.strip() for tf in os.getenv('SIGNAL_TIMEFRAMES', RSI_TIMEFRAME).split(',') if tf.strip()]
+BASE_TIMEFRAME = os.getenv('BASE_TIMEFRAME', '1m')
+# Đánh giá mọi cặp trong một lần tính vectơ mỗi chu kỳ thay vì từng cặp một (nên bật khi có hàng trăm cặp)
+CROSS_SECTIONAL = os.getenv('CROSS_SECTIONAL', 'false').lower() == 'true'
+CANDLE_LIMIT = 100  # Số nến mỗi lần tính chỉ báo
+# Khi polling: cập nhật nến đang hình thành của mọi cặp bằng fetch_tickers theo lô,
+# chỉ gọi fetch_ohlcv riêng cho cặp vừa đóng nến
+BULK_TICKERS = os.getenv('BULK_TICKERS', 'true').lower() == 'true'
+TICKER_BATCH_SIZE = int(os.getenv('TICKER_BATCH_SIZE', 100))  # Số cặp mỗi request fetch_tickers
 
 # Thay đổi cấu hình để hỗ trợ nhiều cặp giao dịch
-TRADING_PAIRS = os.getenv('TRADING_PAIRS', 'BTC/USDT,ETH/USDT,SOL/USDT,SUI/USDT').split(',')
+TRADING_PAIRS = live_config_value('TRADING_PAIRS').split(',')
 
 # Các ngưỡng RSI cho chiến lược
-RSI_OVERSOLD = int(os.getenv('RSI_OVERSOLD', 30))
-RSI_OVERBOUGHT = int(os.getenv('RSI_OVERBOUGHT', 70))
-RSI_EXIT = int(os.getenv('RSI_EXIT', 50))
+RSI_OVERSOLD = int(live_config_value('RSI_OVERSOLD'))
+RSI_OVERBOUGHT = int(live_config_value('RSI_OVERBOUGHT'))
+RSI_EXIT = int(live_config_value('RSI_EXIT'))
 
 # Các thông số MACD
-MACD_FAST = int(os.getenv('MACD_FAST', 12))
-MACD_SLOW = int(os.getenv('MACD_SLOW', 26))
-MACD_SIGNAL = int(os.getenv('MACD_SIGNAL', 9))
+MACD_FAST = int(live_config_value('MACD_FAST'))
+MACD_SLOW = int(live_config_value('MACD_SLOW'))
+MACD_SIGNAL = int(live_config_value('MACD_SIGNAL'))
+
+# Lịch kiểm tra khi polling: chạy theo các mốc cố định trùng với lúc đóng nến
+POLL_INTERVAL = int(os.getenv('POLL_INTERVAL', 300))  # Giây giữa hai chu kỳ (tối đa bằng khung thời gian)
+SCHEDULE_DELAY = float(os.getenv('SCHEDULE_DELAY', 2))  # Chờ sau mốc để sàn chốt nến vừa đóng
+SCHEDULE_STAGGER = float(os.getenv('SCHEDULE_STAGGER', 10))  # Rải các cặp trong khoảng này sau mốc
+
+# Endpoint Prometheus /metrics (để trống METRICS_PORT để tắt)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT', '9108')
+
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram(
+    'signal_bot_stage_seconds',
+    'Thời gian mỗi bước (fetch, indicators, cycle) theo cặp và khung (khung nến gốc khi tải chung nhiều khung); '
+    'bước chung cho mọi cặp (bulk_fetch, bulk_indicators) có symbol="*"',
+    ('symbol', 'timeframe', 'stage'))
+ALERT_SECONDS = METRICS.histogram(
+    'signal_bot_alert_seconds', 'Thời gian từ lúc cảnh báo vào hàng đợi tới lúc Telegram gửi xong (hoặc bỏ qua)',
+    ('outcome',))
+SIGNALS_TOTAL = METRICS.counter('signal_bot_signals_total', 'Số tín hiệu vào/thoát lệnh', ('symbol', 'timeframe', 'signal'))
+ERRORS_TOTAL = METRICS.counter('signal_bot_errors_total', 'Số lỗi theo cặp và bước', ('symbol', 'stage'))
+POSITION = METRICS.gauge('signal_bot_position', 'Vị thế hiện tại: 1 long, -1 short, 0 không có', ('symbol', 'timeframe'))
+PNL_USD = METRICS.gauge('signal_bot_pnl_usd', 'Tổng PnL (USD) theo cặp và khung', ('symbol', 'timeframe'))
+TRADES = METRICS.gauge('signal_bot_trades', 'Số giao dịch đã đóng theo cặp và khung', ('symbol', 'timeframe'))
+OPEN_POSITIONS = METRICS.gauge('signal_bot_open_positions', 'Số vị thế đang mở')
+TOTAL_PNL_USD = METRICS.gauge('signal_bot_total_pnl_usd', 'Tổng PnL (USD) của mọi cặp')
+WIN_RATE = METRICS.gauge('signal_bot_win_rate_percent', 'Tỷ lệ thắng tổng (%)')
+ALERT_QUEUE_DEPTH = METRICS.gauge('signal_bot_alert_queue_depth', 'Số cảnh báo đang chờ gửi Telegram')
+SCHEDULE_LAG = METRICS.gauge('signal_bot_schedule_lag_seconds', 'Độ trễ so với lịch của chu kỳ gần nhất')
+MISSED_TICKS = METRICS.gauge('signal_bot_schedule_missed_ticks', 'Số mốc lịch bị bỏ lỡ do chu kỳ chạy quá lâu')
+
+# Lưu trạng thái vị thế/PnL để khôi phục sau khi khởi động lại (để trống để tắt)
+STATE_DB = os.getenv('STATE_DB', 'data/state.db')
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', 1))  # Giây giữa hai lần ghi theo lô
+
+# Snapshot buffer nến + trạng thái RSI/MACD để khởi động lại không phải tải/tính lại cả cửa sổ
+# (để trống để tắt), xem warm_start.py
+WARM_START_FILE = os.getenv('WARM_START_FILE', 'data/warm_start.npz')
+WARM_START_INTERVAL = float(os.getenv('WARM_START_INTERVAL', 60))  # Giây giữa hai lần ghi (0: chỉ ghi khi dừng)
+
+# Chạy nhiều tiến trình worker (0 hoặc 1: một tiến trình), xem sharding.py
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', 0))
+SHARD_STATS_INTERVAL = float(os.getenv('SHARD_STATS_INTERVAL', 60))  # Giây giữa hai lần worker gửi thống kê
+SHARD_RESTART_DELAY = float(os.getenv('SHARD_RESTART_DELAY', 5))  # Chờ trước khi khởi động lại worker bị chết
 
 # Cấu hình signal mode
-SIGNAL_MODE = os.getenv('SIGNAL_MODE', 'BOTH')  # RSI, MACD, BOTH
-RSI_INDEPENDENT = os.getenv('RSI_INDEPENDENT', 'true').lower() == 'true'
-MACD_INDEPENDENT = os.getenv('MACD_INDEPENDENT', 'true').lower() == 'true'
+SIGNAL_MODE = live_config_value('SIGNAL_MODE')  # RSI, MACD, BOTH
+RSI_INDEPENDENT = live_config_value('RSI_INDEPENDENT').lower() == 'true'
+MACD_INDEPENDENT = live_config_value('MACD_INDEPENDENT').lower() == 'true'
+
+# Đọc lại file cấu hình khi đang chạy: TRADING_PAIRS, RSI_*, MACD_*, SIGNAL_MODE mới được áp dụng
+# mà không cần khởi động lại (CONFIG_RELOAD_INTERVAL=0 để tắt)
+CONFIG_FILE = os.getenv('CONFIG_FILE', '.env')
+CONFIG_RELOAD_INTERVAL = float(os.getenv('CONFIG_RELOAD_INTERVAL', 5))  # Giây giữa hai lần kiểm tra file
 
 class MockBinance:
-    """Class giả lập dữ liệu từ Binance cho việc test"""
+    """Class giả lập dữ liệu từ Binance cho việc test
+
+    Giá được sinh bằng NumPy (vector hóa) từ `np.random.Generator` có seed, nên cùng
+    seed cho cùng chuỗi giá. Mỗi cặp có một đường giá nến 1m riêng, tiếp tục theo thời
+    gian qua các lần gọi; mọi khung thời gian được gộp từ đường giá này nên giá giữa các
+    khung luôn khớp nhau. Biến động được chia theo số nến 1m trong `timeframe` để nến
+    `timeframe` có độ biến động `volatility` như trước.
+    """
     
-    def __init__(self, starting_price=20000, volatility=0.05, timeframe='1h'):
+    # Xu hướng thị trường: (drift, hệ số volatility)
+    TRENDS = {
+        'uptrend': (0.002, 1.0),     # Xu hướng tăng giá
+        'downtrend': (-0.002, 1.0),  # Xu hướng giảm giá
+        'sideways': (0.0, 0.5),      # Thị trường đi ngang
+        'volatile': (0.0, 2.0),      # Thị trường biến động mạnh
+    }
+    REGIME_LENGTH = 50  # Số nến giữ nguyên một xu hướng
+    MIN_PRICE = 100     # Giá tối thiểu
+    BASE_TIMEFRAME = '1m'  # Khung của đường giá gốc
+    
+    def __init__(self, starting_price=20000, volatility=0.05, timeframe='1h', seed=None, history=1000):
         self.starting_price = starting_price
         self.volatility = volatility
         self.timeframe = timeframe
         self.current_price = starting_price
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.history = history  # Số nến 1m tối thiểu lưu cho mỗi đường giá (tự tăng khi cần lịch sử dài hơn)
+        self._trend_names = list(self.TRENDS)
+        self._drifts = np.array([self.TRENDS[name][0] for name in self._trend_names])
+        self._scales = np.array([self.TRENDS[name][1] for name in self._trend_names]) * volatility
+        self._base_ms = timeframe_to_ms(self.BASE_TIMEFRAME)
+        self._base_ratio = max(1, timeframe_to_ms(timeframe) // self._base_ms)  # Số nến 1m trong một nến `timeframe`
+        self._base_noise = 1 / np.sqrt(self._base_ratio)
+        self._paths = {}  # symbol -> trạng thái đường giá 1m
         
-    def _generate_mock_price(self, periods=100):
-        """Tạo giá giả lập theo mô hình ngẫu nhiên"""
-        prices = [self.starting_price]
+    def _new_path(self, start_price):
+        return {'candles': None, 'close': start_price, 'step': 0, 'trend': 0, 'regime_left': 0,
+                'history': self.history}
         
-        # Tạo một xu hướng thị trường ngẫu nhiên để tạo ra RSI thấp/cao
-        trend_type = random.choice(['uptrend', 'downtrend', 'sideways', 'volatile'])
-        logger.info(f"Tạo dữ liệu giả lập với xu hướng: {trend_type}")
+    def _trend_sequence(self, path, periods, regime_length):
+        """Xu hướng cho từng bước giá, đổi xu hướng sau mỗi `regime_length` bước"""
+        trends = np.empty(periods, dtype=np.int64)
+        filled = 0
+        while filled < periods:
+            if path['regime_left'] == 0:
+                path['trend'] = int(self.rng.integers(len(self._trend_names)))
+                path['regime_left'] = regime_length
+            take = min(periods - filled, path['regime_left'])
+            trends[filled:filled + take] = path['trend']
+            path['regime_left'] -= take
+            filled += take
+        return trends
         
-        for i in range(1, periods):
-            if trend_type == 'uptrend':
-                # Xu hướng tăng giá
-                change = np.random.normal(0.002, self.volatility)
-            elif trend_type == 'downtrend':
-                # Xu hướng giảm giá
-                change = np.random.normal(-0.002, self.volatility)
-            elif trend_type == 'volatile':
-                # Thị trường biến động mạnh
-                change = np.random.normal(0, self.volatility * 2)
-            else:
-                # Thị trường đi ngang
-                change = np.random.normal(0, self.volatility / 2)
-                
-            # Thêm một số đỉnh và đáy để tạo tín hiệu RSI rõ ràng
-            if i % 20 == 0 and trend_type == 'volatile':
-                if random.random() > 0.5:
-                    # Đỉnh giá (có thể tạo tín hiệu short)
-                    change = self.volatility * 3
-                else:
-                    # Đáy giá (có thể tạo tín hiệu long)
-                    change = -self.volatility * 3
-                    
-            new_price = prices[-1] * (1 + change)
-            prices.append(max(100, new_price))  # Giá tối thiểu là 100
+    def _generate_mock_price(self, periods=100, path=None, ratio=1):
+        """Tạo `periods` giá đóng cửa tiếp theo của đường giá theo mô hình ngẫu nhiên
+
+        `ratio`: số bước giá cho mỗi nến của khung chuẩn (drift, volatility và độ dài xu
+        hướng được chia tương ứng).
+        """
+        if path is None:
+            path = self._new_path(self.starting_price)
+        if periods <= 0:
+            return np.empty(0)
             
+        trends = self._trend_sequence(path, periods, self.REGIME_LENGTH * ratio)
+        changes = self.rng.normal(self._drifts[trends] / ratio, self._scales[trends] / np.sqrt(ratio))
+        
+        # Thêm một số đỉnh và đáy để tạo tín hiệu RSI rõ ràng khi thị trường biến động mạnh
+        steps = path['step'] + 1 + np.arange(periods)
+        spikes = (steps % (20 * ratio) == 0) & (trends == self._trend_names.index('volatile'))
+        signs = np.where(self.rng.random(periods) > 0.5, 1.0, -1.0)
+        changes = np.where(spikes, signs * self.volatility * 3, changes)
+        
+        # p_i = max(MIN_PRICE, p_{i-1} * (1 + change_i)) tính vector hóa trong không gian log
+        log_floor = np.log(self.MIN_PRICE)
+        cumulative = np.log(path['close']) + np.cumsum(np.log1p(np.maximum(changes, -0.99)))
+        log_prices = cumulative + np.maximum(0.0, np.maximum.accumulate(log_floor - cumulative))
+        prices = np.exp(log_prices)
+        
+        path['step'] += periods
+        path['close'] = prices[-1]
         return prices
         
-    def fetch_ohlcv(self, symbol, timeframe, limit=100):
+    def _build_candles(self, closes, first_timestamp, timeframe_ms, first_open=None, noise=1.0):
+        """Tạo mảng OHLCV (n, 6) từ giá đóng cửa, `noise` co giãn độ lệch của giá mở cửa và râu nến"""
+        n = len(closes)
+        timestamps = first_timestamp + timeframe_ms * np.arange(n, dtype=np.float64)
+        # Tạo giá O, H, L dựa trên giá đóng cửa
+        opens = closes * (1 + self.rng.normal(0, 0.005 * noise, n))
+        if first_open is not None and n > 0:
+            opens[0] = first_open
+        highs = np.maximum(closes, opens) * (1 + np.abs(self.rng.normal(0, 0.01 * noise, n)))
+        lows = np.minimum(closes, opens) * (1 - np.abs(self.rng.normal(0, 0.01 * noise, n)))
+        volumes = closes * self.rng.uniform(10, 100, n)
+        return np.column_stack((timestamps, opens, highs, lows, closes, volumes))
+        
+    def generate_history(self, timeframe, count, end_timestamp=None):
+        """Sinh `count` nến liên tiếp kết thúc tại `end_timestamp` (dùng cho load test/backtest)"""
+        timeframe_ms = timeframe_to_ms(timeframe)
+        if end_timestamp is None:
+            end_timestamp = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+        path = self._new_path(self.starting_price)
+        closes = self._generate_mock_price(count, path)
+        return self._build_candles(closes, end_timestamp - timeframe_ms * (count - 1), timeframe_ms)
+        
+    def _advance_path(self, symbol, now_timestamp):
+        """Tiến đường giá 1m của cặp tới nến đang hình thành tại `now_timestamp`"""
+        base_ms = self._base_ms
+        path = self._paths.get(symbol)
+        
+        if path is None:
+            path = self._new_path(self.starting_price)
+            closes = self._generate_mock_price(path['history'], path, self._base_ratio)
+            path['candles'] = self._build_candles(
+                closes, now_timestamp - base_ms * (path['history'] - 1), base_ms, noise=self._base_noise
+            )
+            self._paths[symbol] = path
+            logger.info(f"Tạo đường giá giả lập cho {symbol} (seed={self.seed})")
+            return path
+            
+        candles = path['candles']
+        last = candles[-1]
+        new_count = max(0, int((now_timestamp - last[0]) // base_ms))
+        # Một bước giá cho nến đang hình thành + các nến mới từ lần gọi trước
+        closes = self._generate_mock_price(new_count + 1, path, self._base_ratio)
+        last[4] = closes[0]
+        last[2] = max(last[2], closes[0])
+        last[3] = min(last[3], closes[0])
+        if new_count > 0:
+            new_candles = self._build_candles(closes[1:], last[0] + base_ms, base_ms, first_open=closes[0],
+                                              noise=self._base_noise)
+            path['candles'] = np.concatenate((candles, new_candles))[-path['history']:]
+        return path
+        
+    def _extend_path(self, path, start_timestamp):
+        """Sinh thêm nến 1m về quá khứ để đường giá bắt đầu từ `start_timestamp`"""
+        candles = path['candles']
+        count = int((candles[0, 0] - start_timestamp) // self._base_ms)
+        if count <= 0:
+            return
+        # Sinh một đoạn giá độc lập rồi co giãn để nối liền với nến đầu tiên hiện có
+        closes = self._generate_mock_price(count, self._new_path(self.starting_price), self._base_ratio)
+        older = self._build_candles(closes, candles[0, 0] - self._base_ms * count, self._base_ms, noise=self._base_noise)
+        older[:, 1:] *= candles[0, 1] / closes[-1]
+        path['candles'] = np.concatenate((older, candles))
+        path['history'] = len(path['candles'])
+        
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=100):
         """Giả lập API fetch_ohlcv của Binance"""
-        now = datetime.datetime.now()
+        # Timestamp được căn theo mốc đóng nến giống dữ liệu thật để CandleCache gộp được
+        timeframe_ms = timeframe_to_ms(timeframe)
+        now_ms = int(time.time() * 1000)
+        path = self._advance_path(symbol, now_ms // self._base_ms * self._base_ms)
         
-        # Tính khoảng thời gian dựa trên timeframe
-        if timeframe == '1h':
-            delta = datetime.timedelta(hours=1)
-        elif timeframe == '15m':
-            delta = datetime.timedelta(minutes=15)
-        elif timeframe == '1d':
-            delta = datetime.timedelta(days=1)
+        # Khi có `since` chỉ trả về các nến từ `since`, giống API thật
+        if since is not None:
+            start = -(-since // timeframe_ms) * timeframe_ms
         else:
-            delta = datetime.timedelta(hours=1)  # Mặc định 1h
-            
-        # Tạo giá mock
-        prices = self._generate_mock_price(limit)
+            start = (now_ms // timeframe_ms - (limit - 1)) * timeframe_ms
+        self._extend_path(path, start)
+        base = path['candles']
+        base = base[int(np.searchsorted(base[:, 0], start)):]
+        candles = base if timeframe_ms == self._base_ms else resample_ohlcv(base, timeframe)
+        self.current_price = path['candles'][-1, 4]
         
-        # Tạo dữ liệu OHLCV
-        ohlcv_data = []
-        for i in range(limit):
-            timestamp = int((now - delta * (limit - i - 1)).timestamp() * 1000)
-            price = prices[i]
-            
-            # Tạo giá O, H, L dựa trên giá đóng cửa
-            open_price = price * (1 + np.random.normal(0, 0.005))
-            high_price = max(price, open_price) * (1 + abs(np.random.normal(0, 0.01)))
-            low_price = min(price, open_price) * (1 - abs(np.random.normal(0, 0.01)))
-            volume = price * np.random.uniform(10, 100)
-            
-            ohlcv_data.append([timestamp, open_price, high_price, low_price, price, volume])
-            
+        selected = candles[:limit] if since is not None else candles[-limit:]
+        ohlcv_data = selected.tolist()
+        for candle in ohlcv_data:
+            candle[0] = int(candle[0])
         return ohlcv_data
+        
+    def fetch_tickers(self, symbols=None):
+        """Giả lập API fetch_tickers của Binance: giá mới nhất của nhiều cặp trong một lần gọi"""
+        now_ms = int(time.time() * 1000)
+        tickers = {}
+        for symbol in symbols or list(self._paths):
+            path = self._advance_path(symbol, now_ms // self._base_ms * self._base_ms)
+            price = float(path['candles'][-1, 4])
+            base_volume = float(path['candles'][-(86400000 // self._base_ms):, 5].sum())  # Khối lượng 24h
+            tickers[symbol] = {'symbol': symbol, 'timestamp': now_ms, 'last': price, 'close': price,
+                               'baseVolume': base_volume}
+        return tickers
+
+def create_exchange(use_mock=False, mock_seed=None):
+    """Khởi tạo kết nối với sàn Binance hoặc mock Binance"""
+    try:
+        if use_mock:
+            logger.info(f"Sử dụng dữ liệu mock cho việc test (seed={mock_seed})")
+            return MockBinance(starting_price=20000, volatility=0.05, timeframe=RSI_TIMEFRAME, seed=mock_seed)
+        else:
+            # Dùng client async để việc lấy dữ liệu không chặn event loop.
+            # Một instance có một bộ giới hạn tốc độ (rate limiter) và một connection pool,
+            # nên dùng chung cho mọi cặp để không vượt giới hạn weight của Binance.
+            exchange = ccxt_async.binance({
+                'apiKey': BINANCE_API_KEY,
+                'secret': BINANCE_SECRET_KEY,
+                'enableRateLimit': True,
+            })
+            logger.info(f"Đã kết nối thành công tới Binance")
+            return exchange
+    except Exception as e:
+        logger.error(f"Lỗi kết nối tới Binance: {e}")
+        raise
+
+def create_candle_store(use_mock=False):
+    """Khởi tạo kho nến trên đĩa, None khi dùng dữ liệu mock hoặc đã tắt"""
+    if use_mock or not CANDLE_STORE_DIR:
+        return None
+    return CandleStore(CANDLE_STORE_DIR, exchange_id='binance')
+
+async def start_metrics_server():
+    """Chạy endpoint /metrics, None nếu đã tắt hoặc không mở được cổng"""
+    if not METRICS_PORT:
+        return None
+    try:
+        return await MetricsServer(METRICS, METRICS_HOST, int(METRICS_PORT)).start()
+    except Exception as e:
+        logger.warning(f"Không thể chạy endpoint metrics tại {METRICS_HOST}:{METRICS_PORT}: {e}")
+        return None
+
+def create_state_store(use_mock=False):
+    """Khởi tạo kho trạng thái vị thế, None nếu đã tắt. Dữ liệu mock được lưu vào file riêng"""
+    if not STATE_DB:
+        return None
+    path = STATE_DB
+    if use_mock:
+        root, ext = os.path.splitext(path)
+        path = f"{root}_mock{ext}"
+    return StateStore(path)
+
+def create_warm_start(use_mock=False):
+    """Khởi tạo file snapshot warm start, None nếu đã tắt. Dữ liệu mock được lưu vào file riêng"""
+    if not WARM_START_FILE:
+        return None
+    path = WARM_START_FILE
+    if use_mock:
+        root, ext = os.path.splitext(path)
+        path = f"{root}_mock{ext}"
+    return WarmStartSnapshot(path)
+
+def create_telegram_bot():
+    """Khởi tạo bot Telegram với hỗ trợ proxy"""
+    try:
+        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+            logger.warning("Thiếu thông tin TELEGRAM_BOT_TOKEN hoặc TELEGRAM_CHAT_ID trong biến môi trường.")
+            raise ValueError("Thiếu thông tin cấu hình Telegram")
+        
+        # Mặc định HTTPXRequest chỉ có 1 kết nối, tăng lên để nhiều cặp gửi song song
+        request = HTTPXRequest(connection_pool_size=TELEGRAM_POOL_SIZE, proxy=TELEGRAM_PROXY_URL)
+        bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN, request=request)
+        if TELEGRAM_PROXY_URL:
+            logger.info(f"Đã kết nối thành công tới Telegram bot với proxy: {TELEGRAM_PROXY_URL}, Chat ID: {TELEGRAM_CHAT_ID}")
+        else:
+            logger.info(f"Đã kết nối thành công tới Telegram bot (không sử dụng proxy), Chat ID: {TELEGRAM_CHAT_ID}")
+        
+        return bot
+    except Exception as e:
+        logger.error(f"Lỗi kết nối tới Telegram: {e}")
+        raise
+
+# Tham số chiến lược RSI + MACD, cho phép mỗi bot (hoặc mỗi lần backtest) dùng tham số riêng
+StrategyConfig = namedtuple('StrategyConfig', [
+    'rsi_window', 'rsi_oversold', 'rsi_overbought', 'rsi_exit', 'macd_fast', 'macd_slow', 'macd_signal'
+])
+
+DEFAULT_STRATEGY = StrategyConfig(
+    rsi_window=RSI_WINDOW,
+    rsi_oversold=RSI_OVERSOLD,
+    rsi_overbought=RSI_OVERBOUGHT,
+    rsi_exit=RSI_EXIT,
+    macd_fast=MACD_FAST,
+    macd_slow=MACD_SLOW,
+    macd_signal=MACD_SIGNAL
+)
+
+# Các cấu hình đổi được khi bot đang chạy (xem config_watcher.py)
+LiveConfig = namedtuple('LiveConfig', [
+    'trading_pairs', 'strategy', 'signal_mode', 'rsi_independent', 'macd_independent'
+])
+
+def read_live_config():
+    """Đọc lại từ biến môi trường các cấu hình đổi được khi đang chạy (mặc định: LIVE_CONFIG_DEFAULTS)"""
+    pairs = live_config_value('TRADING_PAIRS').split(',')
+    return LiveConfig(
+        trading_pairs=list(dict.fromkeys(pair.strip() for pair in pairs if pair.strip())),
+        strategy=StrategyConfig(
+            rsi_window=int(live_config_value('RSI_WINDOW')),
+            rsi_oversold=int(live_config_value('RSI_OVERSOLD')),
+            rsi_overbought=int(live_config_value('RSI_OVERBOUGHT')),
+            rsi_exit=int(live_config_value('RSI_EXIT')),
+            macd_fast=int(live_config_value('MACD_FAST')),
+            macd_slow=int(live_config_value('MACD_SLOW')),
+            macd_signal=int(live_config_value('MACD_SIGNAL'))
+        ),
+        signal_mode=live_config_value('SIGNAL_MODE'),
+        rsi_independent=live_config_value('RSI_INDEPENDENT').lower() == 'true',
+        macd_independent=live_config_value('MACD_INDEPENDENT').lower() == 'true'
+    )
+
+def create_config_watcher(on_change):
+    """Theo dõi CONFIG_FILE, None nếu đã tắt"""
+    if CONFIG_RELOAD_INTERVAL <= 0:
+        return None
+    return ConfigWatcher(CONFIG_FILE, on_change, interval=CONFIG_RELOAD_INTERVAL)
+
+# Giá trị chỉ báo của nến mới nhất, đủ để quyết định tín hiệu mà không cần DataFrame
+IndicatorSnapshot = namedtuple('IndicatorSnapshot', SNAPSHOT_FIELDS)
+
+POSITION_CODES = {'long': 1, 'short': -1}
+
+def signal_candidates(snapshots, positions, template):
+    """Chỉ số các cặp có thể có tín hiệu vào/thoát lệnh, tính bằng so sánh mảng trên mọi cặp
+
+    `snapshots` là kết quả của CrossSectionEngine.sync, `positions` là mã vị thế (POSITION_CODES,
+    0 nếu không có). Cùng điều kiện với evaluate_snapshot nhưng chưa xét cooldown: bot của các
+    cặp được chọn vẫn tự quyết định bằng evaluate_snapshot. `template` là bot cung cấp chiến lược
+    và signal mode dùng chung.
+    """
+    _, rsi, macd, macd_signal, _, prev_macd, prev_macd_signal = snapshots
+    strategy = template.strategy
+    with np.errstate(invalid='ignore'):
+        entry = np.zeros(len(rsi), dtype=bool)
+        if template.signal_mode in ['RSI', 'BOTH'] and template.rsi_independent:
+            entry |= (rsi < strategy.rsi_oversold) | (rsi > strategy.rsi_overbought)
+        if template.signal_mode in ['MACD', 'BOTH'] and template.macd_independent:
+            # So sánh với NaN luôn sai, giống điều kiện bỏ qua NaN của _macd_signal
+            entry |= ((prev_macd <= prev_macd_signal) & (macd > macd_signal)) | \
+                     ((prev_macd >= prev_macd_signal) & (macd < macd_signal))
+        exits = ((positions == 1) & (rsi > strategy.rsi_exit)) | ((positions == -1) & (rsi < strategy.rsi_exit))
+    return np.flatnonzero(((positions == 0) & entry) | exits)
+
+def create_alert_dispatcher(bot):
+    """Khởi tạo hàng đợi gửi cảnh báo Telegram với giới hạn tốc độ từ biến môi trường"""
+    return AlertDispatcher(bot, global_rate=TELEGRAM_GLOBAL_RATE, chat_interval=TELEGRAM_CHAT_INTERVAL,
+                           batch_window=TELEGRAM_BATCH_WINDOW, max_retries=TELEGRAM_MAX_RETRIES,
+                           observe_latency=ALERT_SECONDS.observe)
+
+def create_scheduler(use_mock=False, timeframe=RSI_TIMEFRAME, mock_speed=60):
+    """Lịch chu kỳ polling: chia đều mỗi nến thành các chu kỳ không dài hơn POLL_INTERVAL
+
+    Mốc cuối của mỗi nến trùng đúng lúc đóng nến. Khi dùng mock, lịch chạy nhanh hơn `mock_speed` lần.
+    """
+    timeframe_s = timeframe_to_ms(timeframe) / 1000
+    period = timeframe_s / max(1, -(-timeframe_s // POLL_INTERVAL))
+    if use_mock:
+        return CycleScheduler(period / mock_speed, delay=0, stagger=SCHEDULE_STAGGER / mock_speed)
+    return CycleScheduler(period, delay=SCHEDULE_DELAY, stagger=SCHEDULE_STAGGER)
+
+def create_cross_section_engine(strategy=None):
+    """Khởi tạo engine chỉ báo cho mọi cặp (mảng cặp × nến) với tham số của chiến lược"""
+    strategy = strategy or DEFAULT_STRATEGY
+    return CrossSectionEngine(
+        rsi_window=strategy.rsi_window,
+        macd_fast=strategy.macd_fast,
+        macd_slow=strategy.macd_slow,
+        macd_signal=strategy.macd_signal
+    )
+
+def create_indicator_engine(strategy=None):
+    """Khởi tạo engine chỉ báo với tham số RSI/MACD của chiến lược"""
+    strategy = strategy or DEFAULT_STRATEGY
+    return IndicatorEngine(
+        rsi_window=strategy.rsi_window,
+        macd_fast=strategy.macd_fast,
+        macd_slow=strategy.macd_slow,
+        macd_signal=strategy.macd_signal
+    )
 
 class CryptoSignalBot:
-    def __init__(self, symbol, use_mock=False):
+    def __init__(self, symbol, use_mock=False, exchange=None, bot=None, candle_cache=None, indicator_engine=None,
+                 connect=True, strategy=None, timeframe=None, alerts=None, state_store=None, chat_id=None):
         self.symbol = symbol
+        self.timeframe = timeframe or RSI_TIMEFRAME
         self.use_mock = use_mock
-        self.exchange = self._init_exchange()
-        self.bot = self._init_telegram_bot()
+        # Tham số RSI/MACD của chiến lược (mặc định lấy từ biến môi trường)
+        self.strategy = strategy if strategy is not None else DEFAULT_STRATEGY
+        # Cho phép truyền vào client dùng chung (MultiPairSignalBot), nếu không thì tự tạo.
+        # connect=False (backtest) thì không tạo kết nối sàn/Telegram.
+        self.owns_exchange = connect and exchange is None
+        self.exchange = create_exchange(use_mock) if self.owns_exchange else exchange
+        self.bot = create_telegram_bot() if connect and bot is None and alerts is None else bot
+        # Hàng đợi gửi cảnh báo (MultiPairSignalBot truyền vào một hàng đợi dùng chung)
+        self.owns_alerts = alerts is None and self.bot is not None
+        self.alerts = create_alert_dispatcher(self.bot) if self.owns_alerts else alerts
+        # Chat nhận cảnh báo ("chat_id" hoặc "chat_id_thread_id"), mặc định TELEGRAM_CHAT_ID
+        self.chat_id = chat_id if chat_id is not None else TELEGRAM_CHAT_ID
+        # Kho trạng thái vị thế/PnL (None thì chỉ giữ trong bộ nhớ)
+        self.state_store = state_store
+        # Nguồn thời gian cho cooldown, backtest thay bằng thời gian của nến
+        self.clock = time.time
+        # Bộ đệm nến: chỉ tải các nến mới thay vì tải lại toàn bộ mỗi chu kỳ
+        self.candle_cache = candle_cache if candle_cache is not None else CandleCache(store=create_candle_store(use_mock))
+        # Trạng thái RSI/MACD tăng dần: chỉ tính thêm cho các nến mới
+        self.indicator_engine = indicator_engine if indicator_engine is not None else create_indicator_engine(self.strategy)
         self.last_alert_time = 0
         self.alert_cooldown = 3600  # 1 giờ cooldown giữa các cảnh báo
         self.current_position = None  # None = không có vị thế, 'long' = đang long, 'short' = đang short
@@ -211,64 +624,28 @@ class CryptoSignalBot:
         
         # Thêm biến để lưu message ID
         self.entry_message_id = None  # Lưu message ID khi mở lệnh
+        self.entry_message = None  # Future của tin mở lệnh đang chờ trong hàng đợi gửi
         
         # Cấu hình signal mode
         self.signal_mode = SIGNAL_MODE
         self.rsi_independent = RSI_INDEPENDENT
         self.macd_independent = MACD_INDEPENDENT
         
-    def _init_exchange(self):
-        """Khởi tạo kết nối với sàn Binance hoặc mock Binance"""
-        try:
-            if self.use_mock:
-                logger.info("Sử dụng dữ liệu mock cho việc test")
-                return MockBinance(starting_price=20000, volatility=0.05, timeframe=RSI_TIMEFRAME)
-            else:
-                exchange = ccxt.binance({
-                    'apiKey': BINANCE_API_KEY,
-                    'secret': BINANCE_SECRET_KEY,
-                    'enableRateLimit': True,
-                })
-                logger.info(f"Đã kết nối thành công tới Binance")
-                return exchange
-        except Exception as e:
-            logger.error(f"Lỗi kết nối tới Binance: {e}")
-            raise
-            
-    def _init_telegram_bot(self):
-        """Khởi tạo bot Telegram với hỗ trợ proxy"""
-        try:
-            if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-                logger.warning("Thiếu thông tin TELEGRAM_BOT_TOKEN hoặc TELEGRAM_CHAT_ID trong biến môi trường.")
-                raise ValueError("Thiếu thông tin cấu hình Telegram")
-            
-            # Tạo request với proxy nếu có
-            if TELEGRAM_PROXY_URL:
-                request = HTTPXRequest(proxy=TELEGRAM_PROXY_URL)
-                bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN, request=request)
-                logger.info(f"Đã kết nối thành công tới Telegram bot với proxy: {TELEGRAM_PROXY_URL}, Chat ID: {TELEGRAM_CHAT_ID}")
-            else:
-                bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN)
-                logger.info(f"Đã kết nối thành công tới Telegram bot (không sử dụng proxy), Chat ID: {TELEGRAM_CHAT_ID}")
-            
-            return bot
-        except Exception as e:
-            logger.error(f"Lỗi kết nối tới Telegram: {e}")
-            raise
-    
-    def fetch_ohlcv_data(self, timeframe=RSI_TIMEFRAME, limit=100):
+    async def fetch_ohlcv_data(self, timeframe=None, limit=100):
         """Lấy dữ liệu giá từ Binance"""
+        timeframe = timeframe or self.timeframe
         try:
-            ohlcv = self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=limit)
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            return df
+            with STAGE_SECONDS.time(self.symbol, timeframe, 'fetch'):
+                return await self.candle_cache.fetch(self.exchange, self.symbol, timeframe, limit=limit)
         except Exception as e:
+            ERRORS_TOTAL.inc(self.symbol, 'fetch')
             logger.error(f"Lỗi khi lấy dữ liệu OHLCV cho {self.symbol}: {e}")
             return None
     
-    def calculate_rsi(self, df, window=RSI_WINDOW):
+    def calculate_rsi(self, df, window=None):
         """Tính toán chỉ báo RSI từ dữ liệu giá"""
+        if window is None:
+            window = self.strategy.rsi_window
         if df is None or len(df) < window:
             return None
             
@@ -280,8 +657,14 @@ class CryptoSignalBot:
             logger.error(f"Lỗi khi tính toán RSI: {e}")
             return None
     
-    def calculate_macd(self, df, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+    def calculate_macd(self, df, fast=None, slow=None, signal=None):
         """Tính toán chỉ báo MACD từ dữ liệu giá"""
+        if fast is None:
+            fast = self.strategy.macd_fast
+        if slow is None:
+            slow = self.strategy.macd_slow
+        if signal is None:
+            signal = self.strategy.macd_signal
         if df is None or len(df) < slow:
             return None
             
@@ -300,6 +683,26 @@ class CryptoSignalBot:
             logger.error(f"Lỗi khi tính toán MACD: {e}")
             return None
     
+    def calculate_indicators(self, df, timeframe=None):
+        """Tính RSI và MACD tăng dần bằng IndicatorEngine (thay cho tính lại toàn bộ)"""
+        if df is None or len(df) == 0:
+            return None
+            
+        timeframe = timeframe or self.timeframe
+        try:
+            with STAGE_SECONDS.time(self.symbol, timeframe, 'indicators'):
+                timestamps = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+                values = self.indicator_engine.sync((self.symbol, timeframe), timestamps, df['close'].to_numpy())
+                df['rsi'] = values[:, 0]
+                df['macd'] = values[:, 1]
+                df['macd_signal'] = values[:, 2]
+                df['macd_histogram'] = values[:, 3]
+            return df
+        except Exception as e:
+            ERRORS_TOTAL.inc(self.symbol, 'indicators')
+            logger.error(f"Lỗi khi tính toán chỉ báo cho {self.symbol}: {e}")
+            return None
+    
     def calculate_pnl(self, entry_price, exit_price, position_type):
         """Tính toán PnL với đòn bẩy x20"""
         if entry_price is None or exit_price is None:
@@ -328,22 +731,44 @@ class CryptoSignalBot:
             
         return self.calculate_pnl(self.entry_price, current_price, self.current_position)
     
+    def get_snapshot(self, df):
+        """Lấy giá trị chỉ báo của nến mới nhất (và MACD của nến trước) từ DataFrame"""
+        if df is None or len(df) == 0:
+            return None
+            
+        def latest(column, offset=1):
+            if column not in df.columns or len(df) < offset:
+                return np.nan
+            return df[column].iloc[-offset]
+            
+        return IndicatorSnapshot(
+            close=df['close'].iloc[-1],
+            rsi=latest('rsi'),
+            macd=latest('macd'),
+            macd_signal=latest('macd_signal'),
+            macd_histogram=latest('macd_histogram'),
+            prev_macd=latest('macd', 2),
+            prev_macd_signal=latest('macd_signal', 2)
+        )
+    
     def check_rsi_signal(self, df):
         """Kiểm tra tín hiệu RSI độc lập"""
         if df is None or 'rsi' not in df.columns:
             return None
-            
-        latest_rsi = df['rsi'].iloc[-1]
-        latest_close = df['close'].iloc[-1]
+        return self._rsi_signal(self.get_snapshot(df))
+        
+    def _rsi_signal(self, snapshot):
+        latest_rsi = snapshot.rsi
+        latest_close = snapshot.close
         
         if np.isnan(latest_rsi):
             return None
             
-        current_time = time.time()
+        current_time = self.clock()
         cooldown_time = self.alert_cooldown/self.mock_speed if self.use_mock else self.alert_cooldown
         
         # RSI Long signal
-        if latest_rsi < RSI_OVERSOLD:
+        if latest_rsi < self.strategy.rsi_oversold:
             if current_time - self.last_alert_time > cooldown_time:
                 return {
                     'signal_type': 'rsi',
@@ -356,7 +781,7 @@ class CryptoSignalBot:
                 }
                 
         # RSI Short signal  
-        elif latest_rsi > RSI_OVERBOUGHT:
+        elif latest_rsi > self.strategy.rsi_overbought:
             if current_time - self.last_alert_time > cooldown_time:
                 return {
                     'signal_type': 'rsi',
@@ -374,18 +799,20 @@ class CryptoSignalBot:
         """Kiểm tra tín hiệu MACD độc lập"""
         if df is None or 'macd' not in df.columns or len(df) < 2:
             return None
-            
-        latest_macd = df['macd'].iloc[-1]
-        latest_macd_signal = df['macd_signal'].iloc[-1]
-        latest_close = df['close'].iloc[-1]
+        return self._macd_signal(self.get_snapshot(df))
         
-        prev_macd = df['macd'].iloc[-2]
-        prev_macd_signal = df['macd_signal'].iloc[-2]
+    def _macd_signal(self, snapshot):
+        latest_macd = snapshot.macd
+        latest_macd_signal = snapshot.macd_signal
+        latest_close = snapshot.close
+        
+        prev_macd = snapshot.prev_macd
+        prev_macd_signal = snapshot.prev_macd_signal
         
         if any(np.isnan([latest_macd, latest_macd_signal, prev_macd, prev_macd_signal])):
             return None
             
-        current_time = time.time()
+        current_time = self.clock()
         cooldown_time = self.alert_cooldown/self.mock_speed if self.use_mock else self.alert_cooldown
         
         # MACD Bullish crossover
@@ -396,7 +823,7 @@ class CryptoSignalBot:
                     'signal': 'long',
                     'macd': latest_macd,
                     'macd_signal': latest_macd_signal,
-                    'macd_histogram': df['macd_histogram'].iloc[-1],
+                    'macd_histogram': snapshot.macd_histogram,
                     'price': latest_close,
                     'trigger': 'macd_bullish_cross',
                     'position_size': self.position_size,
@@ -411,7 +838,7 @@ class CryptoSignalBot:
                     'signal': 'short',
                     'macd': latest_macd, 
                     'macd_signal': latest_macd_signal,
-                    'macd_histogram': df['macd_histogram'].iloc[-1],
+                    'macd_histogram': snapshot.macd_histogram,
                     'price': latest_close,
                     'trigger': 'macd_bearish_cross',
                     'position_size': self.position_size,
@@ -422,22 +849,25 @@ class CryptoSignalBot:
         
     def get_reference_signals(self, df, exclude_type=None):
         """Lấy trạng thái các signal khác để hiển thị tham khảo"""
+        return self._reference_signals(self.get_snapshot(df), exclude_type)
+        
+    def _reference_signals(self, snapshot, exclude_type=None):
         reference = {}
         
-        if exclude_type != 'rsi' and 'rsi' in df.columns:
-            latest_rsi = df['rsi'].iloc[-1]
+        if exclude_type != 'rsi':
+            latest_rsi = snapshot.rsi
             if not np.isnan(latest_rsi):
-                if latest_rsi < RSI_OVERSOLD:
+                if latest_rsi < self.strategy.rsi_oversold:
                     rsi_status = "Oversold (Tín hiệu Long)"
-                elif latest_rsi > RSI_OVERBOUGHT:
+                elif latest_rsi > self.strategy.rsi_overbought:
                     rsi_status = "Overbought (Tín hiệu Short)"
                 else:
                     rsi_status = "Neutral"
                 reference['rsi'] = {'value': latest_rsi, 'status': rsi_status}
                 
-        if exclude_type != 'macd' and 'macd' in df.columns and len(df) >= 2:
-            latest_macd = df['macd'].iloc[-1]
-            latest_macd_signal = df['macd_signal'].iloc[-1]
+        if exclude_type != 'macd':
+            latest_macd = snapshot.macd
+            latest_macd_signal = snapshot.macd_signal
             
             if not any(np.isnan([latest_macd, latest_macd_signal])):
                 if latest_macd > latest_macd_signal:
@@ -457,20 +887,34 @@ class CryptoSignalBot:
         if df is None:
             return None
             
+        snapshot = self.get_snapshot(df)
+        signal_data = self.evaluate_snapshot(snapshot)
+        
+        # Log thông tin chỉ báo hiện tại khi không có vị thế và không có tín hiệu
+        if signal_data is None and self.current_position not in ['long', 'short']:
+            self._log_indicators(snapshot)
+            
+        return signal_data
+        
+    def evaluate_snapshot(self, snapshot):
+        """Quyết định tín hiệu vào/thoát lệnh từ giá trị chỉ báo (dùng chung cho live và backtest)"""
+        if snapshot is None:
+            return None
+            
         # Kiểm tra điều kiện thoát lệnh trước
         if self.current_position in ['long', 'short']:
-            return self._check_exit_conditions(df)
+            return self._exit_signal(snapshot)
             
         # Kiểm tra các tín hiệu vào lệnh mới
         signals_to_check = []
         
         if self.signal_mode in ['RSI', 'BOTH'] and self.rsi_independent:
-            rsi_signal = self.check_rsi_signal(df)
+            rsi_signal = self._rsi_signal(snapshot)
             if rsi_signal:
                 signals_to_check.append(rsi_signal)
                 
         if self.signal_mode in ['MACD', 'BOTH'] and self.macd_independent:
-            macd_signal = self.check_macd_signal(df)
+            macd_signal = self._macd_signal(snapshot)
             if macd_signal:
                 signals_to_check.append(macd_signal)
                 
@@ -479,50 +923,52 @@ class CryptoSignalBot:
             selected_signal = signals_to_check[0]  # Có thể thêm logic ưu tiên
             
             # Thêm thông tin tham khảo từ các signal khác
-            reference_signals = self.get_reference_signals(df, exclude_type=selected_signal['signal_type'])
+            reference_signals = self._reference_signals(snapshot, exclude_type=selected_signal['signal_type'])
             selected_signal['reference_signals'] = reference_signals
             
             # Lưu thông tin entry
+            current_time = self.clock()
             self.entry_price = selected_signal['price']
-            self.entry_time = time.time()
-            self.last_alert_time = time.time()
+            self.entry_time = current_time
+            self.last_alert_time = current_time
             
             return selected_signal
             
-        # Log thông tin chỉ báo hiện tại
-        if 'rsi' in df.columns:
-            latest_rsi = df['rsi'].iloc[-1]
-            latest_close = df['close'].iloc[-1]
-            
-            macd_info = ""
-            if 'macd' in df.columns:
-                latest_macd = df['macd'].iloc[-1]
-                latest_macd_signal = df['macd_signal'].iloc[-1]
-                latest_macd_histogram = df['macd_histogram'].iloc[-1]
-                if not np.isnan(latest_macd):
-                    macd_info = f" | MACD: {latest_macd:.4f} | Signal: {latest_macd_signal:.4f} | Histogram: {latest_macd_histogram:.4f}"
-                    
-            if not np.isnan(latest_rsi):
-                logger.info(f"Chỉ báo {self.symbol}: RSI: {latest_rsi:.2f}{macd_info}")
-            
-            # Nếu đang có vị thế, thêm thông tin PnL hiện tại
-            if self.current_position in ['long', 'short'] and self.entry_price is not None:
-                current_pnl = self.get_current_pnl(latest_close)
-                logger.info(f"PnL hiện tại cho {self.symbol}: ${current_pnl:.2f}")
-            
         return None
+        
+    def _log_indicators(self, snapshot):
+        """Log thông tin chỉ báo hiện tại (định dạng ở luồng ghi log, bỏ qua nếu LOG_LEVEL cao hơn INFO)"""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        latest_rsi = snapshot.rsi
+        latest_close = snapshot.close
+                
+        if not np.isnan(latest_rsi):
+            if np.isnan(snapshot.macd):
+                logger.info("Chỉ báo %s %s: RSI: %.2f", self.symbol, self.timeframe, latest_rsi)
+            else:
+                logger.info("Chỉ báo %s %s: RSI: %.2f | MACD: %.4f | Signal: %.4f | Histogram: %.4f",
+                            self.symbol, self.timeframe, latest_rsi,
+                            snapshot.macd, snapshot.macd_signal, snapshot.macd_histogram)
+        
+        # Nếu đang có vị thế, thêm thông tin PnL hiện tại
+        if self.current_position in ['long', 'short'] and self.entry_price is not None:
+            current_pnl = self.get_current_pnl(latest_close)
+            logger.info("PnL hiện tại cho %s: $%.2f", self.symbol, current_pnl)
 
     def _check_exit_conditions(self, df):
         """Kiểm tra điều kiện thoát lệnh"""
         if df is None or 'rsi' not in df.columns:
             return None
-            
-        latest_rsi = df['rsi'].iloc[-1]
-        latest_close = df['close'].iloc[-1]
-        current_time = time.time()
+        return self._exit_signal(self.get_snapshot(df))
+        
+    def _exit_signal(self, snapshot):
+        latest_rsi = snapshot.rsi
+        latest_close = snapshot.close
+        current_time = self.clock()
         cooldown_time = self.alert_cooldown/self.mock_speed if self.use_mock else self.alert_cooldown
         
-        if self.current_position == 'long' and latest_rsi > RSI_EXIT:
+        if self.current_position == 'long' and latest_rsi > self.strategy.rsi_exit:
             if current_time - self.last_alert_time > cooldown_time:
                 pnl = self.calculate_pnl(self.entry_price, latest_close, 'long')
                 self.total_pnl += pnl
@@ -542,7 +988,7 @@ class CryptoSignalBot:
                     'win_rate': (self.winning_trades / self.trade_count) * 100
                 }
                 
-        elif self.current_position == 'short' and latest_rsi < RSI_EXIT:
+        elif self.current_position == 'short' and latest_rsi < self.strategy.rsi_exit:
             if current_time - self.last_alert_time > cooldown_time:
                 pnl = self.calculate_pnl(self.entry_price, latest_close, 'short')
                 self.total_pnl += pnl
@@ -563,25 +1009,35 @@ class CryptoSignalBot:
                 }
                 
         return None
+        
+    def apply_signal(self, signal_data):
+        """Cập nhật trạng thái vị thế theo tín hiệu (dùng chung cho live và backtest)"""
+        signal = signal_data['signal']
+        self.current_position = signal
+        
+        # Reset entry price và message ID sau khi đóng lệnh
+        if signal in ['exit_long', 'exit_short']:
+            self.entry_price = None
+            self.entry_time = None
+            self.entry_message_id = None
+            self.entry_message = None
     
     async def send_telegram_alert(self, signal_data):
         """Gửi cảnh báo qua Telegram"""
+        SIGNALS_TOTAL.inc(self.symbol, self.timeframe, signal_data['signal'])
         try:
-            coin_name = self.symbol.split('/')[0]
+            coin_name = f"{self.symbol.split('/')[0]} {self.timeframe}"
             signal = signal_data['signal']
-            rsi_value = signal_data['rsi']
+            rsi_value = signal_data.get('rsi')
             price = signal_data['price']
             
             # Lấy signal logger
-            signal_logger = logging.getLogger('trading_signals')
+            signal_logger = logging.getLogger(SIGNAL_LOGGER)
             
-            # Tách chat_id và message_thread_id nếu có
-            if '_' in TELEGRAM_CHAT_ID:
-                chat_id, message_thread_id = TELEGRAM_CHAT_ID.split('_')
-                message_thread_id = int(message_thread_id)
-            else:
-                chat_id = TELEGRAM_CHAT_ID
-                message_thread_id = None
+            # Lưu message ID mở lệnh trước khi cập nhật trạng thái vị thế để reply khi thoát lệnh
+            # (Future nếu tin mở lệnh vẫn đang chờ trong hàng đợi)
+            entry_message_id = self.entry_message_id if self.entry_message_id is not None else self.entry_message
+            self.apply_signal(signal_data)
             
             if signal == 'long':
                 signal_type = signal_data.get('signal_type', 'combined')
@@ -592,20 +1048,20 @@ class CryptoSignalBot:
                 if signal_type == 'rsi':
                     rsi_value = signal_data['rsi']
                     message = (f"🚨 TÍN HIỆU LONG (RSI): {coin_name} tại giá ${price:.2f}\n"
-                              f"📊 RSI ({RSI_WINDOW}) = {rsi_value:.2f} < {RSI_OVERSOLD} → Bị bán quá mức (oversold)\n")
+                              f"📊 RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} < {self.strategy.rsi_oversold} → Bị bán quá mức (oversold)\n")
                     
                 elif signal_type == 'macd':
                     macd = signal_data['macd']
                     macd_signal_val = signal_data['macd_signal']
                     macd_histogram = signal_data['macd_histogram']
                     message = (f"🚨 TÍN HIỆU LONG (MACD): {coin_name} tại giá ${price:.2f}\n"
-                              f"📈 MACD ({MACD_FAST},{MACD_SLOW},{MACD_SIGNAL}) = {macd:.4f} cắt lên {macd_signal_val:.4f} → Tín hiệu tăng\n"
+                              f"📈 MACD ({self.strategy.macd_fast},{self.strategy.macd_slow},{self.strategy.macd_signal}) = {macd:.4f} cắt lên {macd_signal_val:.4f} → Tín hiệu tăng\n"
                               f"📊 Histogram = {macd_histogram:.4f}\n")
                 else:
                     # Fallback for old format
                     rsi_value = signal_data.get('rsi', 0)
                     message = (f"🚨 TÍN HIỆU LONG: {coin_name} tại giá ${price:.2f}\n"
-                              f"📊 RSI ({RSI_WINDOW}) = {rsi_value:.2f} < {RSI_OVERSOLD} → Bị bán quá mức (oversold)\n")
+                              f"📊 RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} < {self.strategy.rsi_oversold} → Bị bán quá mức (oversold)\n")
                 
                 # Thêm thông tin tham khảo
                 if 'reference_signals' in signal_data:
@@ -617,28 +1073,13 @@ class CryptoSignalBot:
                         
                 message += (f"👉 Khuyến nghị: MUA VÀO (LONG)\n"
                            f"💰 Vị thế: ${position_size} với đòn bẩy x{leverage}\n"
-                           f"🔄 Thoát lệnh khi RSI > {RSI_EXIT}")
+                           f"🔄 Thoát lệnh khi RSI > {self.strategy.rsi_exit}")
                            
-                self.current_position = 'long'
                 
                 # Log signal
-                signal_logger.info(f"LONG_ENTRY_{signal_type.upper()} | {coin_name} | Price: ${price:.2f} | Trigger: {trigger} | Size: ${position_size} | Leverage: x{leverage}")
-                
-                # Gửi tin nhắn và lưu message ID
-                if message_thread_id:
-                    sent_message = await self.bot.send_message(
-                        chat_id=int(chat_id),
-                        text=message,
-                        message_thread_id=message_thread_id
-                    )
-                else:
-                    sent_message = await self.bot.send_message(
-                        chat_id=int(chat_id),
-                        text=message
-                    )
-                
-                # Lưu message ID để reply sau này
-                self.entry_message_id = sent_message.message_id
+                signal_logger.info("LONG_ENTRY_%s", signal_type.upper(), extra={'fields': {
+                    'coin': coin_name, 'symbol': self.symbol, 'timeframe': self.timeframe, 'price': price,
+                    'trigger': trigger, 'size': position_size, 'leverage': leverage}})
                 
             elif signal == 'short':
                 signal_type = signal_data.get('signal_type', 'combined')
@@ -649,20 +1090,20 @@ class CryptoSignalBot:
                 if signal_type == 'rsi':
                     rsi_value = signal_data['rsi']
                     message = (f"🚨 TÍN HIỆU SHORT (RSI): {coin_name} tại giá ${price:.2f}\n"
-                              f"📊 RSI ({RSI_WINDOW}) = {rsi_value:.2f} > {RSI_OVERBOUGHT} → Bị mua quá mức (overbought)\n")
+                              f"📊 RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} > {self.strategy.rsi_overbought} → Bị mua quá mức (overbought)\n")
                               
                 elif signal_type == 'macd':
                     macd = signal_data['macd']
                     macd_signal_val = signal_data['macd_signal']
                     macd_histogram = signal_data['macd_histogram']
                     message = (f"🚨 TÍN HIỆU SHORT (MACD): {coin_name} tại giá ${price:.2f}\n"
-                              f"📉 MACD ({MACD_FAST},{MACD_SLOW},{MACD_SIGNAL}) = {macd:.4f} cắt xuống {macd_signal_val:.4f} → Tín hiệu giảm\n"
+                              f"📉 MACD ({self.strategy.macd_fast},{self.strategy.macd_slow},{self.strategy.macd_signal}) = {macd:.4f} cắt xuống {macd_signal_val:.4f} → Tín hiệu giảm\n"
                               f"📊 Histogram = {macd_histogram:.4f}\n")
                 else:
                     # Fallback for old format
                     rsi_value = signal_data.get('rsi', 0)
                     message = (f"🚨 TÍN HIỆU SHORT: {coin_name} tại giá ${price:.2f}\n"
-                              f"📊 RSI ({RSI_WINDOW}) = {rsi_value:.2f} > {RSI_OVERBOUGHT} → Bị mua quá mức (overbought)\n")
+                              f"📊 RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} > {self.strategy.rsi_overbought} → Bị mua quá mức (overbought)\n")
                 
                 # Thêm thông tin tham khảo
                 if 'reference_signals' in signal_data:
@@ -674,28 +1115,13 @@ class CryptoSignalBot:
                         
                 message += (f"👉 Khuyến nghị: BÁN KHỐNG (SHORT)\n"
                            f"💰 Vị thế: ${position_size} với đòn bẩy x{leverage}\n"
-                           f"🔄 Thoát lệnh khi RSI < {RSI_EXIT}")
+                           f"🔄 Thoát lệnh khi RSI < {self.strategy.rsi_exit}")
                            
-                self.current_position = 'short'
                 
                 # Log signal
-                signal_logger.info(f"SHORT_ENTRY_{signal_type.upper()} | {coin_name} | Price: ${price:.2f} | Trigger: {trigger} | Size: ${position_size} | Leverage: x{leverage}")
-                
-                # Gửi tin nhắn và lưu message ID
-                if message_thread_id:
-                    sent_message = await self.bot.send_message(
-                        chat_id=int(chat_id),
-                        text=message,
-                        message_thread_id=message_thread_id
-                    )
-                else:
-                    sent_message = await self.bot.send_message(
-                        chat_id=int(chat_id),
-                        text=message
-                    )
-                
-                # Lưu message ID để reply sau này
-                self.entry_message_id = sent_message.message_id
+                signal_logger.info("SHORT_ENTRY_%s", signal_type.upper(), extra={'fields': {
+                    'coin': coin_name, 'symbol': self.symbol, 'timeframe': self.timeframe, 'price': price,
+                    'trigger': trigger, 'size': position_size, 'leverage': leverage}})
                 
             elif signal == 'exit_long':
                 entry_price = signal_data['entry_price']
@@ -710,49 +1136,17 @@ class CryptoSignalBot:
                 message = (f"🔔 TÍN HIỆU THOÁT LONG: {coin_name}\n"
                           f"📈 Giá vào: ${entry_price:.2f} → Giá ra: ${price:.2f}\n"
                           f"📊 Thay đổi giá: {price_change:+.2f}%\n"
-                          f"RSI ({RSI_WINDOW}) = {rsi_value:.2f} > {RSI_EXIT}\n"
+                          f"RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} > {self.strategy.rsi_exit}\n"
                           f"👉 Khuyến nghị: ĐÓNG VỊ THẾ LONG\n"
                           f"{pnl_emoji} PnL giao dịch này: ${pnl:+.2f}\n"
                           f"💰 Tổng PnL: ${total_pnl:+.2f}\n"
                           f"📈 Số giao dịch: {trade_count} | Tỷ lệ thắng: {win_rate:.1f}%")
-                self.current_position = 'exit_long'
                 
                 # Log signal vào file riêng
-                signal_logger.info(f"LONG_EXIT | {coin_name} | Entry: ${entry_price:.2f} | Exit: ${price:.2f} | PnL: ${pnl:+.2f} | Total_PnL: ${total_pnl:+.2f} | Win_Rate: {win_rate:.1f}%")
-                
-                # Reply vào message mở lệnh nếu có
-                if self.entry_message_id:
-                    if message_thread_id:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            message_thread_id=message_thread_id,
-                            reply_to_message_id=self.entry_message_id
-                        )
-                    else:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            reply_to_message_id=self.entry_message_id
-                        )
-                else:
-                    # Nếu không có message ID thì gửi bình thường
-                    if message_thread_id:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            message_thread_id=message_thread_id
-                        )
-                    else:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message
-                        )
+                signal_logger.info("LONG_EXIT", extra={'fields': {
+                    'coin': coin_name, 'symbol': self.symbol, 'timeframe': self.timeframe, 'entry': entry_price,
+                    'exit': price, 'pnl': pnl, 'total_pnl': total_pnl, 'win_rate': win_rate}})
                 
-                # Reset entry price và message ID sau khi đóng lệnh
-                self.entry_price = None
-                self.entry_time = None
-                self.entry_message_id = None
                 
             elif signal == 'exit_short':
                 entry_price = signal_data['entry_price']
@@ -767,92 +1161,55 @@ class CryptoSignalBot:
                 message = (f"🔔 TÍN HIỆU THOÁT SHORT: {coin_name}\n"
                           f"📉 Giá vào: ${entry_price:.2f} → Giá ra: ${price:.2f}\n"
                           f"📊 Thay đổi giá: {price_change:+.2f}% (cho short)\n"
-                          f"RSI ({RSI_WINDOW}) = {rsi_value:.2f} < {RSI_EXIT}\n"
+                          f"RSI ({self.strategy.rsi_window}) = {rsi_value:.2f} < {self.strategy.rsi_exit}\n"
                           f"👉 Khuyến nghị: ĐÓNG VỊ THẾ SHORT\n"
                           f"{pnl_emoji} PnL giao dịch này: ${pnl:+.2f}\n"
                           f"💰 Tổng PnL: ${total_pnl:+.2f}\n"
                           f"📈 Số giao dịch: {trade_count} | Tỷ lệ thắng: {win_rate:.1f}%")
-                self.current_position = 'exit_short'
                 
                 # Log signal vào file riêng
-                signal_logger.info(f"SHORT_EXIT | {coin_name} | Entry: ${entry_price:.2f} | Exit: ${price:.2f} | PnL: ${pnl:+.2f} | Total_PnL: ${total_pnl:+.2f} | Win_Rate: {win_rate:.1f}%")
+                signal_logger.info("SHORT_EXIT", extra={'fields': {
+                    'coin': coin_name, 'symbol': self.symbol, 'timeframe': self.timeframe, 'entry': entry_price,
+                    'exit': price, 'pnl': pnl, 'total_pnl': total_pnl, 'win_rate': win_rate}})
                 
-                # Reply vào message mở lệnh nếu có
-                if self.entry_message_id:
-                    if message_thread_id:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            message_thread_id=message_thread_id,
-                            reply_to_message_id=self.entry_message_id
-                        )
-                    else:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            reply_to_message_id=self.entry_message_id
-                        )
-                else:
-                    # Nếu không có message ID thì gửi bình thường
-                    if message_thread_id:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message,
-                            message_thread_id=message_thread_id
-                        )
-                    else:
-                        await self.bot.send_message(
-                            chat_id=int(chat_id),
-                            text=message
-                        )
-                
-                # Reset entry price và message ID sau khi đóng lệnh
-                self.entry_price = None
-                self.entry_time = None
-                self.entry_message_id = None
             
-            logger.info(f"Đã gửi cảnh báo {signal} tới Telegram cho {self.symbol}")
+            # Đưa vào hàng đợi gửi chung; tin thoát lệnh reply vào tin mở lệnh (kể cả khi tin đó chưa gửi xong)
+            chat_id, message_thread_id = parse_chat_id(self.chat_id)
+            if signal in ('long', 'short'):
+                self.entry_message = self.alerts.submit(chat_id, message, message_thread_id)
+                self.entry_message.add_done_callback(self._remember_entry_message)
+            else:
+                self.alerts.submit(chat_id, message, message_thread_id, reply_to=entry_message_id)
+            
+            logger.info(f"Đã đưa cảnh báo {signal} cho {self.symbol} vào hàng đợi Telegram")
             return True
         except Exception as e:
+            ERRORS_TOTAL.inc(self.symbol, 'alert')
             logger.error(f"Lỗi khi gửi cảnh báo tới Telegram cho {self.symbol}: {e}")
             return False
             
-    async def run(self):
+    def _remember_entry_message(self, sent):
+        """Lưu message ID của tin mở lệnh khi gửi xong để tin thoát lệnh reply vào"""
+        if self.entry_message is sent:
+            message = sent.result()
+            self.entry_message = None
+            self.entry_message_id = message.message_id if message is not None else None
+            self.save_state()
+
+    async def run(self, show_chat_info=True):
         """Chạy bot"""
         logger.info(f"Bắt đầu chạy bot giám sát RSI + MACD cho {self.symbol} với chiến lược Long/Short")
-        logger.info(f"Chiến lược RSI: Long khi RSI < {RSI_OVERSOLD}, Short khi RSI > {RSI_OVERBOUGHT}, Thoát lệnh khi RSI = {RSI_EXIT}")
-        logger.info(f"Chiến lược MACD: Kết hợp với tín hiệu MACD crossover và divergence (Tham số: {MACD_FAST},{MACD_SLOW},{MACD_SIGNAL})")
+        logger.info(f"Chiến lược RSI: Long khi RSI < {self.strategy.rsi_oversold}, Short khi RSI > {self.strategy.rsi_overbought}, Thoát lệnh khi RSI = {self.strategy.rsi_exit}")
+        logger.info(f"Chiến lược MACD: Kết hợp với tín hiệu MACD crossover và divergence (Tham số: {self.strategy.macd_fast},{self.strategy.macd_slow},{self.strategy.macd_signal})")
         logger.info(f"Cấu hình giao dịch: Vị thế ${self.position_size} với đòn bẩy x{self.leverage}")
         
-        # Lấy thông tin chat khi khởi động bot
-        await self.get_chat_info()
+        # Lấy thông tin chat khi khởi động bot (MultiPairSignalBot chỉ lấy một lần cho tất cả)
+        if show_chat_info:
+            await self.get_chat_info()
         
         try:
-            while True:
-                # Lấy dữ liệu
-                df = self.fetch_ohlcv_data()
-                
-                # Tính RSI
-                df = self.calculate_rsi(df)
-                
-                # Tính MACD
-                df = self.calculate_macd(df)
-                
-                # Kiểm tra điều kiện
-                signal_data = self.check_entry_conditions(df)
-                if signal_data:
-                    await self.send_telegram_alert(signal_data)
-                
-                # Hiển thị thống kê giao dịch định kỳ
-                if self.trade_count > 0:
-                    win_rate = (self.winning_trades / self.trade_count) * 100
-                    logger.info(f"📊 Thống kê {self.symbol}: {self.trade_count} giao dịch | "
-                              f"Tỷ lệ thắng: {win_rate:.1f}% | Tổng PnL: ${self.total_pnl:+.2f}")
-                
-                # Chờ thời gian trước khi kiểm tra lại (5 phút thực tế hoặc nhanh hơn khi dùng mock)
-                sleep_time = 300 / self.mock_speed if self.use_mock else 300
-                logger.info(f"Đợi {sleep_time:.1f} giây trước khi kiểm tra lại {self.symbol}...")
-                await asyncio.sleep(sleep_time)
+            scheduler = create_scheduler(self.use_mock, timeframe=self.timeframe, mock_speed=self.mock_speed)
+            await scheduler.run([(self.symbol, self.run_cycle)])
                 
         except KeyboardInterrupt:
             logger.info(f"Bot cho {self.symbol} đã dừng bởi người dùng")
@@ -863,6 +1220,103 @@ class CryptoSignalBot:
                           f"Tỷ lệ thắng: {win_rate:.1f}% | Tổng PnL: ${self.total_pnl:+.2f}")
         except Exception as e:
             logger.error(f"Lỗi không xử lý được cho {self.symbol}: {e}")
+        finally:
+            await self.close()
+
+    async def run_cycle(self):
+        """Chạy một chu kỳ: lấy dữ liệu, tính chỉ báo và gửi cảnh báo nếu có tín hiệu"""
+        with STAGE_SECONDS.time(self.symbol, self.timeframe, 'cycle'):
+            # Lấy dữ liệu
+            df = await self.fetch_ohlcv_data()
+            
+            signal_data = await self.evaluate(df)
+            self.log_trading_stats()
+        
+        return signal_data
+
+    async def evaluate(self, df):
+        """Tính chỉ báo trên dữ liệu nến và gửi cảnh báo nếu có tín hiệu"""
+        # Tính RSI + MACD
+        df = self.calculate_indicators(df)
+        
+        # Kiểm tra điều kiện
+        signal_data = self.check_entry_conditions(df)
+        if signal_data:
+            await self.send_telegram_alert(signal_data)
+            self.save_state(signal_data)
+        
+        return signal_data
+
+    @property
+    def state_key(self):
+        return f"{self.symbol} {self.timeframe}"
+
+    def get_state(self):
+        """Trạng thái vị thế/PnL cần lưu để khôi phục"""
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def restore_state(self, state):
+        """Khôi phục trạng thái đã lưu bởi get_state()"""
+        for field in STATE_FIELDS:
+            setattr(self, field, state[field])
+
+    def save_state(self, signal_data=None):
+        """Ghi nhận trạng thái hiện tại vào kho (ghi xuống đĩa theo lô)"""
+        if self.state_store is not None:
+            self.state_store.record(self.state_key, self.get_state(), transition=signal_data)
+
+    def log_trading_stats(self):
+        """Hiển thị thống kê giao dịch định kỳ"""
+        if self.trade_count > 0:
+            win_rate = (self.winning_trades / self.trade_count) * 100
+            logger.info("📊 Thống kê %s %s: %d giao dịch | Tỷ lệ thắng: %.1f%% | Tổng PnL: $%+.2f",
+                        self.symbol, self.timeframe, self.trade_count, win_rate, self.total_pnl)
+
+    async def run_stream(self, transport, timeframe=None):
+        """Chạy bot ở chế độ stream: gộp mọi cập nhật nến qua WebSocket, đánh giá tín hiệu khi nến đóng"""
+        timeframe = timeframe or self.timeframe
+        logger.info(f"Bắt đầu stream nến {timeframe} cho {self.symbol}")
+        buffer = self.candle_cache.get_buffer(self.symbol, timeframe)
+        evaluated = None  # Timestamp của nến đã đóng được đánh giá gần nhất
+        
+        try:
+            # Tải lịch sử nến một lần qua REST, sau đó chỉ cập nhật từ stream
+            await self.fetch_ohlcv_data(timeframe)
+            while True:
+                try:
+                    ohlcv = await transport.watch_ohlcv(self.symbol, timeframe)
+                except Exception as e:
+                    logger.warning(f"Lỗi stream nến cho {self.symbol}: {e}, thử lại sau 1 giây")
+                    await asyncio.sleep(1)
+                    continue
+                
+                if len(buffer) == 0 or not buffer.merge(ohlcv):
+                    # Có khoảng trống (mất kết nối...), tải lại qua REST
+                    await self.fetch_ohlcv_data(timeframe)
+                
+                # Nến đang hình thành chỉ được gộp vào buffer, tín hiệu được kiểm tra một lần khi nến đóng
+                closed = transport.last_closed(self.symbol, timeframe)
+                if closed is None or closed == evaluated:
+                    continue
+                evaluated = closed
+                df = buffer.to_frame()
+                df = df[df['timestamp'] <= np.datetime64(closed, 'ms')]
+                if len(df) == 0:
+                    continue
+                await self.evaluate(df)
+                self.log_trading_stats()
+                    
+        except Exception as e:
+            logger.error(f"Lỗi không xử lý được cho {self.symbol}: {e}")
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Đóng kết nối HTTP của client sàn nếu bot tự tạo client"""
+        if self.owns_exchange:
+            await close_exchange(self.exchange)
+        if self.owns_alerts:
+            await self.alerts.close()
 
     def get_trading_stats(self):
         """Lấy thống kê giao dịch"""
@@ -882,13 +1336,7 @@ class CryptoSignalBot:
         """Lấy và log thông tin chi tiết của chat"""
         try:
             # Tách chat_id và message_thread_id nếu có
-            if '_' in TELEGRAM_CHAT_ID:
-                chat_id, message_thread_id = TELEGRAM_CHAT_ID.split('_')
-                chat_id = int(chat_id)
-                message_thread_id = int(message_thread_id)
-            else:
-                chat_id = int(TELEGRAM_CHAT_ID)
-                message_thread_id = None
+            chat_id, message_thread_id = parse_chat_id(self.chat_id)
             
             # Lấy thông tin chat
             chat_info = await self.bot.get_chat(chat_id)
@@ -923,81 +1371,430 @@ class CryptoSignalBot:
                     logger.warning(f"   - Không thể lấy thông tin quyền bot: {e}")
             
         except Exception as e:
-            logger.warning(f"Không thể lấy thông tin chi tiết của chat {TELEGRAM_CHAT_ID}: {e}")
+            logger.warning(f"Không thể lấy thông tin chi tiết của chat {self.chat_id}: {e}")
+
+async def close_exchange(exchange):
+    """Đóng kết nối HTTP của client sàn (nếu có)"""
+    close = getattr(exchange, 'close', None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.warning(f"Lỗi khi đóng kết nối sàn: {e}")
+
+def combine_trading_stats(stats_by_pair):
+    """Tổng hợp thống kê giao dịch (get_trading_stats) của nhiều cặp"""
+    total_trades = 0
+    total_winning_trades = 0
+    total_pnl = 0
+    active_positions = 0
+
+    for pair_stats in stats_by_pair.values():
+        total_trades += pair_stats['total_trades']
+        total_winning_trades += pair_stats['winning_trades']
+        total_pnl += pair_stats['total_pnl']
+
+        if pair_stats['current_position'] in ['long', 'short']:
+            active_positions += 1
+
+    overall_win_rate = (total_winning_trades / total_trades) * 100 if total_trades > 0 else 0
+
+    return {
+        'total_trades': total_trades,
+        'total_winning_trades': total_winning_trades,
+        'overall_win_rate': overall_win_rate,
+        'total_pnl': total_pnl,
+        'active_positions': active_positions,
+        'stats_by_pair': stats_by_pair
+    }
+
+def log_combined_trading_stats(stats, alerts, schedule=None, details=True):
+    """Hiển thị thống kê tổng hợp (combine_trading_stats), hàng đợi Telegram và lịch chạy"""
+    logger.info("=" * 60)
+    logger.info("📊 THỐNG KÊ TỔNG HỢP TẤT CẢ CÁC CẶP GIAO DỊCH")
+    logger.info(f"💰 Tổng PnL: ${stats['total_pnl']:+.2f}")
+    logger.info(f"📈 Tổng số giao dịch: {stats['total_trades']}")
+    logger.info(f"🎯 Tỷ lệ thắng tổng: {stats['overall_win_rate']:.1f}%")
+    logger.info(f"🔄 Vị thế đang mở: {stats['active_positions']}")
+    logger.info(f"📨 Telegram: đã gửi {alerts['sent']} cảnh báo ({alerts['digests']} tin gộp) | "
+                f"Đang chờ {alerts['queue_depth']} | Thử lại {alerts['retries']} | Lỗi {alerts['failed']} | "
+                f"Độ trễ p50 {alerts['latency_p50']:.1f}s, p95 {alerts['latency_p95']:.1f}s")
+    if schedule is not None:
+        logger.info(f"⏱️ Lịch: {schedule['ticks']} chu kỳ | Bỏ lỡ {schedule['missed_ticks']} mốc | "
+                    f"Trễ lịch TB {schedule['avg_lag'] * 1000:.0f} ms, tối đa {schedule['max_lag'] * 1000:.0f} ms")
+    
+    if details:
+        logger.info("\n📋 Chi tiết theo từng cặp:")
+        for pair, pair_stats in stats['stats_by_pair'].items():
+            status = ""
+            if pair_stats['current_position'] in ['long', 'short']:
+                status = f" (Đang {pair_stats['current_position'].upper()} tại ${pair_stats['entry_price']:.2f})"
+            
+            logger.info(f"  {pair}: {pair_stats['total_trades']} giao dịch | "
+                       f"Thắng {pair_stats['win_rate']:.1f}% | "
+                       f"PnL: ${pair_stats['total_pnl']:+.2f}{status}")
+    logger.info("=" * 60)
 
 class MultiPairSignalBot:
-    def __init__(self, trading_pairs, use_mock=False):
+    def __init__(self, trading_pairs, use_mock=False, mock_seed=None, timeframes=None, alerts=None, pair_filter=None):
         self.trading_pairs = trading_pairs
+        self.timeframes = timeframes or SIGNAL_TIMEFRAMES
         self.use_mock = use_mock
-        self.bots = {}
+        # Cấu hình đang áp dụng; `pair_filter` chọn các cặp của bot này khi đọc lại TRADING_PAIRS
+        self.config = LiveConfig(trading_pairs, DEFAULT_STRATEGY, SIGNAL_MODE, RSI_INDEPENDENT, MACD_INDEPENDENT)
+        self.pair_filter = pair_filter
+        # Một client sàn và một bot Telegram dùng chung cho tất cả các cặp.
+        # Worker của chế độ nhiều tiến trình truyền vào RemoteAlerts: supervisor gửi Telegram.
+        self.exchange = create_exchange(use_mock, mock_seed=mock_seed)
+        self.telegram_bot = create_telegram_bot() if alerts is None else None
+        self.alerts = create_alert_dispatcher(self.telegram_bot) if alerts is None else alerts
+        self.state_store = create_state_store(use_mock)
+        self.candle_cache = CandleCache(store=create_candle_store(use_mock))
+        self.indicator_engine = create_indicator_engine()
+        self.cross_section = create_cross_section_engine() if CROSS_SECTIONAL else None
+        self.warm_start = create_warm_start(use_mock)
+        self.scheduler = None
+        self.transport = None
+        self.bots = {}  # "cặp khung" -> CryptoSignalBot
+        self.bots_by_pair = {}
+        self._stream_tasks = {}  # "cặp khung" -> task run_stream (chế độ stream)
         self._init_bots()
 
     def _init_bots(self):
-        """Khởi tạo bot cho từng cặp giao dịch"""
+        """Khởi tạo bot cho từng cặp giao dịch và khung thời gian"""
         for pair in self.trading_pairs:
-            self.bots[pair] = CryptoSignalBot(symbol=pair, use_mock=self.use_mock)
-            logger.info(f"Đã khởi tạo bot cho {pair}")
+            self._add_pair(pair)
+        self.restore_state()
+        self.load_warm_start()
+
+    def _add_pair(self, pair):
+        """Tạo bot cho mọi khung thời gian của một cặp với cấu hình đang áp dụng"""
+        self.bots_by_pair[pair] = []
+        for timeframe in self.timeframes:
+            bot = CryptoSignalBot(
+                symbol=pair,
+                use_mock=self.use_mock,
+                exchange=self.exchange,
+                bot=self.telegram_bot,
+                alerts=self.alerts,
+                state_store=self.state_store,
+                candle_cache=self.candle_cache,
+                indicator_engine=self.indicator_engine,
+                strategy=self.config.strategy,
+                timeframe=timeframe
+            )
+            self._apply_signal_mode(bot)
+            self.bots[f"{pair} {timeframe}"] = bot
+            self.bots_by_pair[pair].append(bot)
+        logger.info(f"Đã khởi tạo bot cho {pair} ({', '.join(self.timeframes)})")
+
+    def _remove_pair(self, pair):
+        """Bỏ theo dõi một cặp; trạng thái đã lưu được giữ để khôi phục nếu cặp được thêm lại"""
+        for bot in self.bots_by_pair.pop(pair):
+            key = f"{pair} {bot.timeframe}"
+            del self.bots[key]
+            task = self._stream_tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+            if bot.current_position in ('long', 'short'):
+                logger.warning(f"Bỏ theo dõi {key} khi đang {bot.current_position.upper()} tại ${bot.entry_price:.2f}")
+            for gauge in (POSITION, PNL_USD, TRADES):
+                gauge.remove(bot.symbol, bot.timeframe)
+        if self.scheduler is not None:
+            self.scheduler.remove_job(pair)
+        logger.info(f"Đã dừng bot cho {pair}")
+
+    def _apply_signal_mode(self, bot):
+        bot.signal_mode = self.config.signal_mode
+        bot.rsi_independent = self.config.rsi_independent
+        bot.macd_independent = self.config.macd_independent
+
+    def _start_pair(self, pair):
+        """Bắt đầu chạy một cặp vừa thêm khi đang chạy (job của lịch hoặc stream)"""
+        if self.transport is not None:
+            for bot in self.bots_by_pair[pair]:
+                self._stream_tasks[f"{pair} {bot.timeframe}"] = asyncio.create_task(bot.run_stream(self.transport))
+        elif self.scheduler is not None and self.cross_section is None and not BULK_TICKERS:
+            # Chế độ CROSS_SECTIONAL/BULK_TICKERS dùng một job chung đọc self.trading_pairs mỗi chu kỳ
+            self.scheduler.add_job(pair, lambda pair=pair: self.run_pair_cycle(pair))
+
+    def reload_config(self, changed=None):
+        """Áp dụng cấu hình mới khi đang chạy: thêm/bớt cặp, đổi tham số chiến lược và signal mode
+
+        Cặp không đổi giữ nguyên bot, vị thế, buffer nến và trạng thái chỉ báo nên không phát
+        sinh request mới. Chỉ khi đổi RSI_WINDOW/MACD_* thì chỉ báo được tính lại từ các nến
+        đã có trong buffer.
+        """
+        config = read_live_config()
+        pairs = [pair for pair in config.trading_pairs if self.pair_filter is None or self.pair_filter(pair)]
+        config = config._replace(trading_pairs=pairs)
+        old = self.config
+        self.config = config
+
+        if config.strategy != old.strategy:
+            windows = lambda strategy: (strategy.rsi_window, strategy.macd_fast, strategy.macd_slow, strategy.macd_signal)
+            if windows(config.strategy) != windows(old.strategy):
+                self.indicator_engine = create_indicator_engine(config.strategy)
+                if self.cross_section is not None:
+                    self.cross_section = create_cross_section_engine(config.strategy)
+            for bot in self.bots.values():
+                bot.strategy = config.strategy
+                bot.indicator_engine = self.indicator_engine
+            logger.info(f"🔄 Chiến lược mới: RSI({config.strategy.rsi_window}) <{config.strategy.rsi_oversold} "
+                        f">{config.strategy.rsi_overbought} thoát {config.strategy.rsi_exit} | "
+                        f"MACD {config.strategy.macd_fast},{config.strategy.macd_slow},{config.strategy.macd_signal}")
+        if config[2:] != old[2:]:
+            for bot in self.bots.values():
+                self._apply_signal_mode(bot)
+            logger.info(f"🔄 Signal Mode: {config.signal_mode} | RSI Independent: {config.rsi_independent} | "
+                        f"MACD Independent: {config.macd_independent}")
+
+        removed = [pair for pair in self.trading_pairs if pair not in pairs]
+        added = [pair for pair in pairs if pair not in self.bots_by_pair]
+        if not removed and not added:
+            return
+        for pair in removed:
+            self._remove_pair(pair)
+        for pair in added:
+            self._add_pair(pair)
+        # Danh sách mới (không sửa tại chỗ) để chu kỳ đang chạy dở vẫn dùng danh sách cũ
+        self.trading_pairs = pairs
+        self.restore_state([bot for pair in added for bot in self.bots_by_pair[pair]])
+        for pair in added:
+            self._start_pair(pair)
+        logger.info(f"🔄 Danh sách cặp: thêm {len(added)} ({', '.join(added) or '-'}), "
+                    f"bỏ {len(removed)} ({', '.join(removed) or '-'}), đang theo dõi {len(pairs)} cặp")
+
+    def restore_state(self, bots=None):
+        """Khôi phục vị thế/PnL đã lưu của mọi bot (hoặc của các bot `bots`)"""
+        if self.state_store is None:
+            return
+        bots = list(self.bots.values()) if bots is None else bots
+        start = time.perf_counter()
+        saved = self.state_store.load()
+        restored = 0
+        for bot in bots:
+            if bot.state_key in saved:
+                bot.restore_state(saved[bot.state_key])
+                restored += 1
+        open_positions = sum(bot.current_position in ('long', 'short') for bot in bots)
+        logger.info(f"💾 Khôi phục trạng thái {restored}/{len(bots)} bot ({open_positions} vị thế đang mở) "
+                    f"từ {self.state_store.path} trong {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def load_warm_start(self):
+        """Nạp buffer nến và trạng thái chỉ báo đã lưu: chu kỳ đầu chỉ tải các nến còn thiếu"""
+        if self.warm_start is None:
+            return
+        self.warm_start.load(self.candle_cache, self.indicator_engine, self.cross_section,
+                             symbols=set(self.trading_pairs))
+
+    def warm_start_sources(self):
+        # Đọc lại mỗi lần ghi vì engine được thay khi đổi RSI_WINDOW/MACD_*
+        return self.candle_cache, self.indicator_engine, self.cross_section
+
+    async def run_pair_cycle(self, pair):
+        """Một chu kỳ của một cặp: tải nến một lần rồi đánh giá mọi khung thời gian"""
+        bots = self.bots_by_pair[pair]
+        if len(bots) == 1:
+            await bots[0].run_cycle()
+            return
+        with STAGE_SECONDS.time(pair, BASE_TIMEFRAME, 'cycle'):
+            try:
+                with STAGE_SECONDS.time(pair, BASE_TIMEFRAME, 'fetch'):
+                    frames = await self.candle_cache.fetch_timeframes(self.exchange, pair, self.timeframes,
+                                                                      base_timeframe=BASE_TIMEFRAME)
+            except Exception as e:
+                ERRORS_TOTAL.inc(pair, 'fetch')
+                logger.error(f"Lỗi khi lấy dữ liệu OHLCV cho {pair}: {e}")
+                return
+            for bot in bots:
+                await bot.evaluate(frames[bot.timeframe])
+                bot.log_trading_stats()
+
+    async def update_pair(self, pair):
+        """Cập nhật buffer nến mọi khung thời gian của một cặp, False nếu lỗi"""
+        timeframe = self.timeframes[0] if len(self.timeframes) == 1 else BASE_TIMEFRAME
+        try:
+            with STAGE_SECONDS.time(pair, timeframe, 'fetch'):
+                if len(self.timeframes) == 1:
+                    await self.candle_cache.update(self.exchange, pair, timeframe)
+                else:
+                    await self.candle_cache.update_timeframes(self.exchange, pair, self.timeframes,
+                                                              base_timeframe=BASE_TIMEFRAME)
+            return True
+        except Exception as e:
+            ERRORS_TOTAL.inc(pair, 'fetch')
+            logger.error(f"Lỗi khi lấy dữ liệu OHLCV cho {pair}: {e}")
+            return False
+
+    async def update_pairs(self):
+        """Cập nhật nến của mọi cặp, trả về các cặp cập nhật thành công
+
+        Với BULK_TICKERS, giá mới nhất của cả danh sách được lấy bằng vài request fetch_tickers
+        theo lô; chỉ cặp vừa đóng nến (hoặc chưa có dữ liệu) mới tải nến riêng.
+        """
+        if not BULK_TICKERS:
+            updated = await asyncio.gather(*(self.update_pair(pair) for pair in self.trading_pairs))
+            return [pair for pair, ok in zip(self.trading_pairs, updated) if ok]
+
+        single = len(self.timeframes) == 1
+        timeframe = self.timeframes[0] if single else BASE_TIMEFRAME
+        capacity = None if single else self.candle_cache.base_capacity(self.timeframes, BASE_TIMEFRAME)
+        with STAGE_SECONDS.time('*', timeframe, 'bulk_fetch'):
+            pairs = await self.candle_cache.refresh(self.exchange, self.trading_pairs, timeframe,
+                                                    capacity=capacity, batch_size=TICKER_BATCH_SIZE)
+        for pair in set(self.trading_pairs) - set(pairs):
+            ERRORS_TOTAL.inc(pair, 'fetch')
+        if single:
+            return pairs
+
+        # Gộp các khung lớn hơn từ luồng nến gốc vừa cập nhật
+        updated = []
+        for pair in pairs:
+            try:
+                with STAGE_SECONDS.time(pair, BASE_TIMEFRAME, 'fetch'):
+                    await self.candle_cache.update_timeframes(self.exchange, pair, self.timeframes,
+                                                              base_timeframe=BASE_TIMEFRAME, refresh_base=False)
+                updated.append(pair)
+            except Exception as e:
+                ERRORS_TOTAL.inc(pair, 'fetch')
+                logger.error(f"Lỗi khi lấy dữ liệu OHLCV cho {pair}: {e}")
+        return updated
+
+    async def run_bulk_cycle(self):
+        """Một chu kỳ cho mọi cặp: cập nhật giá bằng fetch_tickers theo lô rồi đánh giá từng cặp"""
+        pairs = await self.update_pairs()
+        for pair in pairs:
+            # Bỏ các cặp vừa bị gỡ khỏi danh sách trong lúc đang tải nến
+            for bot in self.bots_by_pair.get(pair, []):
+                with STAGE_SECONDS.time(pair, bot.timeframe, 'cycle'):
+                    await bot.evaluate(self.candle_cache.frame(pair, bot.timeframe, CANDLE_LIMIT))
+                    bot.log_trading_stats()
+
+    async def run_cross_section_cycle(self):
+        """Một chu kỳ cho mọi cặp: tải nến đồng thời rồi đánh giá tất cả trong một lần tính vectơ"""
+        pairs = await self.update_pairs()
+        for timeframe in self.timeframes:
+            await self.evaluate_cross_section(pairs, timeframe)
+
+    async def evaluate_cross_section(self, pairs, timeframe):
+        """Tính chỉ báo của mọi cặp trên mảng cặp × nến, chỉ chuyển các cặp có tín hiệu cho bot của cặp đó"""
+        # Bỏ các cặp vừa bị gỡ khỏi danh sách trong lúc đang tải nến
+        pairs = [pair for pair in pairs if pair in self.bots_by_pair]
+        bots = [self.bots[f"{pair} {timeframe}"] for pair in pairs]
+        if not bots:
+            return
+        with STAGE_SECONDS.time('*', timeframe, 'bulk_indicators'):
+            arrays = [self.candle_cache.get_buffer(pair, timeframe).to_array() for pair in pairs]
+            timestamps, closes = stack_candles(arrays, CANDLE_LIMIT)
+            snapshots = self.cross_section.sync([(pair, timeframe) for pair in pairs], timestamps, closes)
+            positions = np.fromiter((POSITION_CODES.get(bot.current_position, 0) for bot in bots),
+                                    dtype=np.int8, count=len(bots))
+            rows = signal_candidates(snapshots, positions, bots[0])
+
+        signalled = set()
+        for row in rows:
+            bot = bots[row]
+            signal_data = bot.evaluate_snapshot(IndicatorSnapshot(*snapshots[:, row].tolist()))
+            if signal_data:
+                signalled.add(row)
+                await bot.send_telegram_alert(signal_data)
+                bot.save_state(signal_data)
+
+        if logger.isEnabledFor(logging.INFO):
+            for row, bot in enumerate(bots):
+                if row not in signalled and bot.current_position not in ['long', 'short']:
+                    bot._log_indicators(IndicatorSnapshot(*snapshots[:, row].tolist()))
+                bot.log_trading_stats()
+
+    async def load_markets(self):
+        """Tải thông tin thị trường một lần cho client dùng chung"""
+        if not hasattr(self.exchange, 'load_markets'):
+            return
+        try:
+            await self.exchange.load_markets()
+            logger.info(f"Đã tải thông tin thị trường cho {len(self.trading_pairs)} cặp")
+        except Exception as e:
+            logger.warning(f"Không thể tải thông tin thị trường: {e}")
 
     def get_combined_stats(self):
         """Lấy thống kê tổng hợp từ tất cả các bot"""
-        total_trades = 0
-        total_winning_trades = 0
-        total_pnl = 0
-        active_positions = 0
-        
-        stats_by_pair = {}
-        
-        for pair, bot in self.bots.items():
-            pair_stats = bot.get_trading_stats()
-            stats_by_pair[pair] = pair_stats
-            
-            total_trades += pair_stats['total_trades']
-            total_winning_trades += pair_stats['winning_trades']
-            total_pnl += pair_stats['total_pnl']
-            
-            if pair_stats['current_position'] in ['long', 'short']:
-                active_positions += 1
-        
-        overall_win_rate = (total_winning_trades / total_trades) * 100 if total_trades > 0 else 0
-        
-        return {
-            'total_trades': total_trades,
-            'total_winning_trades': total_winning_trades,
-            'overall_win_rate': overall_win_rate,
-            'total_pnl': total_pnl,
-            'active_positions': active_positions,
-            'stats_by_pair': stats_by_pair
-        }
+        return combine_trading_stats(
+            {pair: bot.get_trading_stats() for pair, bot in self.bots.items()}
+        )
+
+    def collect_metrics(self):
+        """Cập nhật các gauge vị thế/PnL/hàng đợi trước mỗi lần Prometheus scrape"""
+        stats = self.get_combined_stats()
+        for bot in self.bots.values():
+            POSITION.set(POSITION_CODES.get(bot.current_position, 0), bot.symbol, bot.timeframe)
+            PNL_USD.set(bot.total_pnl, bot.symbol, bot.timeframe)
+            TRADES.set(bot.trade_count, bot.symbol, bot.timeframe)
+        OPEN_POSITIONS.set(stats['active_positions'])
+        TOTAL_PNL_USD.set(stats['total_pnl'])
+        WIN_RATE.set(stats['overall_win_rate'])
+        ALERT_QUEUE_DEPTH.set(self.alerts.queue_depth())
+        if self.scheduler is not None:
+            SCHEDULE_LAG.set(self.scheduler.last_lag)
+            MISSED_TICKS.set(self.scheduler.missed_ticks)
 
     def log_combined_stats(self):
         """Hiển thị thống kê tổng hợp"""
-        stats = self.get_combined_stats()
-        
-        logger.info("=" * 60)
-        logger.info("📊 THỐNG KÊ TỔNG HỢP TẤT CẢ CÁC CẶP GIAO DỊCH")
-        logger.info(f"💰 Tổng PnL: ${stats['total_pnl']:+.2f}")
-        logger.info(f"📈 Tổng số giao dịch: {stats['total_trades']}")
-        logger.info(f"🎯 Tỷ lệ thắng tổng: {stats['overall_win_rate']:.1f}%")
-        logger.info(f"🔄 Vị thế đang mở: {stats['active_positions']}")
-        
-        logger.info("\n📋 Chi tiết theo từng cặp:")
-        for pair, pair_stats in stats['stats_by_pair'].items():
-            status = ""
-            if pair_stats['current_position'] in ['long', 'short']:
-                status = f" (Đang {pair_stats['current_position'].upper()} tại ${pair_stats['entry_price']:.2f})"
-            
-            logger.info(f"  {pair}: {pair_stats['total_trades']} giao dịch | "
-                       f"Thắng {pair_stats['win_rate']:.1f}% | "
-                       f"PnL: ${pair_stats['total_pnl']:+.2f}{status}")
-        logger.info("=" * 60)
+        schedule = self.scheduler.stats() if self.scheduler is not None else None
+        log_combined_trading_stats(self.get_combined_stats(), self.alerts.stats(), schedule)
 
-    async def run_all(self):
-        """Chạy tất cả các bot đồng thời"""
+    async def run_all(self, transport=None):
+        """Chạy tất cả các bot đồng thời
+
+        Nếu có `transport` (WebSocket), các bot nhận nến qua stream thay vì polling.
+        """
+        flusher = None
+        if self.state_store is not None:
+            flusher = asyncio.create_task(self.state_store.run_flusher(STATE_FLUSH_INTERVAL))
+        snapshot_saver = None
+        if self.warm_start is not None and WARM_START_INTERVAL > 0:
+            snapshot_saver = asyncio.create_task(
+                self.warm_start.run_saver(WARM_START_INTERVAL, self.warm_start_sources))
+        METRICS.add_collector(self.collect_metrics)
+        metrics_server = await start_metrics_server()
+        # Thêm/bớt cặp và đổi tham số chiến lược khi file cấu hình thay đổi
+        watcher = create_config_watcher(self.reload_config)
+        watcher_task = asyncio.create_task(watcher.run()) if watcher is not None else None
         try:
+            await self.load_markets()
+            
+            # Lấy thông tin chat một lần vì tất cả các cặp dùng chung bot Telegram
+            if self.bots and self.telegram_bot is not None:
+                await next(iter(self.bots.values())).get_chat_info()
+            
             # Tạo danh sách các coroutine để chạy
-            tasks = [bot.run() for bot in self.bots.values()]
-            # Chạy tất cả các bot cùng lúc
-            await asyncio.gather(*tasks)
+            if transport is not None:
+                self.transport = transport
+                for pair in self.trading_pairs:
+                    self._start_pair(pair)
+                # Chạy tới khi mọi stream kết thúc, kể cả stream của các cặp thêm khi đang chạy
+                while self._stream_tasks:
+                    await asyncio.wait(list(self._stream_tasks.values()))
+                    self._stream_tasks = {key: task for key, task in self._stream_tasks.items() if not task.done()}
+            else:
+                # Một lịch chung: mọi cặp chạy ngay sau mỗi mốc, rải đều để không dồn request
+                # Chu kỳ theo khung nhỏ nhất; mốc đóng nến của các khung lớn hơn trùng với mốc này
+                mock_speed = next(iter(self.bots.values())).mock_speed if self.bots else 1
+                timeframe = min(self.timeframes, key=timeframe_to_ms)
+                self.scheduler = create_scheduler(self.use_mock, timeframe=timeframe, mock_speed=mock_speed)
+                if self.cross_section is not None:
+                    # Mọi cặp trong một job: tải đồng thời, tính chỉ báo một lần cho tất cả
+                    await self.scheduler.run([('tất cả các cặp', self.run_cross_section_cycle)])
+                elif BULK_TICKERS:
+                    # Mọi cặp trong một job: vài request fetch_tickers cho cả danh sách mỗi chu kỳ
+                    await self.scheduler.run([('tất cả các cặp', self.run_bulk_cycle)])
+                else:
+                    await self.scheduler.run([
+                        (pair, lambda pair=pair: self.run_pair_cycle(pair)) for pair in self.trading_pairs
+                    ])
         except KeyboardInterrupt:
             logger.info("Tất cả bot đã dừng bởi người dùng")
             # Hiển thị thống kê cuối cùng
@@ -1005,11 +1802,134 @@ class MultiPairSignalBot:
         except Exception as e:
             logger.error(f"Lỗi khi chạy đa bot: {e}")
             self.log_combined_stats()
+        finally:
+            if watcher_task is not None:
+                watcher_task.cancel()
+            for task in self._stream_tasks.values():
+                task.cancel()
+            if metrics_server is not None:
+                await metrics_server.stop()
+            METRICS.remove_collector(self.collect_metrics)
+            await self.alerts.close()
+            if flusher is not None:
+                flusher.cancel()
+                self.state_store.close()
+            if snapshot_saver is not None:
+                snapshot_saver.cancel()
+            if self.warm_start is not None:
+                self.warm_start.save(*self.warm_start_sources())
+            await close_exchange(self.exchange)
+            if transport is not None:
+                await transport.close()
+
+async def run_stream_mode(multi_bot, args):
+    """Chạy MultiPairSignalBot với transport WebSocket phù hợp"""
+    server = None
+    if args.stream_url:
+        transport = WebSocketKlineTransport(args.stream_url)
+    elif args.mock:
+        # Chế độ mock: dùng server kline giả lập chạy cục bộ
+        server = await LocalKlineServer(seed=args.seed).start()
+        transport = WebSocketKlineTransport(server.url)
+    else:
+        transport = CcxtProTransport(api_key=BINANCE_API_KEY, secret=BINANCE_SECRET_KEY)
+        
+    try:
+        await multi_bot.run_all(transport=transport)
+    finally:
+        if server is not None:
+            await server.stop()
+
+def run_shard_worker(link, pairs, args):
+    """Tiến trình worker (--workers): chạy MultiPairSignalBot cho các cặp của một shard"""
+    global METRICS_PORT, WARM_START_FILE, STATE_DB
+    ignore_interrupt()
+    link.attach_logging(SIGNAL_LOGGER)
+    # Mỗi worker một cổng metrics riêng: METRICS_PORT + 1 + shard
+    if METRICS_PORT:
+        METRICS_PORT = str(int(METRICS_PORT) + 1 + link.shard)
+    # và một file trạng thái/snapshot riêng để các worker không ghi chung một file SQLite;
+    # rendezvous hashing giữ hầu hết các cặp ở lại shard cũ
+    if STATE_DB:
+        root, ext = os.path.splitext(STATE_DB)
+        STATE_DB = f"{root}_shard{link.shard}{ext}"
+    if WARM_START_FILE:
+        root, ext = os.path.splitext(WARM_START_FILE)
+        WARM_START_FILE = f"{root}_shard{link.shard}{ext}"
+    try:
+        asyncio.run(_run_shard_worker(link, pairs, args))
+    except Exception as e:
+        logger.error(f"Lỗi worker shard {link.shard}: {e}")
+        raise SystemExit(1)
+
+async def _run_shard_worker(link, pairs, args):
+    # Khi đọc lại TRADING_PAIRS, worker chỉ giữ các cặp thuộc shard của nó
+    multi_bot = MultiPairSignalBot(trading_pairs=pairs, use_mock=args.mock, mock_seed=args.seed,
+                                   alerts=RemoteAlerts(link),
+                                   pair_filter=lambda pair: shard_of(pair, args.workers) == link.shard)
+    # Supervisor dừng worker bằng SIGTERM: hủy task chính để run_all dọn dẹp như khi dừng thường
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def stop():
+        # Chỉ hủy một lần: SIGTERM lặp lại (gửi cho cả nhóm tiến trình rồi từ supervisor) không được
+        # cắt ngang phần dọn dẹp của run_all (ghi trạng thái, snapshot warm start)
+        loop.add_signal_handler(signal.SIGTERM, lambda: None)
+        main_task.cancel()
+
+    loop.add_signal_handler(signal.SIGTERM, stop)
+    watcher = asyncio.create_task(link.watch_supervisor(stop))
+    
+    async def report_stats():
+        while True:
+            await asyncio.sleep(SHARD_STATS_INTERVAL)
+            link.report_stats(multi_bot.get_combined_stats()['stats_by_pair'])
+    
+    reporter = asyncio.create_task(report_stats())
+    try:
+        if args.stream:
+            await run_stream_mode(multi_bot, args)
+        else:
+            await multi_bot.run_all()
+    except asyncio.CancelledError:
+        logger.info(f"Worker shard {link.shard} đã dừng")
+    finally:
+        reporter.cancel()
+        watcher.cancel()
+        link.report_stats(multi_bot.get_combined_stats()['stats_by_pair'])
+
+def log_shard_stats(supervisor, final):
+    """Thống kê tổng hợp của mọi worker (chế độ --workers)"""
+    logger.info(f"🧩 Worker: {supervisor.alive()}/{len(supervisor.assignment)} đang chạy | "
+                f"Khởi động lại {supervisor.restarts} lần")
+    log_combined_trading_stats(combine_trading_stats(supervisor.stats_by_pair()), supervisor.alerts.stats(),
+                               details=final)
+
+async def run_sharded(args):
+    """Chia TRADING_PAIRS cho `args.workers` tiến trình, gửi mọi cảnh báo từ một hàng đợi Telegram"""
+    alerts = create_alert_dispatcher(create_telegram_bot())
+    supervisor = ShardSupervisor(TRADING_PAIRS, args.workers, run_shard_worker, args=(args,), alerts=alerts,
+                                 report=log_shard_stats, report_interval=SHARD_STATS_INTERVAL,
+                                 restart_delay=SHARD_RESTART_DELAY)
+    # Worker tự áp dụng cấu hình mới; supervisor chỉ cần chia lại danh sách cặp
+    watcher = create_config_watcher(lambda changed: supervisor.update_pairs(read_live_config().trading_pairs))
+    watcher_task = asyncio.create_task(watcher.run()) if watcher is not None else None
+    try:
+        await supervisor.run()
+    finally:
+        if watcher_task is not None:
+            watcher_task.cancel()
 
 if __name__ == "__main__":
     # Thêm các tham số để chọn chế độ thực/mock
     parser = argparse.ArgumentParser(description='Crypto Signal Bot với chiến lược Long/Short dựa trên RSI')
     parser.add_argument('--mock', action='store_true', help='Chạy với dữ liệu mock để test')
+    parser.add_argument('--seed', type=int, default=None, help='Seed cho dữ liệu mock để chạy lặp lại được')
+    parser.add_argument('--stream', action='store_true', help='Nhận nến qua WebSocket thay vì polling 300 giây')
+    parser.add_argument('--stream-url', default=None,
+                        help='WebSocket dạng kline stream của Binance (mặc định: ccxt.pro, hoặc server giả lập khi --mock)')
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS,
+                        help='Chia các cặp cho N tiến trình worker (mặc định SHARD_WORKERS, 0/1: một tiến trình)')
     args = parser.parse_args()
     
     # Log thông tin khởi động
@@ -1018,25 +1938,35 @@ if __name__ == "__main__":
     logger.info("=" * 80)
     logger.info(f"📁 Log files được lưu tại:")
     logger.info(f"   - Tổng quát: logs/crypto_signal_bot.log")
-    logger.info(f"   - Trading signals: logs/trading_signals.log")
-    logger.info(f"🔧 Chế độ: {'Mock (Test)' if args.mock else 'Live Trading'}")
+    logger.info(f"   - Trading signals (JSON): logs/trading_signals.jsonl")
+    logger.info(f"🔧 Chế độ: {'Mock (Test)' if args.mock else 'Live Trading'}{' + Stream' if args.stream else ''}"
+                f"{f' | {args.workers} worker' if args.workers > 1 else ''}")
     logger.info(f"🎯 Signal Mode: {SIGNAL_MODE} | RSI Independent: {RSI_INDEPENDENT} | MACD Independent: {MACD_INDEPENDENT}")
     logger.info(f"📊 Cặp giao dịch: {', '.join(TRADING_PAIRS)}")
-    logger.info(f"⚙️  Cấu hình RSI: Window={RSI_WINDOW}, Timeframe={RSI_TIMEFRAME}")
+    logger.info(f"⚙️  Cấu hình RSI: Window={RSI_WINDOW}, Timeframe={','.join(SIGNAL_TIMEFRAMES)}")
     logger.info(f"📈 Ngưỡng RSI: Oversold<{RSI_OVERSOLD}, Overbought>{RSI_OVERBOUGHT}, Exit={RSI_EXIT}")
     logger.info(f"📊 Cấu hình MACD: Fast={MACD_FAST}, Slow={MACD_SLOW}, Signal={MACD_SIGNAL}")
     logger.info("=" * 80)
     
     # Log signal khởi động vào file trading signals
-    signal_logger = logging.getLogger('trading_signals')
-    signal_logger.info(f"BOT_START | Mode: {'Mock' if args.mock else 'Live'} | Pairs: {','.join(TRADING_PAIRS)} | RSI_Config: {RSI_WINDOW}_{RSI_TIMEFRAME}_{RSI_OVERSOLD}_{RSI_OVERBOUGHT}_{RSI_EXIT} | MACD_Config: {MACD_FAST}_{MACD_SLOW}_{MACD_SIGNAL}")
+    signal_logger = logging.getLogger(SIGNAL_LOGGER)
+    signal_logger.info("BOT_START", extra={'fields': {
+        'mode': 'Mock' if args.mock else 'Live', 'pairs': TRADING_PAIRS, 'workers': args.workers,
+        'rsi_config': f"{RSI_WINDOW}_{RSI_TIMEFRAME}_{RSI_OVERSOLD}_{RSI_OVERBOUGHT}_{RSI_EXIT}",
+        'macd_config': f"{MACD_FAST}_{MACD_SLOW}_{MACD_SIGNAL}"}})
     
     try:
-        multi_bot = MultiPairSignalBot(trading_pairs=TRADING_PAIRS, use_mock=args.mock)
-        asyncio.run(multi_bot.run_all())
+        if args.workers > 1:
+            asyncio.run(run_sharded(args))
+        else:
+            multi_bot = MultiPairSignalBot(trading_pairs=TRADING_PAIRS, use_mock=args.mock, mock_seed=args.seed)
+            if args.stream:
+                asyncio.run(run_stream_mode(multi_bot, args))
+            else:
+                asyncio.run(multi_bot.run_all())
     except Exception as e:
         logger.error(f"Lỗi khởi động bot: {e}")
-        signal_logger.info(f"BOT_ERROR | Error: {str(e)}")
+        signal_logger.info("BOT_ERROR", extra={'fields': {'error': str(e)}})
     finally:
         logger.info("🛑 Bot đã dừng hoàn toàn")
-        signal_logger.info("BOT_STOP | Bot stopped") 
\ No newline at end of file
+        signal_logger.info("BOT_STOP") 
\ No newline at end of file
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Đo thời gian từng bước và đếm tín hiệu, xuất theo định dạng Prometheus tại `/metrics`
+
+Counter/Gauge/Histogram tối giản (không cần prometheus_client) lưu trong bộ nhớ của tiến
+trình; `MetricsServer` phục vụ `GET /metrics` (text exposition format 0.0.4) bằng aiohttp.
+Các gauge lấy từ trạng thái bot (vị thế, PnL...) được cập nhật bằng collector chạy mỗi lần
+Prometheus scrape, nên không tốn chi phí trong chu kỳ kiểm tra.
+"""
+
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Giây, đủ rộng cho cả tính chỉ báo (ms) lẫn tải dữ liệu qua mạng chậm
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _key(self, label_values):
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name} cần {len(self.labels)} nhãn {self.labels}, nhận {label_values}")
+        return tuple(str(value) for value in label_values)
+
+    def clear(self):
+        self._values.clear()
+
+    def remove(self, *label_values):
+        """Xoá chuỗi giá trị của một bộ nhãn (ví dụ cặp đã bỏ theo dõi)"""
+        self._values.pop(self._key(label_values), None)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(self._key(label_values), 0)
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời"""
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        self._values[self._key(label_values)] = value
+
+    def value(self, *label_values):
+        return self._values.get(self._key(label_values), 0)
+
+
+class Histogram(_Metric):
+    """Phân bố giá trị (thời gian) theo các bucket cố định"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        key = self._key(label_values)
+        series = self._values.get(key)
+        if series is None:
+            # [số lần rơi vào từng bucket (không cộng dồn, bucket cuối là +Inf), tổng, số lần]
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Đo thời gian chạy của khối `with` (dùng được quanh các lệnh await)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values):
+        series = self._values.get(self._key(label_values))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập các metric của tiến trình và các collector cập nhật gauge khi scrape"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} đã được đăng ký")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector):
+        """`collector()` được gọi trước mỗi lần render để cập nhật các gauge"""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Lỗi khi cập nhật metrics: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Server HTTP cục bộ phục vụ `GET /metrics` cho Prometheus"""
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Lấy cổng thực tế khi port=0
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Metrics Prometheus tại {self.url}")
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Quét lưới tham số RSI/MACD bằng backtest trên nhiều tiến trình
+
+Tác vụ được nhóm theo (cặp, RSI_WINDOW, bộ MACD): chuỗi RSI/MACD được tính một lần
+cho mỗi nhóm (và được nhớ trong tiến trình) rồi dùng lại cho mọi ngưỡng
+OVERSOLD/OVERBOUGHT/EXIT. Dữ liệu nến chỉ được gửi tới mỗi tiến trình một lần khi
+khởi tạo, nên thời gian chạy giảm gần tuyến tính theo số nhân CPU.
+
+Ví dụ:
+    python optimizer.py --mock --seed 42 --timeframe 1h --days 365 \\
+        --rsi-window 7,14,21 --oversold 20,25,30 --overbought 70,75,80 --exit 45,50,55 \\
+        --macd 12:26:9,8:21:5 --top 20 --output sweep.csv
+"""
+
+import os
+import time
+import logging
+import argparse
+import itertools
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import main
+from main import StrategyConfig, combine_trading_stats
+from backtest import Backtester, load_candles, compute_rsi, compute_macd
+
+logger = logging.getLogger(__name__)
+
+# Số tác vụ tối thiểu cho mỗi tiến trình để cân bằng tải
+TASKS_PER_WORKER = 4
+
+# Dữ liệu nến của tiến trình con, được gán một lần trong _init_worker
+_candles_by_pair = {}
+_timeframe = None
+
+
+def _init_worker(candles_by_pair, timeframe):
+    global _candles_by_pair, _timeframe
+    _candles_by_pair = candles_by_pair
+    _timeframe = timeframe
+    # Mỗi lệnh vào/thoát trong backtest đều ghi log INFO, tắt để không làm chậm quét
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+@lru_cache(maxsize=64)
+def _rsi_series(symbol, window):
+    return compute_rsi(_candles_by_pair[symbol][:, 4], window)
+
+
+@lru_cache(maxsize=64)
+def _macd_series(symbol, fast, slow, signal):
+    return compute_macd(_candles_by_pair[symbol][:, 4], fast, slow, signal)
+
+
+def _run_task(symbol, rsi_window, macd_params, thresholds):
+    """Backtest một cặp với một bộ chỉ báo cho mọi ngưỡng, trả về [(StrategyConfig, stats)]"""
+    candles = _candles_by_pair[symbol]
+    indicators = {'close': candles[:, 4], 'rsi': _rsi_series(symbol, rsi_window)}
+    indicators.update(_macd_series(symbol, *macd_params))
+
+    results = []
+    for oversold, overbought, exit_level in thresholds:
+        strategy = StrategyConfig(rsi_window, oversold, overbought, exit_level, *macd_params)
+        stats = Backtester(symbol, candles, _timeframe, strategy=strategy).run(indicators)
+        results.append((strategy, stats))
+    return symbol, results
+
+
+def build_grid(args):
+    """Sinh các bộ chỉ báo và ngưỡng hợp lệ từ tham số dòng lệnh"""
+    macd_params = [params for params in args.macd if params[0] < params[1]]
+    thresholds = [
+        (oversold, overbought, exit_level)
+        for oversold, overbought, exit_level in itertools.product(args.oversold, args.overbought, args.exit)
+        if oversold < exit_level < overbought
+    ]
+    return macd_params, thresholds
+
+
+def run_sweep(candles_by_pair, timeframe, rsi_windows, macd_params, thresholds, workers=None):
+    """Chạy quét lưới, trả về DataFrame kết quả đã xếp hạng theo PnL và tỷ lệ thắng"""
+    workers = workers or os.cpu_count()
+    groups = [
+        (symbol, rsi_window, params)
+        for rsi_window in rsi_windows
+        for params in macd_params
+        for symbol in candles_by_pair
+    ]
+    # Chia nhỏ các ngưỡng khi có ít nhóm chỉ báo để mọi tiến trình đều có việc
+    # (mỗi tiến trình vẫn chỉ tính mỗi chuỗi chỉ báo một lần nhờ lru_cache)
+    chunks = max(1, min(len(thresholds), -(-TASKS_PER_WORKER * workers // max(1, len(groups)))))
+    chunk_size = -(-len(thresholds) // chunks)
+    tasks = [
+        group + (thresholds[start:start + chunk_size],)
+        for group in groups
+        for start in range(0, len(thresholds), chunk_size)
+    ]
+    stats_by_strategy = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(candles_by_pair, timeframe)) as executor:
+        futures = [executor.submit(_run_task, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            symbol, results = future.result()
+            for strategy, stats in results:
+                stats_by_strategy.setdefault(strategy, {})[symbol] = stats
+            if done % max(1, len(futures) // 10) == 0:
+                logger.info(f"Đã xong {done}/{len(futures)} tác vụ")
+
+    rows = []
+    for strategy, stats_by_pair in stats_by_strategy.items():
+        combined = combine_trading_stats(stats_by_pair)
+        row = strategy._asdict()
+        row.update({
+            'total_trades': combined['total_trades'],
+            'win_rate': combined['overall_win_rate'],
+            'total_pnl': combined['total_pnl'],
+        })
+        rows.append(row)
+
+    columns = list(StrategyConfig._fields) + ['total_trades', 'win_rate', 'total_pnl']
+    results = pd.DataFrame(rows, columns=columns)
+    return results.sort_values(['total_pnl', 'win_rate'], ascending=False).reset_index(drop=True)
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _float_list(value):
+    return [float(item) for item in value.split(',') if item.strip()]
+
+
+def _macd_list(value):
+    """Đọc danh sách bộ MACD dạng fast:slow:signal, phân tách bằng dấu phẩy"""
+    return [tuple(int(part) for part in item.split(':')) for item in value.split(',') if item.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quét lưới tham số RSI/MACD bằng backtest song song')
+    parser.add_argument('--pairs', default=','.join(main.TRADING_PAIRS), help='Các cặp, phân tách bằng dấu phẩy')
+    parser.add_argument('--timeframe', default=main.RSI_TIMEFRAME)
+    parser.add_argument('--days', type=float, default=90, help='Số ngày dữ liệu')
+    parser.add_argument('--mock', action='store_true', help='Dùng dữ liệu giả lập thay vì tải từ Binance')
+    parser.add_argument('--seed', type=int, default=None, help='Seed cho dữ liệu giả lập')
+    parser.add_argument('--rsi-window', type=_int_list, default=[7, 14, 21])
+    parser.add_argument('--oversold', type=_float_list, default=[20, 25, 30, 35])
+    parser.add_argument('--overbought', type=_float_list, default=[65, 70, 75, 80])
+    parser.add_argument('--exit', type=_float_list, default=[45, 50, 55])
+    parser.add_argument('--macd', type=_macd_list, default=[(12, 26, 9), (8, 21, 5)],
+                        help='Các bộ MACD dạng fast:slow:signal, phân tách bằng dấu phẩy')
+    parser.add_argument('--workers', type=int, default=None, help='Số tiến trình (mặc định: số nhân CPU)')
+    parser.add_argument('--top', type=int, default=20, help='Số kết quả tốt nhất cần in')
+    parser.add_argument('--output', default=None, help='Ghi toàn bộ kết quả ra file CSV')
+    args = parser.parse_args()
+    args.pairs = [pair.strip() for pair in args.pairs.split(',') if pair.strip()]
+
+    macd_params, thresholds = build_grid(args)
+    combinations = len(args.rsi_window) * len(macd_params) * len(thresholds)
+    candles_by_pair = load_candles(args)
+    logger.info(f"Quét {combinations} tổ hợp × {len(candles_by_pair)} cặp "
+                f"trên {args.workers or os.cpu_count()} tiến trình")
+
+    start = time.perf_counter()
+    results = run_sweep(candles_by_pair, args.timeframe, args.rsi_window, macd_params, thresholds, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"📊 KẾT QUẢ QUÉT THAM SỐ ({combinations} tổ hợp × {len(candles_by_pair)} cặp "
+          f"trong {elapsed:.2f} giây)")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(results.head(args.top).to_string(float_format=lambda value: f"{value:.2f}"))
+    print("=" * 60)
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Đã ghi {len(results)} kết quả vào {args.output}")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Trả lời nhanh các câu hỏi chỉ báo có cấu trúc mà không cần gọi LLM
+
+Câu hỏi chỉ gồm cặp tiền, chỉ báo (RSI/MACD) và khung thời gian, ví dụ "btc rsi 1h",
+"eth macd 4h", "sol rsi macd khung ngày", được tính trực tiếp bằng compute_rsi /
+compute_macd và trả lời theo mẫu. Câu hỏi có từ nào khác (hỏi ý kiến, giải thích...)
+được chuyển cho agent LLM.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+from crypto_agent import (RSIInput, MACDInput, COMMON_SYMBOLS, QUOTE, compute_rsi, compute_macd,
+                          tokenize, match_timeframe)
+
+KNOWN_SYMBOLS = set(COMMON_SYMBOLS)
+
+INDICATORS = {"rsi", "macd"}
+
+TIMEFRAME_NAMES = {
+    "1m": "1 phút", "5m": "5 phút", "15m": "15 phút", "30m": "30 phút",
+    "1h": "1 giờ", "4h": "4 giờ", "1d": "ngày", "1w": "tuần",
+}
+
+# Các từ không làm thay đổi ý nghĩa câu hỏi chỉ báo
+FILLER_WORDS = {
+    "khung", "chỉ", "chi", "số", "so", "báo", "bao", "của", "cua", "cho", "xem", "check",
+    "và", "va", "với", "voi", "giá", "gia", "trị", "tri", "hiện", "hien", "tại", "tai",
+    "bây", "bay", "giờ", "gio", "nay", "thế", "the", "nào", "nao", "nhiêu", "nhieu",
+    "ơi", "oi", "nhé", "nhe", "nha", "ạ", "a", "tf", "timeframe",
+}
+
+DISCLAIMER = ("Lưu ý nha bạn iu: Đây chỉ là phân tích kỹ thuật tham khảo thôi, không phải lời khuyên tài chính nha. "
+              "Bạn cần tự chịu trách nhiệm với quyết định giao dịch của mình nhé! 🌸✨")
+
+
+class IndicatorQuery(NamedTuple):
+    symbol: str
+    timeframe: str
+    indicators: List[str]
+
+
+def parse_indicator_query(text: str) -> Optional[IndicatorQuery]:
+    """Nhận diện câu hỏi chỉ báo có cấu trúc, None nếu cần LLM trả lời"""
+    tokens = tokenize(text)
+    symbol = timeframe = None
+    indicators = []
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        matched_timeframe, length = match_timeframe(tokens, i)
+        if matched_timeframe is not None:
+            if timeframe not in (None, matched_timeframe):
+                return None  # Nhiều khung thời gian: để agent xử lý
+            timeframe = matched_timeframe
+            i += length
+            continue
+
+        if token in INDICATORS:
+            if token not in indicators:
+                indicators.append(token)
+        elif token.endswith(QUOTE) and token[:-len(QUOTE)] in KNOWN_SYMBOLS:
+            token = token[:-len(QUOTE)]
+            if symbol not in (None, token):
+                return None
+            symbol = token
+        elif token in KNOWN_SYMBOLS:
+            if symbol not in (None, token):
+                return None  # Nhiều cặp tiền: để agent xử lý
+            symbol = token
+        elif token not in FILLER_WORDS and token != QUOTE:
+            return None  # Câu hỏi mở
+        i += 1
+
+    if symbol is None or not indicators:
+        return None
+    return IndicatorQuery(f"{symbol.upper()}/USDT", timeframe or "1h", indicators)
+
+
+def _rsi_lines(result: Dict) -> List[str]:
+    rsi = result['rsi']
+    if rsi > 70:
+        comment = "Thị trường đang quá mua rồi nha, cẩn thận có áp lực bán đó! 📉"
+    elif rsi < 30:
+        comment = "Thị trường đang quá bán, có thể có cơ hội mua xinh đẹp nè! 📈"
+    elif rsi >= 50:
+        comment = "RSI trên 50, thị trường cân bằng và hơi nghiêng về phe mua ✨"
+    else:
+        comment = "RSI dưới 50, thị trường cân bằng và hơi nghiêng về phe bán ✨"
+    return [f"🎯 RSI: {rsi:.2f}", f"💡 {comment}"]
+
+
+def _macd_lines(result: Dict) -> List[str]:
+    macd, signal, histogram = result['macd'], result['signal'], result['histogram']
+    trend = "MACD > Signal: xu hướng tăng đang mạnh nha! 📈" if macd > signal \
+        else "MACD < Signal: xu hướng giảm đang chiếm ưu thế đó! 📉"
+    momentum = "Histogram > 0: động lực tăng giá đang mạnh 💚" if histogram > 0 \
+        else "Histogram < 0: động lực giảm giá đang mạnh 💛"
+    return [f"🎯 MACD: {macd:.4f} | Signal: {signal:.4f} | Histogram: {histogram:.4f}",
+            f"💡 {trend}", f"💡 {momentum}"]
+
+
+def render_indicator_reply(query: IndicatorQuery) -> str:
+    """Tính các chỉ báo được hỏi và trả lời theo mẫu"""
+    lines = [f"📊 {query.symbol} khung {TIMEFRAME_NAMES[query.timeframe]}"]
+    for indicator in query.indicators:
+        if indicator == "rsi":
+            lines.extend(_rsi_lines(compute_rsi(RSIInput(symbol=query.symbol, timeframe=query.timeframe))))
+        else:
+            lines.extend(_macd_lines(compute_macd(MACDInput(symbol=query.symbol, timeframe=query.timeframe))))
+    lines.append("")
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
+
+
+def fast_reply(text: str) -> Optional[str]:
+    """Trả lời theo mẫu nếu là câu hỏi chỉ báo có cấu trúc, None nếu cần LLM"""
+    query = parse_indicator_query(text)
+    if query is None:
+        return None
+    return render_indicator_reply(query)
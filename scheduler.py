@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Lập lịch chu kỳ kiểm tra theo mốc đóng nến
+
+Các mốc chạy là bội số của `period` tính từ epoch (ví dụ 300 giây -> :00, :05, :10...),
+nên với period chia hết khung thời gian thì luôn có một lần chạy ngay sau khi đóng nến.
+Các cặp được rải đều trong `stagger` giây sau mốc để không dồn request cùng lúc. Nếu một
+chu kỳ chạy quá lâu và bỏ lỡ mốc, chu kỳ kế tiếp chạy ngay cho mốc mới nhất (không chạy
+bù từng mốc đã lỡ vì dữ liệu lấy về luôn là mới nhất).
+"""
+
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CycleScheduler:
+    """Chạy các job theo mốc thời gian cố định, đo độ trễ so với lịch"""
+
+    def __init__(self, period, delay=0.0, stagger=0.0, clock=time.time):
+        self.period = period
+        self.delay = delay  # Chờ thêm sau mốc để sàn kịp chốt nến vừa đóng
+        self.stagger = stagger
+        self.clock = clock
+        # Thống kê
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.lag_samples = 0
+        self._tasks = {}  # tên job -> task vòng lặp của job
+        self._offsets = {}  # tên job -> độ lệch (giây) sau mốc
+        self._failed = None
+
+    def next_boundary(self, now):
+        """Mốc kế tiếp sau thời điểm `now`"""
+        return (now // self.period + 1) * self.period
+
+    def stats(self):
+        return {
+            'ticks': self.ticks,
+            'missed_ticks': self.missed_ticks,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'avg_lag': self.total_lag / self.lag_samples if self.lag_samples else 0.0,
+        }
+
+    async def _sleep_until(self, target):
+        delay = target - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _record_lag(self, lag):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.total_lag += lag
+        self.lag_samples += 1
+
+    async def _job_loop(self, name, job, offset, run_now):
+        """Vòng lặp của một job: chạy sau mỗi mốc + delay + offset, bỏ các mốc đã lỡ"""
+        if run_now:
+            boundary = self.clock() - self.delay - offset  # Chu kỳ đầu chạy ngay
+        else:
+            boundary = self.next_boundary(self.clock())
+        while True:
+            slot = boundary + self.delay + offset
+            await self._sleep_until(slot)
+            started = self.clock()
+            self._record_lag(max(started - slot, 0.0))
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Lỗi trong chu kỳ của {name}: {e}")
+            self.ticks += 1
+            elapsed = self.clock() - started
+            logger.debug("⏱️ %s: chu kỳ %.2fs, trễ lịch %.0f ms", name, elapsed, self.last_lag * 1000)
+
+            boundary = self.next_boundary(boundary)
+            latest = self.next_boundary(self.clock() - self.delay - offset) - self.period
+            if latest > boundary:
+                # Chu kỳ vừa rồi kéo dài qua nhiều mốc: bỏ các mốc đã lỡ, chạy ngay cho mốc mới nhất
+                missed = int(round((latest - boundary) / self.period))
+                self.missed_ticks += missed
+                logger.warning(f"Chu kỳ của {name} chạy quá lâu ({elapsed:.1f}s), bỏ qua {missed} mốc, chạy bù ngay")
+                boundary = latest
+
+    async def run(self, jobs, run_now=True):
+        """Chạy `jobs` [(tên, hàm async không tham số)] mãi mãi theo lịch
+
+        Job thứ i chạy sau mỗi mốc delay + i * stagger / n giây. Mỗi job có vòng lặp riêng
+        nên một cặp chạy chậm chỉ bỏ lỡ mốc của chính nó. `run_now`: chạy một chu kỳ ngay
+        khi khởi động thay vì đợi tới mốc đầu tiên.
+        """
+        step = self.stagger / len(jobs) if jobs else 0.0
+        self._failed = asyncio.get_running_loop().create_future()
+        for i, (name, job) in enumerate(jobs):
+            self._start(name, job, i * step, run_now)
+        try:
+            # Chỉ kết thúc khi vòng lặp của một job gặp lỗi ngoài ý muốn (hoặc bị hủy)
+            await self._failed
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            self._tasks = {}
+            self._offsets = {}
+
+    def _start(self, name, job, offset, run_now):
+        task = asyncio.ensure_future(self._job_loop(name, job, offset, run_now))
+        task.add_done_callback(self._job_done)
+        self._tasks[name] = task
+        self._offsets[name] = offset
+
+    def _free_offset(self):
+        """Giữa khoảng trống lớn nhất giữa độ lệch của các job đang chạy trong [0, stagger)"""
+        if not self.stagger or not self._offsets:
+            return 0.0
+        offsets = sorted(self._offsets.values())
+        gaps = zip(offsets, offsets[1:] + [offsets[0] + self.stagger])
+        start, end = max(gaps, key=lambda gap: gap[1] - gap[0])
+        return (start + end) / 2 % self.stagger
+
+    def _job_done(self, task):
+        if not task.cancelled() and task.exception() is not None and not self._failed.done():
+            self._failed.set_exception(task.exception())
+
+    def jobs(self):
+        return list(self._tasks)
+
+    def add_job(self, name, job, run_now=True):
+        """Thêm job khi lịch đang chạy (ví dụ cặp mới sau khi đổi cấu hình)"""
+        if name in self._tasks:
+            return
+        self._start(name, job, self._free_offset(), run_now)
+
+    def remove_job(self, name):
+        """Dừng job `name` khi lịch đang chạy"""
+        task = self._tasks.pop(name, None)
+        self._offsets.pop(name, None)
+        if task is not None:
+            task.cancel()
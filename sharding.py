@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Chạy bot trên nhiều tiến trình worker, mỗi worker theo dõi một phần danh sách cặp
+
+- Cặp được chia cho các shard bằng rendezvous hashing (một dạng consistent hashing): mỗi
+  cặp luôn thuộc cùng một shard qua các lần khởi động, thêm/bớt cặp không làm xáo trộn
+  các cặp khác, đổi số shard chỉ chuyển khoảng 1/N số cặp.
+- Worker không giữ bot Telegram: cảnh báo được gửi qua hàng đợi đa tiến trình về
+  supervisor, nơi có AlertDispatcher duy nhất (giới hạn tốc độ và gộp tin cho mọi cặp);
+  message ID của tin đã gửi được trả lại để tin thoát lệnh reply đúng tin mở lệnh.
+- Log của worker cũng được chuyển về supervisor và ghi vào cùng các file log.
+- Worker định kỳ gửi thống kê giao dịch để supervisor tổng hợp; worker bị chết được khởi
+  động lại với đúng các cặp của nó.
+"""
+
+import os
+import time
+import queue
+import signal
+import asyncio
+import hashlib
+import logging
+import itertools
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger(__name__)
+
+# Tin nhắn đã gửi trả về cho worker (CryptoSignalBot chỉ dùng message_id)
+SentMessage = namedtuple('SentMessage', 'message_id')
+
+MAX_TRACKED_ALERTS = 10000  # Số cảnh báo gần nhất còn giữ Future để tin sau reply vào
+
+
+def _weight(key, shard):
+    digest = hashlib.blake2b(f"{shard}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def shard_of(key, shards):
+    """Shard (0..shards-1) của `key`: shard có trọng số hash cao nhất (rendezvous hashing)"""
+    return max(range(shards), key=lambda shard: _weight(key, shard))
+
+
+def assign_shards(keys, shards):
+    """Chia `keys` cho `shards` shard, giữ nguyên thứ tự: {shard: [key, ...]}"""
+    assignment = {shard: [] for shard in range(shards)}
+    for key in keys:
+        assignment[shard_of(key, shards)].append(key)
+    return assignment
+
+
+def _get(source, timeout=0.5):
+    # Chờ có giới hạn để task đọc hàng đợi hủy được
+    try:
+        return source.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+class WorkerLink:
+    """Các hàng đợi nối một worker với supervisor (truyền được sang tiến trình con)"""
+
+    def __init__(self, shard, requests, results, logs):
+        self.shard = shard
+        self.requests = requests  # worker -> supervisor: cảnh báo và thống kê (dùng chung)
+        self.results = results  # supervisor -> worker: message ID của cảnh báo đã gửi
+        self.logs = logs  # worker -> supervisor: bản ghi log
+
+    def attach_logging(self, *names):
+        """Chuyển mọi log của worker về supervisor thay vì tự ghi file
+
+        `names` là các logger có handler riêng (ví dụ logger tín hiệu), cho đi qua root.
+        """
+        root = logging.getLogger()
+        for name in names:
+            named = logging.getLogger(name)
+            for handler in named.handlers[:]:
+                named.removeHandler(handler)
+            named.propagate = True
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(QueueHandler(self.logs))
+
+    async def watch_supervisor(self, on_exit, interval=1.0):
+        """Gọi `on_exit()` khi tiến trình supervisor không còn (ví dụ bị SIGKILL)"""
+        parent = multiprocessing.parent_process()
+        while parent is not None and parent.is_alive():
+            await asyncio.sleep(interval)
+        on_exit()
+
+    def report_stats(self, stats_by_pair):
+        """Gửi thống kê giao dịch (get_trading_stats theo bot) của worker cho supervisor"""
+        self.requests.put(('stats', self.shard, stats_by_pair))
+
+
+class RemoteAlerts:
+    """Thay AlertDispatcher trong worker: chuyển cảnh báo về dispatcher của supervisor"""
+
+    def __init__(self, link):
+        self.link = link
+        # ID cảnh báo kèm pid để kết quả của worker cũ (trước khi khởi động lại) bị bỏ qua
+        self._ids = ((os.getpid(), n) for n in itertools.count())
+        self._pending = {}  # alert_id -> Future
+        self._alert_ids = {}  # Future -> alert_id, để tin sau reply vào tin chưa gửi xong
+        self._reader = None
+        self.sent = 0
+        self.failed = 0
+
+    def queue_depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'sent': self.sent,
+            'digests': 0,
+            'retries': 0,
+            'failed': self.failed,
+            'latency_p50': 0.0,
+            'latency_p95': 0.0,
+        }
+
+    def submit(self, chat_id, text, message_thread_id=None, reply_to=None):
+        """Như AlertDispatcher.submit: trả về Future nhận tin nhắn đã gửi (None nếu thất bại)"""
+        loop = asyncio.get_running_loop()
+        if self._reader is None or self._reader.done():
+            self._reader = loop.create_task(self._read_results())
+        reply_alert = None
+        if isinstance(reply_to, asyncio.Future):
+            if reply_to.done():
+                message = reply_to.result()
+                reply_to = message.message_id if message is not None else None
+            else:
+                reply_alert, reply_to = self._alert_ids.get(reply_to), None
+        alert_id = next(self._ids)
+        future = loop.create_future()
+        self._pending[alert_id] = future
+        self._alert_ids[future] = alert_id
+        self.link.requests.put(('alert', self.link.shard, alert_id, chat_id, text, message_thread_id,
+                                reply_to, reply_alert))
+        return future
+
+    async def _read_results(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            result = await loop.run_in_executor(None, _get, self.link.results)
+            if result is None:
+                continue
+            alert_id, message_id = result
+            future = self._pending.pop(alert_id, None)
+            if future is None:
+                continue
+            self._alert_ids.pop(future, None)
+            if future.done():
+                continue
+            if message_id is None:
+                self.failed += 1
+                future.set_result(None)
+            else:
+                self.sent += 1
+                future.set_result(SentMessage(message_id))
+
+    async def close(self, timeout=10):
+        """Chờ supervisor gửi xong các cảnh báo đang chờ (tối đa `timeout` giây)"""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"Còn {len(self._pending)} cảnh báo chưa có kết quả khi dừng worker")
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+
+class _ForwardHandler(logging.Handler):
+    """Chuyển bản ghi log từ worker cho logger cùng tên trong supervisor"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+class ShardSupervisor:
+    """Chạy và giám sát các worker, gửi cảnh báo và tổng hợp thống kê cho tất cả
+
+    `target(link, pairs, *args)` là hàm chạy trong mỗi worker (phải import được từ tiến
+    trình con). `report(supervisor, final)` được gọi mỗi `report_interval` giây và khi dừng.
+    """
+
+    def __init__(self, pairs, workers, target, args=(), alerts=None, report=None,
+                 report_interval=60, restart_delay=5, stop_timeout=15):
+        self.workers = workers
+        # Shard không có cặp nào thì không cần worker
+        self.assignment = {shard: keys for shard, keys in assign_shards(pairs, workers).items() if keys}
+        self.target = target
+        self.args = args
+        self.alerts = alerts
+        self.report = report
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.stop_timeout = stop_timeout
+        # spawn: tiến trình con không kế thừa event loop/luồng ghi log/kết nối của supervisor
+        self._context = multiprocessing.get_context('spawn')
+        self.requests = self._context.Queue()
+        self.logs = self._context.Queue()
+        self.links = {}
+        self.processes = {}
+        self.stats_by_shard = {}
+        self.restarts = 0
+        self._restart_at = {}
+        self._alert_futures = OrderedDict()  # alert_id của worker -> Future của dispatcher
+
+    def alive(self):
+        return sum(process.is_alive() for process in self.processes.values())
+
+    def stats_by_pair(self):
+        """Thống kê mới nhất của mọi bot trên mọi worker"""
+        combined = {}
+        for stats in self.stats_by_shard.values():
+            combined.update(stats)
+        return combined
+
+    def _link(self, shard):
+        if shard not in self.links:
+            link = self.links[shard] = WorkerLink(shard, self.requests, self._context.Queue(), self.logs)
+            # Kết quả gửi cho worker đã chết không được làm treo supervisor khi thoát
+            link.results.cancel_join_thread()
+        return self.links[shard]
+
+    def update_pairs(self, pairs):
+        """Chia lại danh sách cặp mới (khi đổi cấu hình)
+
+        Worker đang chạy tự đọc lại cấu hình và thêm/bớt các cặp thuộc shard của nó; ở đây chỉ
+        cập nhật danh sách dùng khi khởi động lại worker và chạy worker cho shard vừa có cặp.
+        """
+        for shard, keys in assign_shards(pairs, self.workers).items():
+            if shard in self.assignment:
+                self.assignment[shard] = keys
+            elif keys:
+                self.assignment[shard] = keys
+                self.start_worker(shard)
+
+    def start_worker(self, shard):
+        pairs = self.assignment[shard]
+        process = self._context.Process(target=self.target, args=(self._link(shard), pairs, *self.args),
+                                        name=f"shard-{shard}", daemon=True)
+        process.start()
+        self.processes[shard] = process
+        logger.info(f"🧩 Worker shard {shard} (pid {process.pid}): {len(pairs)} cặp")
+
+    def stop_workers(self):
+        """Gửi SIGTERM cho mọi worker và chờ chúng dừng (gửi nốt cảnh báo, thống kê)"""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for shard, process in self.processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker shard {shard} không dừng sau {self.stop_timeout}s, buộc dừng")
+                process.kill()
+                process.join()
+
+    async def run(self):
+        """Chạy các worker cho tới khi bị hủy, rồi dừng chúng và báo cáo lần cuối"""
+        loop = asyncio.get_running_loop()
+        # SIGTERM (systemd, docker stop) dừng các worker theo thứ tự như Ctrl+C
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        listener = QueueListener(self.logs, _ForwardHandler())
+        listener.start()
+        relay = loop.create_task(self._relay())
+        reporter = loop.create_task(self._report_loop()) if self.report is not None else None
+        logger.info(f"🧩 Chia {sum(len(keys) for keys in self.assignment.values())} cặp cho "
+                    f"{len(self.assignment)} worker")
+        try:
+            for shard in self.assignment:
+                self.start_worker(shard)
+            await self._watch()
+        except asyncio.CancelledError:
+            logger.info("Đang dừng các worker...")
+        finally:
+            # SIGTERM lặp lại (`timeout`, systemd gửi cho cả nhóm tiến trình) không được hủy quá trình
+            # dừng đang chạy: vẫn chờ worker, chuyển hết cảnh báo và báo cáo lần cuối
+            loop.add_signal_handler(signal.SIGTERM, logger.info, "Đang dừng các worker, bỏ qua SIGTERM")
+            try:
+                if reporter is not None:
+                    reporter.cancel()
+                await loop.run_in_executor(None, self.stop_workers)
+                # Worker đã dừng: mọi tin của chúng đã nằm trong hàng đợi trước tin dừng này
+                self.requests.put(('stop',))
+                await relay
+                if self.report is not None:
+                    self.report(self, True)
+                if self.alerts is not None:
+                    await self.alerts.close()
+                listener.stop()
+            finally:
+                loop.remove_signal_handler(signal.SIGTERM)
+
+    async def _watch(self, interval=1.0):
+        """Khởi động lại worker bị chết (sau `restart_delay` giây) với đúng các cặp của nó"""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for shard, process in list(self.processes.items()):
+                if process.exitcode is None:
+                    continue
+                if shard not in self._restart_at:
+                    logger.error(f"Worker shard {shard} (pid {process.pid}) đã dừng với mã {process.exitcode}, "
+                                 f"khởi động lại sau {self.restart_delay}s")
+                    self._restart_at[shard] = now + self.restart_delay
+                elif now >= self._restart_at[shard]:
+                    del self._restart_at[shard]
+                    self.restarts += 1
+                    self.start_worker(shard)
+
+    async def _relay(self):
+        """Nhận cảnh báo và thống kê từ các worker cho tới tin dừng"""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, _get, self.requests)
+            if message is None:
+                continue
+            if message[0] == 'stop':
+                return
+            if message[0] == 'stats':
+                self.stats_by_shard[message[1]] = message[2]
+            elif message[0] == 'alert':
+                try:
+                    self._submit(*message[1:])
+                except Exception as e:
+                    logger.error(f"Lỗi khi chuyển cảnh báo từ worker shard {message[1]}: {e}")
+
+    def _submit(self, shard, alert_id, chat_id, text, message_thread_id, reply_to, reply_alert):
+        if reply_alert is not None:
+            # Tin gốc chưa gửi xong khi worker gửi tin trả lời: reply vào Future của nó
+            reply_to = self._alert_futures.get(reply_alert)
+        future = self.alerts.submit(chat_id, text, message_thread_id, reply_to=reply_to)
+        self._alert_futures[alert_id] = future
+        while len(self._alert_futures) > MAX_TRACKED_ALERTS:
+            self._alert_futures.popitem(last=False)
+        future.add_done_callback(lambda sent: self._return_result(shard, alert_id, sent))
+
+    def _return_result(self, shard, alert_id, sent):
+        message = sent.result() if not sent.cancelled() else None
+        self.links[shard].results.put((alert_id, message.message_id if message is not None else None))
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            try:
+                self.report(self, False)
+            except Exception as e:
+                logger.error(f"Lỗi khi tổng hợp thống kê các worker: {e}")
+
+
+def ignore_interrupt():
+    """Worker bỏ qua Ctrl+C: supervisor tự dừng các worker theo thứ tự bằng SIGTERM"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
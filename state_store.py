@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Lưu trạng thái vị thế/PnL của các bot vào SQLite để khôi phục sau khi khởi động lại
+
+Bảng `positions` giữ trạng thái mới nhất của mỗi bot (cặp + khung thời gian), bảng
+`transitions` ghi lại mọi lần vào/thoát lệnh. `record()` chỉ ghi vào bộ nhớ; các thay đổi
+được ghi xuống đĩa theo lô trong một transaction (`flush()`), với WAL và
+`synchronous=NORMAL` nên không phải fsync mỗi lần ghi. Khởi động chỉ cần một câu SELECT.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = ('current_position', 'entry_price', 'entry_time', 'entry_message_id',
+                'total_pnl', 'trade_count', 'winning_trades', 'last_alert_time')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    bot_key TEXT PRIMARY KEY,
+    current_position TEXT,
+    entry_price REAL,
+    entry_time REAL,
+    entry_message_id INTEGER,
+    total_pnl REAL NOT NULL DEFAULT 0,
+    trade_count INTEGER NOT NULL DEFAULT 0,
+    winning_trades INTEGER NOT NULL DEFAULT 0,
+    last_alert_time REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    bot_key TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    price REAL,
+    pnl REAL
+);
+"""
+
+UPSERT = (f"INSERT INTO positions (bot_key, {', '.join(STATE_FIELDS)}, updated_at) "
+          f"VALUES ({', '.join('?' * (len(STATE_FIELDS) + 2))}) "
+          f"ON CONFLICT(bot_key) DO UPDATE SET "
+          + ', '.join(f"{field}=excluded.{field}" for field in STATE_FIELDS + ('updated_at',)))
+
+
+class StateStore:
+    """Kho trạng thái bot trên SQLite (WAL) với ghi theo lô"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._pending = {}  # bot_key -> trạng thái mới nhất chưa ghi
+        self._transitions = []
+        # Thống kê
+        self.flushes = 0
+        self.rows_written = 0
+
+    def load(self):
+        """Trạng thái đã lưu của mọi bot: {bot_key: {trường: giá trị}}"""
+        rows = self._conn.execute(f"SELECT bot_key, {', '.join(STATE_FIELDS)} FROM positions").fetchall()
+        return {row[0]: dict(zip(STATE_FIELDS, row[1:])) for row in rows}
+
+    def record(self, bot_key, state, transition=None):
+        """Ghi nhận trạng thái mới của bot (và lần vào/thoát lệnh nếu có), chưa ghi xuống đĩa"""
+        self._pending[bot_key] = state
+        if transition is not None:
+            self._transitions.append((self.clock(), bot_key, transition['signal'],
+                                      transition.get('price'), transition.get('pnl')))
+
+    def pending(self):
+        return len(self._pending) + len(self._transitions)
+
+    def flush(self):
+        """Ghi mọi thay đổi đang chờ trong một transaction, trả về số dòng đã ghi"""
+        if not self._pending and not self._transitions:
+            return 0
+        now = self.clock()
+        states = [(key, *(state.get(field) for field in STATE_FIELDS), now) for key, state in self._pending.items()]
+        transitions = self._transitions
+        self._pending, self._transitions = {}, []
+        try:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(UPSERT, states)
+                self._conn.executemany(
+                    "INSERT INTO transitions (time, bot_key, signal, price, pnl) VALUES (?, ?, ?, ?, ?)", transitions
+                )
+        except Exception as e:
+            logger.error(f"Lỗi ghi trạng thái vào {self.path}: {e}")
+            # Giữ lại để ghi ở lần sau, không ghi đè trạng thái mới hơn
+            for state in states:
+                self._pending.setdefault(state[0], dict(zip(STATE_FIELDS, state[1:-1])))
+            self._transitions = transitions + self._transitions
+            return 0
+        self.flushes += 1
+        self.rows_written += len(states) + len(transitions)
+        return len(states) + len(transitions)
+
+    async def run_flusher(self, interval=1.0):
+        """Ghi các thay đổi xuống đĩa mỗi `interval` giây"""
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -1,15 +1,111 @@
 import os
+import time
+import asyncio
+import logging
 import httpx
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
-from crypto_agent import create_agent
+from crypto_agent import create_agent, create_llm, create_memory, ask_agent, trim_memory
+from query_router import parse_indicator_query, render_indicator_reply
 
 # Load environment variables
 load_dotenv()
 
-# Initialize crypto agent
-crypto_agent = create_agent()
+logger = logging.getLogger(__name__)
+
+AGENT_MAX_CHATS = int(os.getenv("AGENT_MAX_CHATS", 200))  # Số chat tối đa giữ agent trong RAM
+AGENT_IDLE_TTL = float(os.getenv("AGENT_IDLE_TTL", 3600))  # Giây không hoạt động trước khi bỏ agent của chat
+
+class ChatAgentPool:
+    """Mỗi chat có agent và bộ nhớ hội thoại riêng, dùng chung một LLM
+
+    Chat lâu không hoạt động (quá `idle_ttl` giây) hoặc ít dùng nhất khi vượt quá
+    `max_chats` bị xóa khỏi bộ nhớ (LRU).
+    """
+
+    def __init__(self, max_chats=AGENT_MAX_CHATS, idle_ttl=AGENT_IDLE_TTL, llm=None):
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self.llm = llm if llm is not None else create_llm()
+        # chat_id -> [agent (None khi chat chỉ hỏi theo mẫu), bộ nhớ hội thoại, lần dùng cuối]
+        self._agents = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._agents)
+
+    def _entry(self, chat_id):
+        now = time.monotonic()
+        entry = self._agents.pop(chat_id, None)
+        # Dọn trước khi thêm lại để không xóa chính chat đang hỏi
+        self._evict(now, self.max_chats - 1)
+        if entry is None:
+            entry = [None, create_memory(), now]
+        entry[2] = now
+        self._agents[chat_id] = entry
+        return entry
+
+    def get(self, chat_id):
+        """Lấy (hoặc tạo) agent của một chat"""
+        entry = self._entry(chat_id)
+        if entry[0] is None:
+            entry[0] = create_agent(self.llm, entry[1])
+        return entry[0]
+
+    def memory(self, chat_id):
+        """Lấy (hoặc tạo) bộ nhớ hội thoại của một chat mà không tạo agent
+
+        Agent được tạo khi chat hỏi câu đầu tiên cần LLM.
+        """
+        return self._entry(chat_id)[1]
+
+    def _evict(self, now, limit):
+        evicted = 0
+        while self._agents:
+            oldest_chat, (_, _, last_used) = next(iter(self._agents.items()))
+            if len(self._agents) <= limit and now - last_used < self.idle_ttl:
+                break
+            del self._agents[oldest_chat]
+            evicted += 1
+        if evicted:
+            self.evicted += evicted
+            logger.info(f"🧹 Đã xóa bộ nhớ hội thoại của {evicted} chat | Còn {len(self._agents)} chat")
+
+    def stats(self):
+        """Lượng bộ nhớ hội thoại đang giữ: số chat, số tin nhắn và tổng số ký tự"""
+        messages = 0
+        memory_chars = 0
+        for _, memory, _ in self._agents.values():
+            chat_messages = memory.chat_memory.messages
+            messages += len(chat_messages)
+            memory_chars += sum(len(message.content) for message in chat_messages)
+        return {'chats': len(self._agents), 'messages': messages,
+                'memory_chars': memory_chars, 'evicted': self.evicted}
+
+def remember(memory, query: str, response: str) -> None:
+    """Ghi câu hỏi/trả lời không qua LLM vào bộ nhớ để agent hiểu ngữ cảnh câu hỏi tiếp theo
+
+    Chỉ gọi khi đang giữ khóa của chat để không sửa bộ nhớ trong lúc agent của chat đang chạy.
+    """
+    memory.save_context({"input": query}, {"output": response})
+    trim_memory(memory)
+
+# Initialize crypto agents (một agent cho mỗi chat)
+agent_pool = ChatAgentPool()
+
+# Agent (LLM + Binance) chạy đồng bộ nên được đưa sang thread pool để không chặn event loop.
+# Số thread là giới hạn số câu hỏi được xử lý đồng thời trên toàn bot.
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", 8))
+AGENT_SLOW_NOTICE = float(os.getenv("AGENT_SLOW_NOTICE", 15))  # Giây trước khi báo đang xử lý lâu
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", 90))  # Giây tối đa chờ một câu trả lời
+
+agent_executor = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix="agent")
+
+# Mỗi chat xử lý lần lượt từng câu hỏi: chat_id -> [lock, số câu hỏi đang chờ/chạy]
+chat_queues = {}
 
 def get_proxy_config():
     """Get proxy configuration from environment variables."""
@@ -38,6 +134,72 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         f"Ví dụ: @{context.bot.username} phân tích BTC/USDT"
     )
 
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Lệnh /stats: lượng bộ nhớ hội thoại đang giữ và số câu hỏi đang xử lý"""
+    stats = agent_pool.stats()
+    pending = sum(queue[1] for queue in chat_queues.values())
+    await update.message.reply_text(
+        f"🧠 Bộ nhớ hội thoại: {stats['chats']} chat, {stats['messages']} tin nhắn, "
+        f"{stats['memory_chars']} ký tự | Đã xóa: {stats['evicted']} chat\n"
+        f"⏳ Câu hỏi đang chờ/chạy: {pending}"
+    )
+
+def _release_chat(chat_id, queue) -> None:
+    queue[0].release()
+    queue[1] -= 1
+    if queue[1] == 0:
+        del chat_queues[chat_id]
+
+def answer_indicator_query(memory, query: str, indicator_query) -> str:
+    """Trả lời theo mẫu rồi ghi vào bộ nhớ của chat (chạy trong thread pool khi đang giữ khóa của chat)"""
+    response = render_indicator_reply(indicator_query)
+    remember(memory, query, response)
+    return response
+
+async def run_agent(chat_id, query: str, processing_msg) -> str:
+    """Chạy agent trong thread pool, lần lượt theo từng chat, có báo chậm và timeout
+
+    Khóa của chat chỉ được trả khi thread thực sự chạy xong, kể cả khi câu trả lời đã quá
+    AGENT_TIMEOUT: câu hỏi tiếp theo không chạy song song trên cùng agent/bộ nhớ và không
+    chiếm thêm thread của AGENT_WORKERS trong lúc thread cũ vẫn chạy.
+    """
+    loop = asyncio.get_running_loop()
+    queue = chat_queues.setdefault(chat_id, [asyncio.Lock(), 0])
+    queue[1] += 1
+    lock = queue[0]
+    try:
+        if lock.locked():
+            await processing_msg.edit_text("⏳ Đang chờ trả lời câu hỏi trước...")
+        await lock.acquire()
+    except BaseException:
+        queue[1] -= 1
+        if queue[1] == 0:
+            del chat_queues[chat_id]
+        raise
+
+    try:
+        # Câu hỏi chỉ báo có cấu trúc ("btc rsi 1h") được trả lời theo mẫu, không cần LLM,
+        # nhưng vẫn xếp hàng theo chat để trả lời đúng thứ tự và ghi bộ nhớ an toàn
+        indicator_query = parse_indicator_query(query)
+        if indicator_query is not None:
+            future = loop.run_in_executor(agent_executor, answer_indicator_query,
+                                          agent_pool.memory(chat_id), query, indicator_query)
+        else:
+            future = loop.run_in_executor(agent_executor, ask_agent, agent_pool.get(chat_id), query)
+    except BaseException:
+        _release_chat(chat_id, queue)
+        raise
+    future.add_done_callback(lambda _: _release_chat(chat_id, queue))
+
+    # shield: hết thời gian chờ không hủy `future`, khóa vẫn được giữ tới khi thread xong
+    if indicator_query is not None:
+        return await asyncio.wait_for(asyncio.shield(future), AGENT_TIMEOUT)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), AGENT_SLOW_NOTICE)
+    except asyncio.TimeoutError:
+        await processing_msg.edit_text("⏳ Vẫn đang phân tích, vui lòng chờ thêm chút nhé...")
+    return await asyncio.wait_for(asyncio.shield(future), max(AGENT_TIMEOUT - AGENT_SLOW_NOTICE, 0))
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle messages that mention the bot."""
     message = update.message.text
@@ -55,9 +217,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         try:
             # Get response from crypto agent
-            response = crypto_agent.run(query)
+            response = await run_agent(update.effective_chat.id, query, processing_msg)
             # Update the processing message with results
             await processing_msg.edit_text(response)
+        except asyncio.TimeoutError:
+            await processing_msg.edit_text(
+                "⌛ Phân tích mất quá nhiều thời gian. Vui lòng thử lại sau."
+            )
         except Exception as e:
             # Update the processing message with error
             await processing_msg.edit_text(
@@ -66,6 +232,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 def main() -> None:
     """Start the bot."""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=logging.INFO
+    )
     # Get proxy configuration
     proxy_url = get_proxy_config()
     
@@ -79,10 +250,12 @@ def main() -> None:
     else:
         print("🔗 Kết nối trực tiếp (không sử dụng proxy)")
     
-    application = builder.build()
+    # Xử lý nhiều tin nhắn cùng lúc thay vì lần lượt từng update
+    application = builder.concurrent_updates(True).build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("stats", show_stats))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     print("🤖 Bot đang khởi động...")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Các module của bot nằm ở thư mục gốc của repo (không phải package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,151 @@
+"""RSI/MACD tăng dần của indicators.py phải trùng với thư viện `ta` trên cùng chuỗi giá"""
+
+import numpy as np
+import pandas as pd
+from ta.momentum import RSIIndicator
+from ta.trend import MACD
+
+from indicators import IndicatorState, IndicatorEngine, CrossSectionEngine, stack_candles
+
+WINDOW = 100  # Số nến mỗi lần đồng bộ, như CANDLE_LIMIT của bot
+TIMEFRAME_MS = 60_000
+TOLERANCE = dict(rtol=1e-9, atol=1e-9)
+
+
+def _closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 20000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def _timestamps(n, start=0):
+    return (np.arange(n) + start) * TIMEFRAME_MS
+
+
+def _reference(closes):
+    """(rsi, macd, signal, histogram) của từng nến tính bằng `ta`"""
+    close = pd.Series(closes, dtype=np.float64)
+    macd = MACD(close=close, window_fast=12, window_slow=26, window_sign=9)
+    return np.column_stack([RSIIndicator(close=close, window=14).rsi(), macd.macd(),
+                            macd.macd_signal(), macd.macd_diff()])
+
+
+def _forming_prices(close, rng):
+    """Các giá của nến đang hình thành trước khi đóng ở `close`"""
+    return [close * (1 + rng.normal(0, 0.003)) for _ in range(2)] + [close]
+
+
+def test_state_update_matches_ta():
+    closes = _closes(300)
+    state = IndicatorState()
+    streamed = np.array([state.update(close) for close in closes])
+    np.testing.assert_allclose(streamed, _reference(closes), **TOLERANCE)
+
+    # Nến đang hình thành (closed=False) không làm thay đổi trạng thái
+    forming = state.update(closes[-1] * 1.01, closed=False)
+    np.testing.assert_allclose(forming, _reference(np.append(closes, closes[-1] * 1.01))[-1], **TOLERANCE)
+    np.testing.assert_allclose(state.update(closes[-1] * 1.01, closed=False), forming, **TOLERANCE)
+
+
+def test_engine_sync_forming_candle_then_close():
+    closes = _closes(260, seed=1)
+    timestamps = _timestamps(len(closes))
+    rng = np.random.default_rng(2)
+    engine = IndicatorEngine()
+    key = ('BTC/USDT', '1m')
+
+    for i in range(30, len(closes)):
+        start = max(0, i + 1 - WINDOW)
+        window_closes = closes[start:i + 1].copy()
+        # Nến cuối được cập nhật nhiều lần khi đang hình thành rồi đóng ở giá cuối cùng
+        for price in _forming_prices(closes[i], rng):
+            window_closes[-1] = price
+            values = engine.sync(key, timestamps[start:i + 1], window_closes)
+            expected = _reference(np.append(closes[:i], price))
+            np.testing.assert_allclose(values[-1], expected[-1], **TOLERANCE)
+            np.testing.assert_allclose(values[:-1], expected[start:i], **TOLERANCE)
+
+
+def test_engine_sync_resets_after_gap():
+    closes = _closes(200, seed=3)
+    engine = IndicatorEngine()
+    key = ('ETH/USDT', '1m')
+    engine.sync(key, _timestamps(WINDOW), closes[:WINDOW])
+
+    # Cửa sổ mới không chứa nến đã ghi nhận (mất kết nối lâu): tính lại từ đầu cửa sổ
+    gap_timestamps = _timestamps(WINDOW, start=WINDOW + 50)
+    values = engine.sync(key, gap_timestamps, closes[WINDOW:])
+    np.testing.assert_allclose(values, _reference(closes[WINDOW:]), **TOLERANCE)
+    assert engine.get_state(key).last_timestamp == gap_timestamps[-2]
+
+
+def test_engine_export_restore_round_trip():
+    closes = _closes(220, seed=4)
+    timestamps = _timestamps(len(closes))
+    key = ('SOL/USDT', '1m')
+    engine = IndicatorEngine()
+    engine.sync(key, timestamps[:WINDOW], closes[:WINDOW])
+
+    restored = IndicatorEngine()
+    restored.restore_states(engine.export_states())
+    for i in range(WINDOW, len(closes)):
+        start = i + 1 - WINDOW
+        expected = engine.sync(key, timestamps[start:i + 1], closes[start:i + 1])
+        values = restored.sync(key, timestamps[start:i + 1], closes[start:i + 1])
+        np.testing.assert_allclose(values, expected, **TOLERANCE)
+    np.testing.assert_allclose(values[-1], _reference(closes)[-1], **TOLERANCE)
+
+
+def _snapshot_reference(closes):
+    """Giá trị của CrossSectionEngine.sync cho một cặp: nến cuối và MACD/Signal của nến đã đóng trước đó"""
+    reference = _reference(closes)
+    return np.array([closes[-1], *reference[-1], reference[-2, 1], reference[-2, 2]])
+
+
+def _candles(closes, offset, end, forming_ratio):
+    """Mảng nến (n, 6) của một cặp tới nến `end`, nến cuối đang hình thành ở `forming_ratio` × giá đóng"""
+    n = end - offset
+    candles = np.zeros((n, 6))
+    candles[:, 0] = _timestamps(n, start=offset)
+    candles[:, 4] = closes[:n]
+    candles[-1, 4] *= forming_ratio
+    return candles
+
+
+def test_cross_section_matches_ta():
+    # Các cặp có độ dài lịch sử khác nhau (cặp mới niêm yết được điền NaN ở đầu)
+    series = [(_closes(240, seed=5), 0), (_closes(200, seed=6), 40), (_closes(150, seed=7), 90)]
+    keys = [('A/USDT', '1m'), ('B/USDT', '1m'), ('C/USDT', '1m')]
+    engine = CrossSectionEngine()
+    rng = np.random.default_rng(8)
+
+    first_end = 120
+    # Trạng thái của mỗi cặp bắt đầu từ nến đầu tiên trong cửa sổ của lần đồng bộ đầu
+    starts = [max(0, first_end - offset - WINDOW) for _, offset in series]
+    for end in range(first_end, 241):
+        for price in _forming_prices(1.0, rng):
+            # Mọi cặp cùng tỉ lệ giá đang hình thành so với giá đóng cửa cuối cùng
+            snapshots = engine.sync(keys, *stack_candles(
+                [_candles(closes, offset, end, price) for closes, offset in series], WINDOW))
+            for row, (closes, offset) in enumerate(series):
+                seen = closes[starts[row]:end - offset].copy()
+                seen[-1] *= price
+                np.testing.assert_allclose(snapshots[:, row], _snapshot_reference(seen), **TOLERANCE)
+
+    # Khoảng trống ở một cặp: chỉ cặp đó được tính lại từ đầu cửa sổ
+    arrays = [_candles(closes, offset, 240, 1.0) for closes, offset in series]
+    arrays[1][:, 0] += 1000 * TIMEFRAME_MS
+    snapshots = engine.sync(keys, *stack_candles(arrays, WINDOW))
+    gap_closes = series[1][0][:200][-WINDOW:]
+    np.testing.assert_allclose(snapshots[:, 1], _snapshot_reference(gap_closes), **TOLERANCE)
+    np.testing.assert_allclose(snapshots[:, 0], _snapshot_reference(series[0][0][starts[0]:240]), **TOLERANCE)
+
+    # Export/restore: engine mới tiếp tục đúng như engine cũ
+    restored = CrossSectionEngine()
+    restored.restore_states(*engine.export_states())
+    arrays = [array.copy() for array in arrays]
+    for array in arrays:
+        array[:, 0] += TIMEFRAME_MS
+        array[:, 4] *= 1.001
+    np.testing.assert_allclose(restored.sync(keys, *stack_candles(arrays, WINDOW)),
+                               engine.sync(keys, *stack_candles(arrays, WINDOW)), **TOLERANCE)
+
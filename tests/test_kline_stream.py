@@ -0,0 +1,94 @@
+"""Chế độ stream qua server kline giả lập: gộp nến đang hình thành, đánh giá khi nến đóng, kết nối lại"""
+
+import asyncio
+
+import numpy as np
+
+from candle_cache import CandleCache
+from kline_stream import LocalKlineServer, WebSocketKlineTransport
+from main import CryptoSignalBot, MockBinance
+
+UPDATES_PER_CANDLE = 4
+
+
+async def _wait_for(condition, timeout=10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "Hết thời gian chờ stream"
+        await asyncio.sleep(0.01)
+
+
+async def _run_stream_session():
+    server = await LocalKlineServer(port=0, interval=0.02, updates_per_candle=UPDATES_PER_CANDLE, seed=1).start()
+    events = []  # Nội dung `k` của mọi cập nhật server đã gửi
+    next_event = server._next_event
+
+    def record_event(name):
+        event = next_event(name)
+        events.append(event['k'])
+        return event
+
+    server._next_event = record_event
+
+    transport = WebSocketKlineTransport(server.url)
+    subscriptions = []
+    subscribe = transport._subscribe
+
+    async def record_subscribe(streams):
+        subscriptions.append(list(streams))
+        await subscribe(streams)
+
+    transport._subscribe = record_subscribe
+
+    bot = CryptoSignalBot('BTC/USDT', exchange=MockBinance(timeframe='1m', seed=1), connect=False,
+                          timeframe='1m', candle_cache=CandleCache())
+    buffer = bot.candle_cache.get_buffer('BTC/USDT', '1m')
+    evaluated = []
+    evaluate = bot.evaluate
+
+    async def record_evaluate(df):
+        evaluated.append((int(df['timestamp'].iloc[-1].value // 1_000_000), float(df['close'].iloc[-1])))
+        return await evaluate(df)
+
+    bot.evaluate = record_evaluate
+    task = asyncio.create_task(bot.run_stream(transport))
+    try:
+        # Nến đang hình thành được gộp vào buffer trước khi đóng
+        await _wait_for(lambda: 0 < len(events) < UPDATES_PER_CANDLE and buffer.last_timestamp == events[-1]['t']
+                        and buffer.to_array()[-1, 4] == float(events[-1]['c']))
+        assert not evaluated
+        await _wait_for(lambda: len(evaluated) >= 2)
+        before_reconnect = len(evaluated)
+
+        # Mất kết nối: watcher nhận ConnectionError, kết nối lại và đăng ký lại stream
+        await transport._ws.close()
+        await _wait_for(lambda: len(subscriptions) >= 2 and len(evaluated) >= before_reconnect + 2)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await transport.close()
+        await server.stop()
+    return events, evaluated, subscriptions, buffer
+
+
+def test_stream_merges_updates_and_evaluates_on_close():
+    events, evaluated, subscriptions, buffer = asyncio.run(_run_stream_session())
+
+    # Chỉ nến có `x: true` được đánh giá, mỗi nến một lần, với giá đóng cửa cuối cùng
+    closed = {event['t']: float(event['c']) for event in events if event['x']}
+    assert len(evaluated) == len({timestamp for timestamp, _ in evaluated})
+    for timestamp, close in evaluated:
+        assert closed[timestamp] == close
+
+    # Mọi cập nhật (kể cả trước/sau khi kết nối lại) nằm liền nhau trong buffer
+    candles = buffer.to_array()
+    last_by_candle = {event['t']: event for event in events}
+    for timestamp, event in last_by_candle.items():
+        row = candles[candles[:, 0] == timestamp]
+        if len(row):
+            assert row[0, 4] == float(event['c'])
+            assert row[0, 5] == float(event['v'])
+    assert np.all(np.diff(candles[:, 0]) == 60_000)
+
+    # Một lần đăng ký cho mỗi kết nối, kết nối lại thì đăng ký lại đúng stream đang theo dõi
+    assert subscriptions == [['btcusdt@kline_1m'], ['btcusdt@kline_1m']]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bộ nhớ đệm có thời hạn (TTL) cho các tool của crypto_agent
+
+Giá trị hết hạn tại thời điểm đóng nến của khung thời gian (hoặc sớm hơn nếu có
+`max_ttl`), giới hạn số phần tử theo LRU và gộp các yêu cầu đồng thời cho cùng một
+khóa: chỉ luồng đầu tiên gọi `loader`, các luồng khác chờ và dùng chung kết quả.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+from candle_cache import timeframe_to_ms
+
+
+def candle_close_time(timeframe, now=None):
+    """Thời điểm (giây) đóng nến đang hình thành của khung thời gian"""
+    now = time.time() if now is None else now
+    timeframe_s = timeframe_to_ms(timeframe) / 1000
+    return (now // timeframe_s + 1) * timeframe_s
+
+
+class _Pending:
+    """Một lần gọi loader đang chạy, các luồng khác chờ trên `event`"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Cache LRU an toàn luồng với thời hạn riêng cho từng khóa"""
+
+    def __init__(self, maxsize=256, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Thống kê
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, expires_at):
+        """Trả về giá trị còn hạn của `key`, nếu không thì gọi `loader()` và lưu tới `expires_at`
+
+        Lỗi của loader được trả cho mọi luồng đang chờ và không được lưu vào cache.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = _Pending()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = loader()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if pending.error is None:
+                    self._data[key] = (expires_at, pending.value)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            pending.event.set()
+        return pending.value
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Snapshot buffer nến và trạng thái chỉ báo để khởi động lại gần như tức thì
+
+Mỗi `interval` giây (và khi bot dừng) buffer nến của mọi cặp/khung cùng trạng thái đệ quy
+của RSI (trung bình lãi/lỗ Wilder) và MACD (các EMA) được ghi vào một file `.npz`: các mảng
+float64 nối liền nhau, không dùng pickle. File được ghi ra file tạm rồi đổi tên nên không bao
+giờ đọc phải file ghi dở. Khi khởi động, buffer được nạp lại nên chu kỳ đầu chỉ tải các nến
+còn thiếu (`since=`), và chỉ báo tiếp tục từ nến đã đóng cuối cùng thay vì tính lại cả cửa
+sổ. Trạng thái chỉ báo chỉ được dùng khi tham số RSI/MACD trùng với lúc lưu; nếu khoảng
+trống quá dài, CandleCache/IndicatorEngine tự tải và tính lại như khi khởi động lạnh.
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def _join_key(key):
+    symbol, timeframe = key
+    return f"{symbol}|{timeframe}"
+
+
+def _split_key(key):
+    symbol, timeframe = str(key).rsplit('|', 1)
+    return symbol, timeframe
+
+
+def _pack(blocks, width):
+    """Nối các mảng (n_i, width) thành một mảng và mảng offset (len(blocks) + 1)"""
+    offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(block) for block in blocks])
+    data = np.concatenate(blocks) if blocks else np.empty((0, width))
+    return data, offsets
+
+
+def _unpack(data, offsets):
+    return [data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def _windows(indicator_engine):
+    params = indicator_engine.params
+    return np.array([params['rsi_window'], params['macd_fast'], params['macd_slow'], params['macd_signal']])
+
+
+class WarmStartSnapshot:
+    """File snapshot buffer nến + trạng thái chỉ báo của một MultiPairSignalBot"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Thống kê
+        self.saves = 0
+        self.last_save_seconds = 0.0
+
+    def collect(self, candle_cache, indicator_engine, cross_section=None):
+        """Chụp trạng thái hiện tại thành các mảng để ghi (gọi trong event loop, không await)"""
+        buffers = candle_cache.export_buffers()
+        candles, candle_offsets = _pack([ohlcv for _, ohlcv in buffers.values()], 6)
+        states = indicator_engine.export_states()
+        history, history_offsets = _pack([history for _, history in states.values()], 5)
+        arrays = {
+            'version': np.array(FORMAT_VERSION),
+            'saved_at': np.array(self.clock()),
+            'windows': _windows(indicator_engine),
+            'candle_keys': np.array([_join_key(key) for key in buffers], dtype=str),
+            'candle_capacity': np.array([capacity for capacity, _ in buffers.values()], dtype=np.int64),
+            'candle_offsets': candle_offsets,
+            'candles': candles,
+            'indicator_keys': np.array([_join_key(key) for key in states], dtype=str),
+            'indicator_states': np.array([state for state, _ in states.values()]).reshape(-1, 9),
+            'history_offsets': history_offsets,
+            'history': history,
+        }
+        if cross_section is not None:
+            keys, cross_states = cross_section.export_states()
+            arrays['cross_keys'] = np.array([_join_key(key) for key in keys], dtype=str)
+            arrays['cross_states'] = cross_states
+        return arrays
+
+    def write(self, arrays):
+        """Ghi các mảng ra file tạm rồi thay file cũ"""
+        start = time.perf_counter()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.path)
+        self.saves += 1
+        self.last_save_seconds = time.perf_counter() - start
+
+    def save(self, candle_cache, indicator_engine, cross_section=None):
+        """Ghi snapshot ngay, trả về số buffer đã lưu (0 nếu lỗi)"""
+        try:
+            arrays = self.collect(candle_cache, indicator_engine, cross_section)
+            self.write(arrays)
+            return len(arrays['candle_keys'])
+        except Exception as e:
+            logger.error(f"Lỗi ghi snapshot warm start {self.path}: {e}")
+            return 0
+
+    async def run_saver(self, interval, sources):
+        """Ghi snapshot mỗi `interval` giây; `sources()` trả về (candle_cache, indicator_engine, cross_section)
+
+        Trạng thái được chụp trong event loop để nhất quán, phần ghi đĩa chạy trong thread.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                arrays = self.collect(*sources())
+                await loop.run_in_executor(None, self.write, arrays)
+            except Exception as e:
+                logger.error(f"Lỗi ghi snapshot warm start {self.path}: {e}")
+
+    def load(self, candle_cache, indicator_engine, cross_section=None, symbols=None):
+        """Nạp snapshot vào cache và engine, chỉ các cặp trong `symbols` (None: mọi cặp)
+
+        Trả về (số buffer nến, số trạng thái chỉ báo) đã nạp; (0, 0) nếu chưa có file hoặc lỗi.
+        """
+        if not os.path.exists(self.path):
+            return 0, 0
+        start = time.perf_counter()
+        wanted = lambda key: symbols is None or key[0] in symbols
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != FORMAT_VERSION:
+                    logger.warning(f"Bỏ qua snapshot {self.path}: định dạng {int(data['version'])} không hỗ trợ")
+                    return 0, 0
+                keys = [_split_key(key) for key in data['candle_keys']]
+                buffers = {
+                    key: (int(capacity), ohlcv)
+                    for key, capacity, ohlcv in zip(keys, data['candle_capacity'],
+                                                    _unpack(data['candles'], data['candle_offsets']))
+                    if wanted(key)
+                }
+                states, cross_rows = {}, []
+                if np.array_equal(data['windows'], _windows(indicator_engine)):
+                    keys = [_split_key(key) for key in data['indicator_keys']]
+                    histories = _unpack(data['history'], data['history_offsets'])
+                    states = {key: (state, history)
+                              for key, state, history in zip(keys, data['indicator_states'], histories)
+                              if wanted(key)}
+                    if cross_section is not None and 'cross_keys' in data:
+                        keys = [_split_key(key) for key in data['cross_keys']]
+                        cross_rows = [(key, row) for key, row in zip(keys, data['cross_states']) if wanted(key)]
+                else:
+                    logger.info("Tham số RSI/MACD đã đổi từ lần lưu trước, chỉ báo sẽ được tính lại từ nến đã lưu")
+                age = self.clock() - float(data['saved_at'])
+        except Exception as e:
+            logger.error(f"Lỗi đọc snapshot warm start {self.path}: {e}")
+            return 0, 0
+        candle_cache.restore_buffers(buffers)
+        indicator_engine.restore_states(states)
+        if cross_rows:
+            cross_section.restore_states([key for key, _ in cross_rows], np.array([row for _, row in cross_rows]))
+        restored = len(states) + len(cross_rows)
+        logger.info(f"⚡ Warm start: nạp {len(buffers)} buffer nến và {restored} trạng thái chỉ báo "
+                    f"từ {self.path} (lưu cách đây {age:.0f}s) trong {(time.perf_counter() - start) * 1000:.1f} ms")
+        return len(buffers), restored